@@ -0,0 +1,117 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from instagram_api import InstagramAPI
+from rate_limit import RateLimitScheduler
+from transport import GraphTransport
+
+
+class AccountResult:
+    """Outcome of one job run for one account"""
+
+    __slots__ = ('account', 'value', 'error')
+
+    def __init__(self, account: Dict, value: Any = None, error: Optional[BaseException] = None):
+        self.account = account
+        self.value = value
+        self.error = error
+
+    @property
+    def instagram_account_id(self) -> str:
+        return self.account['instagram_account_id']
+
+
+class AccountWorkerPool:
+    """Runs a job for every linked Instagram account in parallel.
+
+    `accounts` is the list returned by InstagramAuth.get_user_instagram_accounts.
+    Each account gets its own InstagramAPI (with its page token) and at
+    most one worker at a time, so per-account pacing stays independent.
+    All workers share one pooled transport and one rate-limit scheduler,
+    which keeps a bucket per business account plus the shared app bucket.
+    Results arrive on a shared queue as each account finishes.
+    """
+
+    def __init__(self, accounts: List[Dict], job: Callable[[InstagramAPI, Dict], Any],
+                 max_workers: int = 16, transport: Optional[GraphTransport] = None):
+        self.accounts = accounts
+        self.job = job
+        self.max_workers = max_workers
+        self.transport = transport or GraphTransport(
+            pool_maxsize=max(max_workers, 1) * 2, scheduler=RateLimitScheduler()
+        )
+        self.apis = {
+            account['instagram_account_id']: InstagramAPI(account['page_token'], account['instagram_account_id'],
+                                                          transport=self.transport)
+            for account in accounts
+        }
+        self.results: queue.Queue = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='account')
+        self._busy = set()
+        self._busy_lock = threading.Lock()
+
+    def _work(self, account: Dict):
+        account_id = account['instagram_account_id']
+        try:
+            self.results.put(AccountResult(account, value=self.job(self.apis[account_id], account)))
+        except Exception as exc:
+            print(f"Error running job for account {account_id}: {exc}")
+            self.results.put(AccountResult(account, error=exc))
+        finally:
+            with self._busy_lock:
+                self._busy.discard(account_id)
+
+    def update_accounts(self, accounts: List[Dict]):
+        """Switch to refreshed page tokens and add new accounts; register with TokenManager.on_refresh"""
+        for account in accounts:
+            account_id = account['instagram_account_id']
+            api = self.apis.get(account_id)
+            if api is None:
+                self.apis[account_id] = InstagramAPI(account['page_token'], account_id, transport=self.transport)
+            else:
+                api.access_token = account['page_token']
+        known = {account['instagram_account_id'] for account in accounts}
+        self.accounts = list(accounts) + [account for account in self.accounts
+                                          if account['instagram_account_id'] not in known]
+
+    def submit_all(self) -> int:
+        """Queue one job run per idle account; returns how many were queued"""
+        queued = 0
+        for account in self.accounts:
+            account_id = account['instagram_account_id']
+            with self._busy_lock:
+                if account_id in self._busy:
+                    continue
+                self._busy.add(account_id)
+            self._executor.submit(self._work, account)
+            queued += 1
+        return queued
+
+    def run(self) -> Iterator[AccountResult]:
+        """Run the job once for every account, yielding results as they complete"""
+        for _ in range(self.submit_all()):
+            yield self.results.get()
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+
+# Example usage:
+if __name__ == "__main__":
+    import os
+    import dotenv
+    from test2 import InstagramAuth
+
+    dotenv.load_dotenv()
+
+    auth = InstagramAuth(os.getenv("APP_ID"), os.getenv("APP_SECRET"), "http://localhost:8000/callback")
+    auth.long_lived_token = os.getenv("LONG_ACCESS_TOKEN")
+    accounts = auth.get_user_instagram_accounts() or []
+
+    pool = AccountWorkerPool(accounts, lambda api, account: api.get_media(limit=5))
+    for result in pool.run():
+        if result.error is None:
+            print(f"{result.account['page_name']}: {len(result.value or [])} recent posts")
+    pool.shutdown()
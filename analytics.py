@@ -0,0 +1,184 @@
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from media_sync import SyncStore
+from pagination import parse_timestamp
+
+HOURS_PER_WEEK = 24 * 7
+
+
+@dataclass
+class MediaFrame:
+    """Columnar view of stored media: one NumPy array per field, one row per post"""
+
+    ids: np.ndarray          # object
+    timestamps: np.ndarray   # int64 unix seconds (UTC)
+    likes: np.ndarray        # int64
+    comments: np.ndarray     # int64
+
+    @classmethod
+    def from_store(cls, store: SyncStore, account_id: str) -> 'MediaFrame':
+        rows = store.db.execute(
+            "SELECT id, CAST(strftime('%s', substr(timestamp, 1, 19)) AS INTEGER), like_count, comments_count "
+            "FROM media WHERE account_id = ?", (account_id,)
+        ).fetchall()
+        if not rows:
+            return cls.empty()
+        ids, timestamps, likes, comments = zip(*rows)
+        return cls(
+            np.array(ids, dtype=object),
+            np.fromiter(timestamps, dtype=np.int64, count=len(rows)),
+            np.fromiter((v or 0 for v in likes), dtype=np.int64, count=len(rows)),
+            np.fromiter((v or 0 for v in comments), dtype=np.int64, count=len(rows)),
+        )
+
+    @classmethod
+    def from_records(cls, records: Iterable) -> 'MediaFrame':
+        """Build from Graph media dicts or Media records"""
+        ids, timestamps, likes, comments = [], [], [], []
+        for record in records:
+            timestamp = record['timestamp']
+            if isinstance(timestamp, str):
+                timestamp = parse_timestamp(timestamp)
+            ids.append(record['id'])
+            timestamps.append(int(timestamp.timestamp()))
+            likes.append(record.get('like_count', 0) or 0)
+            comments.append(record.get('comments_count', 0) or 0)
+        return cls(np.array(ids, dtype=object), np.array(timestamps, dtype=np.int64),
+                   np.array(likes, dtype=np.int64), np.array(comments, dtype=np.int64))
+
+    @classmethod
+    def empty(cls) -> 'MediaFrame':
+        return cls(np.array([], dtype=object), *(np.array([], dtype=np.int64) for _ in range(3)))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def engagement(self) -> np.ndarray:
+        return self.likes + self.comments
+
+
+def insight_series(response: Optional[Dict]) -> Dict[str, Dict[str, np.ndarray]]:
+    """Columnar form of a get_insights() response: metric -> {'end_time', 'value'} arrays"""
+    series = {}
+    for metric in (response or {}).get('data', []):
+        values = metric.get('values', [])
+        series[metric['name']] = {
+            'end_time': np.fromiter((int(parse_timestamp(v['end_time']).timestamp()) for v in values),
+                                    dtype=np.int64, count=len(values)),
+            'value': np.fromiter((v.get('value') or 0 for v in values), dtype=np.float64, count=len(values)),
+        }
+    return series
+
+
+class EngagementAnalytics:
+    """Vectorized engagement aggregates over a MediaFrame.
+
+    `utc_offset_hours` shifts hour-of-day/hour-of-week buckets to the
+    audience's local time.
+    """
+
+    def __init__(self, frame: MediaFrame, utc_offset_hours: float = 0):
+        self.frame = frame
+        local = frame.timestamps + int(utc_offset_hours * 3600)
+        hours_since_epoch = local // 3600
+        self.hour_of_day = (hours_since_epoch % 24).astype(np.int64)
+        # 1970-01-01 was a Thursday; shift so 0 is Monday 00:00
+        self.hour_of_week = ((hours_since_epoch + 3 * 24) % HOURS_PER_WEEK).astype(np.int64)
+
+    def _bucket_means(self, buckets: np.ndarray, size: int) -> Dict[str, np.ndarray]:
+        counts = np.bincount(buckets, minlength=size)
+        likes = np.bincount(buckets, weights=self.frame.likes, minlength=size)
+        comments = np.bincount(buckets, weights=self.frame.comments, minlength=size)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return {
+                'posts': counts,
+                'likes': np.where(counts > 0, likes / counts, 0.0),
+                'comments': np.where(counts > 0, comments / counts, 0.0),
+                'engagement': np.where(counts > 0, (likes + comments) / counts, 0.0),
+            }
+
+    def hourly_curve(self) -> Dict[str, np.ndarray]:
+        """Mean likes/comments/engagement per post for each hour of day (24 buckets)"""
+        return self._bucket_means(self.hour_of_day, 24)
+
+    def weekly_curve(self) -> Dict[str, np.ndarray]:
+        """Same as hourly_curve but per hour of week (168 buckets, Monday 00:00 first)"""
+        return self._bucket_means(self.hour_of_week, HOURS_PER_WEEK)
+
+    def engagement_timeline(self, bucket_seconds: int = 3600) -> Dict[str, np.ndarray]:
+        """Total likes and comments of posts published in each time bucket"""
+        if not len(self.frame):
+            return {'start': np.array([], dtype=np.int64), 'likes': np.array([]), 'comments': np.array([])}
+        origin = self.frame.timestamps.min() // bucket_seconds * bucket_seconds
+        buckets = (self.frame.timestamps - origin) // bucket_seconds
+        size = int(buckets.max()) + 1
+        return {
+            'start': origin + np.arange(size, dtype=np.int64) * bucket_seconds,
+            'likes': np.bincount(buckets, weights=self.frame.likes, minlength=size),
+            'comments': np.bincount(buckets, weights=self.frame.comments, minlength=size),
+        }
+
+    def rates(self, followers: Optional[int] = None) -> Dict[str, float]:
+        """Like and comment rates per post, and per follower when followers is given"""
+        if not len(self.frame):
+            return {'likes_per_post': 0.0, 'comments_per_post': 0.0, 'comment_to_like': 0.0}
+        likes = float(self.frame.likes.sum())
+        comments = float(self.frame.comments.sum())
+        result = {
+            'likes_per_post': likes / len(self.frame),
+            'comments_per_post': comments / len(self.frame),
+            'comment_to_like': comments / likes if likes else 0.0,
+        }
+        if followers:
+            result['engagement_rate'] = (likes + comments) / len(self.frame) / followers
+        return result
+
+    def daily_rates(self, insights: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """Engagement of posts published each day divided by that day's insight value.
+
+        `insights` is one entry of insight_series(), e.g. daily impressions
+        or reach; days with no insight value get a rate of 0.
+        """
+        days = insights['end_time'] // 86400 - 1   # end_time is the end of the day
+        post_days = self.frame.timestamps // 86400
+        if not len(days):
+            return {'day': days, 'engagement': np.array([]), 'rate': np.array([])}
+        slot = np.searchsorted(days, post_days)
+        matched = (slot < len(days)) & (days[np.minimum(slot, len(days) - 1)] == post_days)
+        engagement = np.bincount(slot[matched], weights=self.frame.engagement[matched], minlength=len(days))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rate = np.where(insights['value'] > 0, engagement / insights['value'], 0.0)
+        return {'day': days * 86400, 'engagement': engagement, 'rate': rate}
+
+    def best_windows(self, top: int = 3, min_posts: int = 5) -> List[Dict]:
+        """Hour-of-week windows with the highest mean engagement (enough posts only)"""
+        curve = self.weekly_curve()
+        score = np.where(curve['posts'] >= min_posts, curve['engagement'], -np.inf)
+        order = np.argsort(score)[::-1][:top]
+        return [
+            {'weekday': int(hour // 24), 'hour': int(hour % 24),
+             'mean_engagement': float(curve['engagement'][hour]), 'posts': int(curve['posts'][hour])}
+            for hour in order if np.isfinite(score[hour])
+        ]
+
+    def outliers(self, threshold: float = 3.5) -> Dict[str, np.ndarray]:
+        """Posts whose engagement is far from typical, by robust z-score on log scale.
+
+        Uses the median and MAD of log1p(engagement) so a few viral posts
+        do not hide each other.
+        """
+        values = np.log1p(self.frame.engagement.astype(np.float64))
+        if not len(values):
+            return {'high': self.frame.ids[:0], 'low': self.frame.ids[:0], 'scores': values}
+        median = np.median(values)
+        mad = np.median(np.abs(values - median)) or 1e-9
+        scores = 0.6745 * (values - median) / mad
+        return {
+            'high': self.frame.ids[scores > threshold],
+            'low': self.frame.ids[scores < -threshold],
+            'scores': scores,
+        }
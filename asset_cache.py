@@ -0,0 +1,355 @@
+import hashlib
+import mmap
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterable, Optional, Sequence, Set
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+CHUNK_SIZE = 256 * 1024
+# Partial downloads older than this are removed even if their process id is in use again
+STALE_PART_AGE = 6 * 3600
+
+
+def url_key(url: str) -> str:
+    """CDN URLs carry expiring signature params; host and path alone identify the file"""
+    parts = urlsplit(url)
+    return f"{parts.netloc}{parts.path}"
+
+
+class Asset:
+    """A stored media file, addressed by the sha256 of its bytes"""
+
+    __slots__ = ('sha256', 'size', 'content_type', 'path')
+
+    def __init__(self, sha256: str, size: int, content_type: Optional[str], path: str):
+        self.sha256 = sha256
+        self.size = size
+        self.content_type = content_type
+        self.path = path
+
+    def open(self) -> mmap.mmap:
+        """Read-only memory map of the file; pages load on demand and are shared through the OS page cache"""
+        with open(self.path, 'rb') as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __repr__(self):
+        return f"Asset({self.sha256[:12]}, {self.size} bytes, {self.content_type})"
+
+
+def _process_alive(pid: int) -> bool:
+    if os.name == 'nt':
+        # Signal 0 is CTRL_C_EVENT on Windows; rely on the age limit there
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Exists, but belongs to another user
+        return True
+    return True
+
+
+class AssetStore:
+    """Content-addressed media files on disk with a SQLite index and a size-bounded LRU.
+
+    Files live at root/<first two hex digits>/<sha256>, so identical bytes
+    fetched from different URLs are stored once. A url -> sha256 index
+    (keyed by url_key) means a file is not downloaded again after its
+    signed CDN URL changes. Lookups mark an asset as used; when the total
+    size goes over `max_bytes` the least recently used assets are deleted
+    until it is under `low_water` of the limit. Recency is kept in memory
+    and written back on eviction and close, not on every read. An asset
+    whose file was deleted behind the store's back is dropped from the
+    index on lookup, so it is downloaded again.
+    """
+
+    def __init__(self, root: str = 'assets', max_bytes: int = 2 * 1024 ** 3, path: str = 'instabot.sqlite',
+                 low_water: float = 0.9):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.low_water = low_water
+        self.tmp_dir = os.path.join(root, 'tmp')
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        self._remove_stale_parts()
+
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS assets (
+                sha256 TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                content_type TEXT,
+                last_used REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS asset_urls (
+                url_key TEXT PRIMARY KEY,
+                sha256 TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS asset_urls_sha256 ON asset_urls (sha256);
+        """)
+        self.db.commit()
+
+        self._lru: OrderedDict = OrderedDict()       # sha256 -> (size, content_type), oldest first
+        for sha256, size, content_type in self.db.execute(
+                "SELECT sha256, size, content_type FROM assets ORDER BY last_used"):
+            self._lru[sha256] = (size, content_type)
+        self._urls: Dict[str, str] = dict(self.db.execute("SELECT url_key, sha256 FROM asset_urls"))
+        self._keys: Dict[str, Set[str]] = {}          # sha256 -> url keys pointing at it
+        for key, sha256 in self._urls.items():
+            self._keys.setdefault(sha256, set()).add(key)
+        self._total = sum(size for size, _ in self._lru.values())
+        self._touched: Dict[str, float] = {}
+        self.stats = {'hits': 0, 'misses': 0, 'deduplicated': 0, 'evicted': 0, 'evicted_bytes': 0, 'missing': 0}
+
+    def _remove_stale_parts(self):
+        """Delete partial downloads left by crashed runs; other live processes may share the directory"""
+        now = time.time()
+        for name in os.listdir(self.tmp_dir):
+            if not name.endswith('.part'):
+                continue
+            path = os.path.join(self.tmp_dir, name)
+            pid = name.split('-', 1)[0]
+            try:
+                if pid.isdigit() and _process_alive(int(pid)) and now - os.path.getmtime(path) < STALE_PART_AGE:
+                    continue
+                os.unlink(path)
+            except FileNotFoundError:
+                # Finished by its owner meanwhile
+                continue
+
+    def path_for(self, sha256: str) -> str:
+        return os.path.join(self.root, sha256[:2], sha256)
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total
+
+    def __len__(self) -> int:
+        return len(self._lru)
+
+    # Reads
+
+    def lookup(self, url: str) -> Optional[Asset]:
+        """The stored asset for a URL, if it was fetched before and not evicted"""
+        with self._lock:
+            sha256 = self._urls.get(url_key(url))
+            asset = self._asset(sha256) if sha256 else None
+            self.stats['hits' if asset else 'misses'] += 1
+            return asset
+
+    def get(self, sha256: str) -> Optional[Asset]:
+        with self._lock:
+            return self._asset(sha256)
+
+    def _asset(self, sha256: str) -> Optional[Asset]:
+        entry = self._lru.get(sha256)
+        if entry is None:
+            return None
+        if not os.path.exists(self.path_for(sha256)):
+            self._drop(sha256)
+            return None
+        self._lru.move_to_end(sha256)
+        self._touched[sha256] = time.time()
+        return Asset(sha256, entry[0], entry[1], self.path_for(sha256))
+
+    # Writes
+
+    def temp_file(self):
+        """(file object, path) for a download in progress, on the same filesystem as the store"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir, prefix=f"{os.getpid()}-", suffix='.part')
+        return os.fdopen(fd, 'wb'), tmp_path
+
+    def commit(self, url: str, tmp_path: str, sha256: str, size: int, content_type: Optional[str]) -> Asset:
+        """Move a finished download into place (or drop it if the bytes are already stored)"""
+        now = time.time()
+        key = url_key(url)
+        with self._lock:
+            path = self.path_for(sha256)
+            if sha256 in self._lru and os.path.exists(path):
+                os.unlink(tmp_path)
+                self.stats['deduplicated'] += 1
+            else:
+                # New bytes, or known bytes whose file was deleted behind our back
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+                if sha256 not in self._lru:
+                    self._total += size
+                self._lru[sha256] = (size, content_type)
+                self.db.execute("INSERT OR REPLACE INTO assets (sha256, size, content_type, last_used) "
+                                "VALUES (?, ?, ?, ?)", (sha256, size, content_type, now))
+            previous = self._urls.get(key)
+            if previous is not None and previous != sha256:
+                self._keys[previous].discard(key)
+            self._urls[key] = sha256
+            self._keys.setdefault(sha256, set()).add(key)
+            self.db.execute("INSERT OR REPLACE INTO asset_urls (url_key, sha256, fetched_at) VALUES (?, ?, ?)",
+                            (key, sha256, now))
+            asset = self._asset(sha256)
+            if self._total > self.max_bytes:
+                self._evict(keep=sha256)
+            self.db.commit()
+            return asset
+
+    def _drop(self, sha256: str):
+        """Forget an asset whose file is gone; called holding the lock"""
+        size, _ = self._lru.pop(sha256)
+        self._touched.pop(sha256, None)
+        self._total -= size
+        self._forget_urls(sha256)
+        self.db.execute("DELETE FROM assets WHERE sha256 = ?", (sha256,))
+        self.db.execute("DELETE FROM asset_urls WHERE sha256 = ?", (sha256,))
+        self.db.commit()
+        self.stats['missing'] += 1
+
+    def _forget_urls(self, sha256: str):
+        for key in self._keys.pop(sha256, ()):
+            self._urls.pop(key, None)
+
+    def _evict(self, keep: str):
+        """Delete least recently used assets down to the low-water mark; called holding the lock"""
+        target = self.max_bytes * self.low_water
+        evicted = []
+        while self._total > target and len(self._lru) > 1:
+            sha256, (size, _) = next(iter(self._lru.items()))
+            if sha256 == keep:
+                self._lru.move_to_end(sha256)
+                continue
+            del self._lru[sha256]
+            self._touched.pop(sha256, None)
+            self._total -= size
+            self._forget_urls(sha256)
+            evicted.append(sha256)
+            try:
+                # Open memory maps of the file stay valid after the unlink
+                os.unlink(self.path_for(sha256))
+            except FileNotFoundError:
+                pass
+            self.stats['evicted'] += 1
+            self.stats['evicted_bytes'] += size
+        if evicted:
+            self.db.executemany("DELETE FROM assets WHERE sha256 = ?", [(sha256,) for sha256 in evicted])
+            self.db.executemany("DELETE FROM asset_urls WHERE sha256 = ?", [(sha256,) for sha256 in evicted])
+        self._save_touched()
+
+    def _save_touched(self):
+        if self._touched:
+            self.db.executemany("UPDATE assets SET last_used = ? WHERE sha256 = ?",
+                                [(used, sha256) for sha256, used in self._touched.items()])
+            self._touched = {}
+
+    def close(self):
+        with self._lock:
+            self._save_touched()
+            self.db.commit()
+            self.db.close()
+
+
+class AssetFetcher:
+    """Downloads media files concurrently into an AssetStore.
+
+    Each download streams `chunk_size` pieces straight to a temp file
+    while the sha256 is computed, so a worker never holds more than one
+    chunk of a video in memory. URLs already in the store are served
+    without a request, and concurrent fetches of the same file share one
+    download. Connections are pooled per CDN host across workers.
+    """
+
+    def __init__(self, store: Optional[AssetStore] = None, max_workers: int = 8, chunk_size: int = CHUNK_SIZE,
+                 connect_timeout: float = 5.0, read_timeout: float = 60.0):
+        self.store = store if store is not None else AssetStore()
+        self.chunk_size = chunk_size
+        self.timeout = (connect_timeout, read_timeout)
+        self._workers = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='asset-fetch')
+        self._in_flight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.stats = {'downloads': 0, 'failed': 0, 'bytes': 0}
+
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_workers, max_retries=0)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def submit(self, url: str) -> Future:
+        """Future resolving to the Asset for url (None if the download failed)"""
+        asset = self.store.lookup(url)
+        if asset is not None:
+            future = Future()
+            future.set_result(asset)
+            return future
+        key = url_key(url)
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is None:
+                future = self._in_flight[key] = self._workers.submit(self._download, url)
+                future.add_done_callback(lambda _: self._forget(key))
+            return future
+
+    def _forget(self, key: str):
+        with self._lock:
+            self._in_flight.pop(key, None)
+
+    def fetch(self, url: str) -> Optional[Asset]:
+        return self.submit(url).result()
+
+    def fetch_many(self, urls: Iterable[str]) -> Dict[str, Optional[Asset]]:
+        """Fetch every URL concurrently; returns url -> Asset (None for failures)"""
+        futures = {url: self.submit(url) for url in urls}
+        return {url: future.result() for url, future in futures.items()}
+
+    def fetch_media(self, media: Iterable[Dict], fields: Sequence[str] = ('media_url',)) -> Dict[str, Optional[Asset]]:
+        """media id -> Asset for the first of `fields` each post has.
+
+        Use fields=('thumbnail_url', 'media_url') for previews: videos get
+        their thumbnail, images their own file.
+        """
+        urls: Dict[str, str] = {}
+        for item in media:
+            url = next((item[field] for field in fields if item.get(field)), None)
+            if url:
+                urls[item['id']] = url
+        assets = self.fetch_many(urls.values())
+        return {media_id: assets[url] for media_id, url in urls.items()}
+
+    def _download(self, url: str) -> Optional[Asset]:
+        tmp, tmp_path = self.store.temp_file()
+        digest, size, error = hashlib.sha256(), 0, None
+        try:
+            with tmp, self.session.get(url, stream=True, timeout=self.timeout) as response:
+                if response.status_code == 200:
+                    for chunk in response.iter_content(self.chunk_size):
+                        digest.update(chunk)
+                        tmp.write(chunk)
+                        size += len(chunk)
+            if response.status_code != 200:
+                error = f"HTTP {response.status_code}"
+            elif not size:
+                error = "empty response"
+        except (requests.RequestException, OSError) as exc:
+            error = str(exc)
+        if error:
+            print(f"Error downloading {url_key(url)}: {error}")
+            os.unlink(tmp_path)
+            self._count('failed')
+            return None
+        self._count('downloads')
+        self._count('bytes', size)
+        return self.store.commit(url, tmp_path, digest.hexdigest(), size, response.headers.get('Content-Type'))
+
+    def close(self):
+        self._workers.shutdown(wait=True)
+        self.session.close()
+        self.store.close()
@@ -0,0 +1,118 @@
+import asyncio
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Union
+
+from instagram_api import InstagramAPI
+from models import Comment, Media
+from transport import BASE_URL, GraphTransport, get_default_transport
+
+
+class AsyncInstagramAPI:
+    """asyncio front-end for InstagramAPI with per-account bounded concurrency.
+
+    Calls run on worker threads over the shared pooled transport, so the
+    event loop never blocks on a Graph round-trip. All instances for the
+    same account share one semaphore per event loop, which caps in-flight
+    requests per account no matter how many coroutines fan out.
+    """
+
+    # event loop -> account id -> semaphore; a semaphore is bound to the loop it is first used on
+    _semaphores: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]' = \
+        weakref.WeakKeyDictionary()
+    _semaphores_lock = threading.Lock()
+
+    def __init__(self, access_token: str, instagram_account_id: str, concurrency: int = 8,
+                 transport: Optional[GraphTransport] = None, base_url: str = BASE_URL):
+        transport = transport or get_default_transport()
+        if concurrency > transport.pool_maxsize:
+            raise ValueError("concurrency must not exceed the transport pool size.")
+        self.api = InstagramAPI(access_token, instagram_account_id, transport=transport, base_url=base_url)
+        self.instagram_account_id = instagram_account_id
+        self.concurrency = concurrency
+        self._executor = ThreadPoolExecutor(max_workers=concurrency,
+                                            thread_name_prefix=f"ig-{instagram_account_id}")
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        with self._semaphores_lock:
+            semaphores = self._semaphores.setdefault(loop, {})
+            semaphore = semaphores.get(self.instagram_account_id)
+            if semaphore is None:
+                semaphore = semaphores[self.instagram_account_id] = asyncio.Semaphore(self.concurrency)
+            return semaphore
+
+    async def _call(self, method, *args, **kwargs):
+        async with self.semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, lambda: method(*args, **kwargs))
+
+    async def get_account_info(self) -> Optional[Dict]:
+        """Get basic information about the Instagram business account"""
+        return await self._call(self.api.get_account_info)
+
+    async def get_media(self, limit: int = 25) -> Optional[List[Media]]:
+        """Get recent media (posts) from the Instagram account"""
+        return await self._call(self.api.get_media, limit=limit)
+
+    async def create_media(self, image_url: Optional[str] = None, caption: Optional[str] = None,
+                           **kwargs) -> Optional[str]:
+        """Create a new media container (first step in posting)"""
+        return await self._call(self.api.create_media, image_url, caption, **kwargs)
+
+    async def get_container_status(self, container_id: str) -> Optional[Dict]:
+        """Get the processing status of a media container"""
+        return await self._call(self.api.get_container_status, container_id)
+
+    async def publish_media(self, creation_id: str) -> Optional[str]:
+        """Publish a previously created media container"""
+        return await self._call(self.api.publish_media, creation_id)
+
+    async def get_insights(self, metric: Union[str, List[str]] = 'impressions', period: str = 'day',
+                           **kwargs) -> Optional[Dict]:
+        """Get insights for the Instagram account"""
+        return await self._call(self.api.get_insights, metric=metric, period=period, **kwargs)
+
+    async def get_comments(self, media_id: str) -> Optional[List[Comment]]:
+        """Get comments for a specific media post"""
+        return await self._call(self.api.get_comments, media_id)
+
+    async def reply_to_comment(self, comment_id: str, message: str) -> Optional[str]:
+        """Reply to a specific comment"""
+        return await self._call(self.api.reply_to_comment, comment_id, message)
+
+    async def get_comments_many(self, media_ids: Iterable[str]) -> Dict[str, Optional[List[Comment]]]:
+        """Fetch comments for many posts concurrently, keyed by media id"""
+        media_ids = list(media_ids)
+        results = await asyncio.gather(*(self.get_comments(media_id) for media_id in media_ids))
+        return dict(zip(media_ids, results))
+
+    def close(self):
+        """Stop the worker threads (the shared transport stays open)"""
+        self._executor.shutdown(wait=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+
+# Example usage:
+if __name__ == "__main__":
+    import json
+    import os
+    import dotenv
+
+    dotenv.load_dotenv()
+
+    async def main():
+        async with AsyncInstagramAPI(os.getenv("LONG_ACCESS_TOKEN"), os.getenv("INSTAGRAM_ACCOUNT_ID")) as api:
+            media = await api.get_media(limit=25) or []
+            comments = await api.get_comments_many(m.id for m in media)
+            for media_id, found in comments.items():
+                print(f"{media_id}: {len(found or [])} comments")
+
+    asyncio.run(main())
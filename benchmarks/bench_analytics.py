@@ -0,0 +1,99 @@
+"""Compare vectorized engagement analytics with a plain Python loop at 100k posts.
+
+Run from the repo root: python -m benchmarks.bench_analytics
+"""
+import argparse
+import math
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from analytics import EngagementAnalytics, MediaFrame
+from media_sync import SyncStore
+from models import GRAPH_TIMESTAMP_FORMAT
+
+ACCOUNT_ID = '17841400000000000'
+
+
+def synthetic_frame(posts: int, seed: int = 7) -> MediaFrame:
+    rng = np.random.default_rng(seed)
+    now = int(time.time())
+    timestamps = np.sort(rng.integers(now - 5 * 365 * 86400, now, posts))
+    likes = rng.lognormal(4, 1, posts).astype(np.int64)
+    comments = rng.poisson(likes * 0.03)
+    return MediaFrame(np.array([str(17900000000000000 + i) for i in range(posts)], dtype=object),
+                      timestamps, likes, comments)
+
+
+def python_aggregates(frame: MediaFrame):
+    """Reference implementation with per-post Python loops"""
+    counts, likes, comments = [0] * 168, [0] * 168, [0] * 168
+    for ts, like, comment in zip(frame.timestamps.tolist(), frame.likes.tolist(), frame.comments.tolist()):
+        dt = datetime.fromtimestamp(ts, timezone.utc)
+        hour = dt.weekday() * 24 + dt.hour
+        counts[hour] += 1
+        likes[hour] += like
+        comments[hour] += comment
+    means = [(likes[h] + comments[h]) / counts[h] if counts[h] else 0.0 for h in range(168)]
+    best = sorted(range(168), key=lambda h: means[h], reverse=True)[:3]
+    values = [math.log1p(l + c) for l, c in zip(frame.likes.tolist(), frame.comments.tolist())]
+    median = statistics.median(values)
+    mad = statistics.median(abs(v - median) for v in values)
+    outliers = [i for i, v in zip(frame.ids, values) if abs(0.6745 * (v - median) / mad) > 3.5]
+    return best, outliers
+
+
+def vectorized_aggregates(frame: MediaFrame):
+    analytics = EngagementAnalytics(frame)
+    analytics.hourly_curve()
+    analytics.rates()
+    best = analytics.best_windows(min_posts=1)
+    outliers = analytics.outliers()
+    return [w['weekday'] * 24 + w['hour'] for w in best], list(outliers['high']) + list(outliers['low'])
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--posts', type=int, default=100_000)
+    args = parser.parse_args()
+
+    frame = synthetic_frame(args.posts)
+    (py_best, py_outliers), py_time = timed(python_aggregates, frame)
+    (np_best, np_outliers), np_time = timed(vectorized_aggregates, frame)
+    assert py_best == np_best, (py_best, np_best)
+    assert sorted(py_outliers) == sorted(np_outliers)
+    print(f"{args.posts} posts: python {py_time * 1000:.0f} ms, numpy {np_time * 1000:.0f} ms "
+          f"({py_time / np_time:.0f}x), {len(np_outliers)} outliers")
+
+    # Loading from the sync store
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SyncStore(os.path.join(tmp, 'bench.sqlite'))
+        run_id = store.start_run(ACCOUNT_ID)
+        # Bulk insert; upsert_media commits per row, which is not what is being measured here
+        store.db.executemany(
+            "INSERT INTO media (id, account_id, timestamp, like_count, comments_count, first_seen_run) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            ((media_id, ACCOUNT_ID, datetime.fromtimestamp(ts, timezone.utc).strftime(GRAPH_TIMESTAMP_FORMAT),
+              like, comment, run_id)
+             for media_id, ts, like, comment in zip(frame.ids, frame.timestamps.tolist(),
+                                                    frame.likes.tolist(), frame.comments.tolist()))
+        )
+        store.db.commit()
+        loaded, load_time = timed(MediaFrame.from_store, store, ACCOUNT_ID)
+        assert len(loaded) == len(frame)
+        assert int(loaded.engagement.sum()) == int(frame.engagement.sum())
+        print(f"loaded {len(loaded)} posts from SQLite in {load_time * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
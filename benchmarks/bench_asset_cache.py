@@ -0,0 +1,112 @@
+"""Download media from the stub CDN into the asset cache and time repeat reads.
+
+Covers concurrent vs sequential downloads, re-fetching the same files under
+freshly signed URLs (no requests), identical bytes under different paths
+(stored once), LRU eviction under a small size limit, peak Python memory
+while streaming videos, and mmap reads of cached files.
+
+Run from the repo root: python -m benchmarks.bench_asset_cache --files 200
+"""
+import argparse
+import random
+import tempfile
+import time
+import tracemalloc
+
+from asset_cache import AssetFetcher, AssetStore
+from stub_graph_server import StubGraphServer
+
+
+def signed(server: StubGraphServer, path: str) -> str:
+    """A CDN-style URL whose signature params change every time"""
+    return f"{server.url}/cdn/{path}?oh={random.getrandbits(64):x}&oe={int(time.time()) + 3600:x}"
+
+
+def timed_fetch(fetcher: AssetFetcher, urls):
+    start = time.perf_counter()
+    assets = fetcher.fetch_many(urls)
+    return assets, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files', type=int, default=200)
+    parser.add_argument('--size', type=int, default=200_000, help="image size in bytes (videos are 10x)")
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0.05, help="CDN time to first byte in seconds")
+    args = parser.parse_args()
+
+    server = StubGraphServer(asset_size=args.size, asset_latency=args.latency).start()
+    images = [f"acct/{n}.jpg" for n in range(args.files)]
+    mb = args.files * args.size / 1e6
+
+    for workers in (1, args.workers):
+        with tempfile.TemporaryDirectory() as root:
+            fetcher = AssetFetcher(AssetStore(root, path=f"{root}/index.sqlite"), max_workers=workers)
+            _, elapsed = timed_fetch(fetcher, [signed(server, path) for path in images])
+            print(f"{workers:2d} workers: {args.files} images ({mb:.0f} MB) in {elapsed:.2f}s "
+                  f"({mb / elapsed:.0f} MB/s)")
+            fetcher.close()
+
+    with tempfile.TemporaryDirectory() as root:
+        fetcher = AssetFetcher(AssetStore(root, path=f"{root}/index.sqlite"), max_workers=args.workers)
+        fetcher.fetch_many(signed(server, path) for path in images)
+        requests_before = server.request_count
+        assets, elapsed = timed_fetch(fetcher, [signed(server, path) for path in images])
+        print(f"re-fetch under new signatures: {elapsed * 1e6 / len(assets):.0f} us/file, "
+              f"{server.request_count - requests_before} requests")
+
+        # Same file name under other paths: same bytes, different URLs
+        copies = [signed(server, f"repost/{n}.jpg") for n in range(args.files // 4)]
+        fetcher.fetch_many(copies)
+        store = fetcher.store
+        print(f"{len(copies)} reposted copies: {store.stats['deduplicated']} deduplicated, "
+              f"{len(store)} files / {store.total_bytes / 1e6:.0f} MB on disk")
+
+        start = time.perf_counter()
+        total = 0
+        for asset in assets.values():
+            with asset.open() as view:
+                total += view[0] + view[-1] + len(view)
+        mapped = time.perf_counter() - start
+        start = time.perf_counter()
+        for asset in assets.values():
+            with open(asset.path, 'rb') as f:
+                total += len(f.read())
+        read = time.perf_counter() - start
+        print(f"open + touch first/last byte: mmap {mapped * 1e6 / len(assets):.0f} us/file, "
+              f"full read() {read * 1e6 / len(assets):.0f} us/file")
+        fetcher.close()
+
+    with tempfile.TemporaryDirectory() as root:
+        limit = args.files * args.size // 2
+        fetcher = AssetFetcher(AssetStore(root, max_bytes=limit, path=f"{root}/index.sqlite"),
+                               max_workers=args.workers)
+        hot = images[:10]
+        for path in images:
+            fetcher.fetch(signed(server, path))
+            fetcher.fetch_many(signed(server, h) for h in hot)
+        store = fetcher.store
+        kept = sum(store.lookup(signed(server, h)) is not None for h in hot)
+        print(f"limit {limit / 1e6:.0f} MB: {store.total_bytes / 1e6:.1f} MB kept, {store.stats['evicted']} evicted, "
+              f"{kept}/{len(hot)} hot files still cached")
+        fetcher.close()
+
+    with tempfile.TemporaryDirectory() as root:
+        videos = [signed(server, f"acct/{n}.mp4") for n in range(args.workers * 2)]
+        fetcher = AssetFetcher(AssetStore(root, path=f"{root}/index.sqlite"), max_workers=args.workers)
+        # The stub runs in this process; build its payloads before measuring
+        for n in range(len(videos)):
+            server.asset_bytes(f"{n}.mp4")
+        tracemalloc.start()
+        fetcher.fetch_many(videos)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"{len(videos)} videos of {args.size * 10 / 1e6:.0f} MB with {args.workers} workers: "
+              f"peak Python memory {peak / 1e6:.1f} MB")
+        fetcher.close()
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
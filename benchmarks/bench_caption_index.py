@@ -0,0 +1,72 @@
+"""Build a caption index over synthetic captions and time keyword and near-duplicate queries.
+
+Run from the repo root: python -m benchmarks.bench_caption_index --captions 1000000
+"""
+import argparse
+import random
+import time
+
+from caption_index import CaptionIndex
+
+WORDS = [f"word{i}" for i in range(20000)]
+TAGS = [f"#tag{i}" for i in range(2000)]
+
+
+def make_caption(rng: random.Random) -> str:
+    words = rng.choices(WORDS, k=rng.randint(8, 30))
+    tags = rng.choices(TAGS, k=rng.randint(0, 6))
+    return ' '.join(words + tags)
+
+
+def repost(caption: str, rng: random.Random) -> str:
+    """Same caption with small edits: case, an extra word, a link"""
+    words = caption.split()
+    words.insert(rng.randrange(len(words)), rng.choice(WORDS))
+    return ' '.join(words).upper() + " https://example.com/" + str(rng.random())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--captions', type=int, default=200_000)
+    parser.add_argument('--queries', type=int, default=1000)
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    captions = [make_caption(rng) for _ in range(args.captions)]
+    index = CaptionIndex()
+
+    start = time.perf_counter()
+    batch = 10_000
+    for i in range(0, len(captions), batch):
+        index.add_many((str(n), captions[n]) for n in range(i, min(i + batch, len(captions))))
+    build = time.perf_counter() - start
+    print(f"indexed {len(index)} captions in {build:.1f}s ({len(index) / build:.0f}/s), "
+          f"{len(index.postings)} terms")
+
+    queries = [f"{rng.choice(WORDS)} {rng.choice(TAGS)}" for _ in range(args.queries)]
+    start = time.perf_counter()
+    hits = sum(len(index.search(q)) for q in queries)
+    elapsed = time.perf_counter() - start
+    print(f"keyword+hashtag search: {elapsed / len(queries) * 1e6:.0f} us/query ({hits} hits)")
+
+    originals = rng.sample(range(len(captions)), args.queries)
+    reposts = [repost(captions[n], rng) for n in originals]
+    start = time.perf_counter()
+    found = sum(str(n) in {m for m, _ in index.near_duplicates(text)} for n, text in zip(originals, reposts))
+    elapsed = time.perf_counter() - start
+    print(f"near-duplicate lookup: {elapsed / len(reposts) * 1e6:.0f} us/query, "
+          f"recall {found / len(reposts):.1%} of reposts")
+
+    fresh = [make_caption(rng) for _ in range(args.queries)]
+    false_hits = sum(index.is_near_duplicate(text) for text in fresh)
+    print(f"false duplicates among {len(fresh)} fresh captions: {false_hits}")
+
+    start = time.perf_counter()
+    for n, text in enumerate(reposts):
+        index.add(f"r{n}", text)
+    elapsed = time.perf_counter() - start
+    print(f"incremental add with duplicate check: {elapsed / len(reposts) * 1e6:.0f} us/caption")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Throughput and cache hit rate of CommentGenerator on the offline fake backend.
+
+Run from the repo root: python -m benchmarks.bench_generation
+"""
+import argparse
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from comment_generation import CommentGenerator, FakeBackend
+
+
+def make_captions(count, unique_ratio, seed=7):
+    rng = random.Random(seed)
+    pool = [f"Throwback to the {year} headlines #oldnews #{topic}"
+            for year, topic in zip(range(1900, 1900 + max(1, int(count * unique_ratio))),
+                                   [rng.choice(['history', 'news', 'vintage', 'press']) for _ in range(count)])]
+    # Reposts show up with different spacing, case and tracking links
+    return [rng.choice(pool) + rng.choice(['', '  ', ' https://t.co/x', '\n']) for _ in range(count)]
+
+
+def run(label, generator, backend, captions, callers):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=callers) as pool:
+        list(pool.map(generator.generate, captions))
+    elapsed = time.perf_counter() - start
+    generator.close()
+    print(f"{label:<22} {len(captions) / elapsed:8.1f} captions/s  backend calls={backend.calls:<5} "
+          f"hit rate={generator.hit_rate:5.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--captions', type=int, default=400)
+    parser.add_argument('--unique', type=float, default=0.5, help="fraction of distinct captions")
+    parser.add_argument('--callers', type=int, default=32)
+    args = parser.parse_args()
+
+    captions = make_captions(args.captions, args.unique)
+
+    backend = FakeBackend()
+    run("batch=1, no cache", CommentGenerator(backend, batch_size=1, cache_size=0, max_concurrency=4),
+        backend, captions, args.callers)
+
+    backend = FakeBackend()
+    run("batch=8, cached", CommentGenerator(backend, batch_size=8, max_concurrency=4),
+        backend, captions, args.callers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Memory and decode time of raw Graph dicts vs the __slots__ record types.
+
+Run from the repo root: python -m benchmarks.bench_models_memory
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+from models import decode_comments, decode_media
+
+
+def comments_payload(count):
+    return json.dumps({'data': [{
+        'id': f"1790000{i:010d}",
+        'text': f"love this post number {i % 500}!",
+        'username': f"user{i % 2000}",
+        'timestamp': f"2024-01-{i % 28 + 1:02d}T{i % 24:02d}:00:00+0000",
+        'like_count': i % 13
+    } for i in range(count)]}).encode()
+
+
+def media_payload(count):
+    return json.dumps({'data': [{
+        'id': f"1780000{i:010d}",
+        'caption': f"Old news item {i} #oldnews #throwback",
+        'media_type': 'IMAGE' if i % 3 else 'VIDEO',
+        'media_url': f"https://cdn.example.com/{i}.jpg",
+        'permalink': f"https://www.instagram.com/p/{i:011d}/",
+        'timestamp': f"2024-02-{i % 28 + 1:02d}T{i % 24:02d}:30:00+0000",
+        'like_count': i % 250,
+        'comments_count': i % 17
+    } for i in range(count)]}).encode()
+
+
+def measure(label, decode, payload):
+    tracemalloc.start()
+    start = time.perf_counter()
+    records = decode(payload)
+    elapsed = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<22} {len(records):>8} records  {size / 1024 / 1024:8.1f} MiB  "
+          f"{size / len(records):7.0f} B/record  {elapsed * 1000:8.1f} ms")
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=100_000)
+    args = parser.parse_args()
+
+    payload = comments_payload(args.count)
+    measure("comments as dicts", lambda p: json.loads(p)['data'], payload)
+    measure("comments as Comment", decode_comments, payload)
+
+    payload = media_payload(args.count)
+    measure("media as dicts", lambda p: json.loads(p)['data'], payload)
+    measure("media as Media", decode_media, payload)
+
+
+if __name__ == "__main__":
+    main()
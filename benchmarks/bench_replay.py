@@ -0,0 +1,87 @@
+"""Record a Graph session, then replay it with latency, errors and re-pagination.
+
+The recording is made against the synthetic stub (standing in for the live
+API); point --recording at a real scrubbed recording to replay that instead.
+
+Run from the repo root: python -m benchmarks.bench_replay
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from graph_recorder import GraphRecorder, ReplayGraphServer
+from instagram_api import InstagramAPI
+from retry import RetryPolicy
+from stub_graph_server import StubGraphServer
+from transport import GraphTransport
+
+ACCOUNT_ID = '17841400000000000'
+
+
+def workload(api: InstagramAPI):
+    media = api.get_media(limit=25, profile='feed') or []
+    for post in media[:5]:
+        api.get_comments(post.id)
+    api.get_account_info()
+
+
+def record(path: str):
+    server = StubGraphServer(media_count=25).start()
+    with GraphTransport() as transport:
+        recorder = GraphRecorder(path).install(transport)
+        api = InstagramAPI('live-token-never-stored', ACCOUNT_ID, transport=transport, base_url=server.url)
+        workload(api)
+        list(api.iter_media(page_size=25, profile='ids'))
+        recorder.close()
+    server.stop()
+    return recorder.count
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--recording', help="replay this file instead of recording a new one")
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--error-rate', type=float, default=0.02)
+    parser.add_argument('--page-size', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--rounds', type=int, default=40)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.recording
+        if path is None:
+            path = os.path.join(tmp, 'recording.jsonl')
+            print(f"recorded {record(path)} exchanges")
+            with open(path) as f:
+                assert 'live-token-never-stored' not in f.read()
+
+        server = ReplayGraphServer(path, latency=args.latency, error_rate=args.error_rate,
+                                   page_size=args.page_size, fallback=False, seed=1).start()
+        latencies = []
+        policy = RetryPolicy(base_delay=0.05, max_delay=0.5)
+        with GraphTransport(pool_maxsize=args.workers, retry_policy=policy) as transport:
+            transport.add_hook(lambda method, url, params, data, response, elapsed: latencies.append(elapsed))
+            api = InstagramAPI('replay-token', ACCOUNT_ID, transport=transport, base_url=server.url)
+            paged = sum(1 for _ in api.iter_media(page_size=args.page_size, profile='ids'))
+            latencies.clear()
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.workers) as pool:
+                list(pool.map(lambda _: workload(api), range(args.rounds)))
+            elapsed = time.perf_counter() - start
+        server.stop()
+
+    latencies.sort()
+    calls = len(latencies)
+    print(f"re-paginated media history: {paged} items in pages of {args.page_size}")
+    print(f"{calls} calls in {elapsed:.2f}s ({calls / elapsed:.0f} calls/s, {args.rounds / elapsed:.1f} workloads/s)")
+    print(f"latency p50={statistics.median(latencies) * 1000:.1f}ms "
+          f"p95={latencies[int(calls * 0.95)] * 1000:.1f}ms; server stats {server.stats}; "
+          f"retries {sum(e['retries'] for e in policy.stats.snapshot().values())}")
+
+
+if __name__ == "__main__":
+    main()
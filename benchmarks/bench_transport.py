@@ -0,0 +1,49 @@
+"""Requests/sec of module-level requests.get vs the pooled GraphTransport.
+
+Run from the repo root: python -m benchmarks.bench_transport
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from instagram_api import InstagramAPI
+from stub_graph_server import StubGraphServer
+from transport import GraphTransport
+
+
+def run(label, fetch, total, concurrency):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda _: fetch(), range(total)))
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {total / elapsed:10.1f} req/s  ({elapsed:.2f}s for {total})")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    args = parser.parse_args()
+
+    server = StubGraphServer().start()
+    url = f"{server.url}/v18.0/1234/media"
+    params = {'fields': 'id,timestamp', 'access_token': 'stub'}
+
+    try:
+        run("requests.get (no pool)", lambda: requests.get(url, params=params),
+            args.requests, args.concurrency)
+
+        with GraphTransport(pool_maxsize=args.concurrency) as transport:
+            run("GraphTransport", lambda: transport.get(url, params=params),
+                args.requests, args.concurrency)
+
+            api = InstagramAPI('stub', '1234', transport=transport, base_url=f"{server.url}/v18.0")
+            run("InstagramAPI.get_media", api.get_media, args.requests, args.concurrency)
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
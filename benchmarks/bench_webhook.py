@@ -0,0 +1,95 @@
+"""Load-test the webhook receiver with synthetic signed comment events.
+
+Run from the repo root: python -m benchmarks.bench_webhook
+"""
+import argparse
+import http.client
+import json
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from webhook import WebhookServer, sign
+
+APP_SECRET = 'bench-secret'
+
+
+def make_payload(sender: int, index: int, batch: int) -> bytes:
+    return json.dumps({
+        'object': 'instagram',
+        'entry': [{
+            'id': '17841400000000000',
+            'time': int(time.time()),
+            'changes': [{
+                'field': 'comments',
+                'value': {
+                    'id': f"{sender}{index:06d}{n}",
+                    'text': f"synthetic comment {index}",
+                    'from': {'id': str(sender), 'username': f"bench{sender}"},
+                    'media': {'id': '17900000000000000', 'media_product_type': 'FEED'}
+                }
+            } for n in range(batch)]
+        }]
+    }).encode()
+
+
+def sender(port: int, path: str, sender_id: int, count: int, batch: int, statuses: dict, lock):
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    for index in range(count):
+        body = make_payload(sender_id, index, batch)
+        conn.request('POST', path, body=body, headers={
+            'Content-Type': 'application/json',
+            'X-Hub-Signature-256': sign(APP_SECRET, body)
+        })
+        response = conn.getresponse()
+        response.read()
+        with lock:
+            statuses[response.status] = statuses.get(response.status, 0) + 1
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--senders', type=int, default=16)
+    parser.add_argument('--posts', type=int, default=500, help="notifications per sender")
+    parser.add_argument('--batch', type=int, default=5, help="changes per notification")
+    parser.add_argument('--queue-size', type=int, default=100000)
+    args = parser.parse_args()
+
+    server = WebhookServer(APP_SECRET, 'verify', port=0, host='127.0.0.1', maxsize=args.queue_size).start()
+    port = server.server_address[1]
+
+    # Slow consumer standing in for the reply pipeline
+    consumed = [0]
+    stop = threading.Event()
+
+    def consume():
+        while not stop.is_set() or not server.events.empty():
+            try:
+                server.events.get(timeout=0.1)
+                consumed[0] += 1
+            except queue.Empty:
+                pass
+
+    consumer = threading.Thread(target=consume, daemon=True)
+    consumer.start()
+
+    statuses, lock = {}, threading.Lock()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.senders) as pool:
+        for sender_id in range(args.senders):
+            pool.submit(sender, port, server.path, sender_id, args.posts, args.batch, statuses, lock)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    consumer.join()
+    server.stop()
+
+    total = args.senders * args.posts
+    print(f"{total} notifications ({total * args.batch} events) in {elapsed:.2f}s: "
+          f"{total / elapsed:.0f} notifications/s, {total * args.batch / elapsed:.0f} events/s")
+    print(f"statuses={statuses} stats={server.stats} consumed={consumed[0]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Simulate Graph rate limiting against a stub that reports synthetic usage.
+
+The stub counts calls per account in a sliding window, reports them as a
+percentage in X-App-Usage / X-Business-Use-Case-Usage and answers with
+error code 80002 once the account passes 100%. The same mixed
+read/write workload runs with and without RateLimitScheduler.
+
+Run from the repo root: python -m benchmarks.sim_rate_limit
+"""
+import argparse
+import contextlib
+import io
+import json
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from instagram_api import InstagramAPI
+from rate_limit import RateLimitScheduler
+from stub_graph_server import StubGraphServer
+from transport import GraphTransport
+
+
+class UsageReportingStub(StubGraphServer):
+    """Stub Graph server that enforces a sliding-window call quota"""
+
+    def __init__(self, quota: int, window: float, **kwargs):
+        super().__init__(**kwargs)
+        self.quota = quota
+        self.window = window
+        self.calls = deque()
+        self.rejected = 0
+        self._usage_lock = threading.Lock()
+
+    def route(self, method, path, params):
+        now = time.monotonic()
+        with self._usage_lock:
+            while self.calls and self.calls[0] < now - self.window:
+                self.calls.popleft()
+            usage = 100.0 * len(self.calls) / self.quota
+            if usage >= 100:
+                self.rejected += 1
+                return 400, {'error': {'message': 'Rate limit reached', 'code': 80002}}, None
+            self.calls.append(now)
+
+        status, body, headers = super().route(method, path, params)
+        headers = dict(headers or {})
+        # One account on a shared app: report a quarter of the load at app level
+        headers['X-App-Usage'] = json.dumps({'call_count': int(usage / 4), 'total_time': 0, 'total_cputime': 0})
+        headers['X-Business-Use-Case-Usage'] = json.dumps({'1234': [{
+            'type': 'instagram', 'call_count': int(usage), 'total_time': 0,
+            'total_cputime': 0, 'estimated_time_to_regain_access': 0
+        }]})
+        return status, body, headers
+
+
+def workload(api, calls):
+    """90% comment reads, 10% replies"""
+    for i in range(calls):
+        if i % 10 == 0:
+            api.reply_to_comment(f"c{i}", "thanks!")
+        else:
+            api.get_comments(f"m{i}")
+
+
+def run(label, scheduler, args):
+    server = UsageReportingStub(quota=args.quota, window=args.window).start()
+    transport = GraphTransport(scheduler=scheduler)
+    api = InstagramAPI('stub', '1234', transport=transport, base_url=f"{server.url}/v18.0")
+
+    start = time.perf_counter()
+    # InstagramAPI prints every failed call; keep the report readable
+    with contextlib.redirect_stdout(io.StringIO()), ThreadPoolExecutor(max_workers=args.threads) as pool:
+        for _ in range(args.threads):
+            pool.submit(workload, api, args.calls // args.threads)
+    elapsed = time.perf_counter() - start
+    accepted = server.request_count
+
+    print(f"{label:<18} accepted={accepted:<6} throttled={server.rejected:<6} "
+          f"elapsed={elapsed:6.2f}s  goodput={accepted / elapsed:7.1f} req/s")
+    transport.close()
+    server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--calls', type=int, default=600)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--quota', type=int, default=200, help="calls per window before throttling")
+    parser.add_argument('--window', type=float, default=5.0, help="sliding window in seconds")
+    args = parser.parse_args()
+
+    # Sustainable rate is quota / window; start the buckets a little above it
+    sustainable = args.quota / args.window
+    run("no scheduler", None, args)
+    run("scheduler", RateLimitScheduler(app_rate=sustainable * 4, account_rate=sustainable * 1.2,
+                                        burst=sustainable, probe_interval=args.window / 5,
+                                        penalty=args.window / 2), args)
+
+
+if __name__ == "__main__":
+    main()
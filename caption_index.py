@@ -0,0 +1,226 @@
+import re
+import threading
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from comment_generation import normalize_caption
+
+_TOKEN = re.compile(r'#?\w+')
+
+
+def tokenize(text: Optional[str], normalized: bool = False) -> List[str]:
+    """Index terms of a caption: lowercase words, plus '#tag' and 'tag' for each hashtag"""
+    terms = set()
+    text = (text or '') if normalized else normalize_caption(text or '')
+    for token in _TOKEN.findall(text):
+        terms.add(token)
+        if token.startswith('#'):
+            terms.add(token[1:])
+    return list(terms)
+
+
+class CaptionIndex:
+    """In-memory caption search and near-duplicate index.
+
+    Keyword and hashtag lookup uses an inverted index of term -> sorted
+    doc numbers (compact `array` postings, intersected with NumPy).
+
+    Near-duplicates use MinHash over byte shingles of the normalized
+    caption, computed for whole batches at once with NumPy, and LSH with
+    `bands` bands of `num_perm / bands` rows. Band keys live in a sorted
+    uint64 array plus a dict of recent keys that is merged in every
+    `merge_every` documents, so lookups are a few binary searches even at
+    millions of captions. Candidates are confirmed by the estimated
+    Jaccard similarity of their signatures against `threshold`.
+
+    Use one index for incoming captions (skip reposts) and another for our
+    own sent comments (avoid near-identical replies).
+    """
+
+    def __init__(self, num_perm: int = 32, bands: int = 8, shingle_size: int = 5,
+                 threshold: float = 0.7, merge_every: int = 50_000, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands.")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.threshold = threshold
+        self.merge_every = merge_every
+
+        rng = np.random.default_rng(seed)
+        # Multiply-shift hashing: one odd 64-bit multiplier per permutation
+        self._a = rng.integers(1, 2 ** 63, num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2 ** 63, num_perm, dtype=np.uint64)
+        self._band_mult = rng.integers(1, 2 ** 63, self.rows, dtype=np.uint64) | np.uint64(1)
+        self._band_tag = np.arange(bands, dtype=np.uint64) << np.uint64(56)
+        self._weights = np.uint64(256) ** np.arange(shingle_size, dtype=np.uint64)
+
+        self.ids: List[str] = []
+        self._doc_of: Dict[str, int] = {}
+        self.postings: Dict[str, array] = {}
+        self._signatures = np.empty((1024, num_perm), dtype=np.uint32)
+        self._keys = np.empty(0, dtype=np.uint64)
+        self._docs = np.empty(0, dtype=np.uint32)
+        self._tail: Dict[int, List[int]] = {}
+        self._tail_docs = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, media_id: str) -> bool:
+        return media_id in self._doc_of
+
+    # Signatures
+
+    def signatures(self, captions: List[str], chunk: int = 1000) -> np.ndarray:
+        """MinHash signatures (n x num_perm uint32) for a list of captions"""
+        if not captions:
+            return np.empty((0, self.num_perm), dtype=np.uint32)
+        return self._signatures_of([normalize_caption(c or '') for c in captions], chunk)
+
+    def _signatures_of(self, normalized: List[str], chunk: int = 1000) -> np.ndarray:
+        return np.vstack([self._signature_chunk(normalized[i:i + chunk]) for i in range(0, len(normalized), chunk)])
+
+    def _signature_chunk(self, normalized: List[str]) -> np.ndarray:
+        k = self.shingle_size
+        encoded = [text.encode().ljust(k, b'\0') for text in normalized]
+        lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+        buffer = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        counts = lengths - k + 1
+        offsets = np.cumsum(counts) - counts
+        # Start of every shingle, never crossing into the next caption
+        caption_starts = np.cumsum(lengths) - lengths
+        starts = np.repeat(caption_starts - offsets, counts) + np.arange(counts.sum())
+        shingles = (sliding_window_view(buffer, k)[starts].astype(np.uint64) * self._weights).sum(
+            axis=1, dtype=np.uint64)
+        hashed = (self._a[:, None] * shingles[None, :] + self._b[:, None]) >> np.uint64(32)
+        return np.minimum.reduceat(hashed, offsets, axis=1).T.astype(np.uint32)
+
+    def _band_keys(self, signatures: np.ndarray) -> np.ndarray:
+        bands = signatures.reshape(len(signatures), self.bands, self.rows).astype(np.uint64)
+        mixed = (bands * self._band_mult).sum(axis=2, dtype=np.uint64)
+        return (mixed >> np.uint64(8)) | self._band_tag
+
+    # Updates
+
+    def add(self, media_id: str, caption: Optional[str]) -> List[Tuple[str, float]]:
+        """Index one caption; returns the near-duplicates it had among earlier captions"""
+        with self._lock:
+            if media_id in self._doc_of:
+                return []
+            normalized = [normalize_caption(caption or '')]
+            signature = self._signatures_of(normalized)
+            duplicates = self._matches(signature[0], self.threshold) if normalized[0] else []
+            self._append([media_id], normalized, signature)
+            return duplicates
+
+    def add_many(self, items: Iterable[Tuple[str, Optional[str]]]) -> int:
+        """Index (media_id, caption) pairs in one batch; returns how many were new"""
+        with self._lock:
+            fresh = {}
+            for media_id, caption in items:
+                if media_id not in self._doc_of and media_id not in fresh:
+                    fresh[media_id] = caption
+            if fresh:
+                normalized = [normalize_caption(c or '') for c in fresh.values()]
+                self._append(list(fresh), normalized, self._signatures_of(normalized))
+            return len(fresh)
+
+    def _append(self, media_ids: List[str], captions: List[str], signatures: np.ndarray):
+        """Add documents; captions are already normalized"""
+        first = len(self.ids)
+        needed = first + len(media_ids)
+        if needed > len(self._signatures):
+            grown = np.empty((max(needed, 2 * len(self._signatures)), self.num_perm), dtype=np.uint32)
+            grown[:first] = self._signatures[:first]
+            self._signatures = grown
+        self._signatures[first:needed] = signatures
+
+        for offset, (media_id, caption) in enumerate(zip(media_ids, captions)):
+            doc = first + offset
+            self.ids.append(media_id)
+            self._doc_of[media_id] = doc
+            for term in tokenize(caption, normalized=True):
+                postings = self.postings.get(term)
+                if postings is None:
+                    postings = self.postings[term] = array('I')
+                postings.append(doc)
+
+        # Empty captions are searchable by id only; they would all collide in LSH
+        docs = np.arange(first, needed, dtype=np.uint32)[np.fromiter((bool(c) for c in captions), dtype=bool,
+                                                                     count=len(captions))]
+        if len(docs):
+            keys = self._band_keys(self._signatures[docs])
+            self._add_keys(keys.ravel(), np.repeat(docs, self.bands))
+
+    def _add_keys(self, keys: np.ndarray, docs: np.ndarray):
+        for key, doc in zip(keys.tolist(), docs.tolist()):
+            bucket = self._tail.get(key)
+            if bucket is None:
+                self._tail[key] = [doc]
+            else:
+                bucket.append(doc)
+        self._tail_docs += len(keys) // self.bands
+        if self._tail_docs >= self.merge_every:
+            self._merge()
+
+    def _merge(self):
+        """Fold the recent keys into the sorted arrays"""
+        tail_keys = np.fromiter((key for key, docs in self._tail.items() for _ in docs), dtype=np.uint64)
+        tail_docs = np.fromiter((doc for docs in self._tail.values() for doc in docs), dtype=np.uint32)
+        all_keys = np.concatenate([self._keys, tail_keys])
+        all_docs = np.concatenate([self._docs, tail_docs])
+        order = np.argsort(all_keys, kind='stable')
+        self._keys, self._docs = all_keys[order], all_docs[order]
+        self._tail, self._tail_docs = {}, 0
+
+    # Queries
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[str]:
+        """Media ids whose caption contains every term of the query (words or #hashtags), newest first"""
+        if limit is not None and limit <= 0:
+            return []
+        with self._lock:
+            lists = [self.postings.get(term) for term in tokenize(query)]
+            if not lists or any(postings is None for postings in lists):
+                return []
+            lists.sort(key=len)
+            docs = np.frombuffer(lists[0], dtype=np.uint32)
+            for postings in lists[1:]:
+                docs = np.intersect1d(docs, np.frombuffer(postings, dtype=np.uint32), assume_unique=True)
+                if not len(docs):
+                    return []
+            docs = docs[::-1][:limit]
+            return [self.ids[doc] for doc in docs]
+
+    def hashtag(self, tag: str, limit: Optional[int] = None) -> List[str]:
+        return self.search('#' + tag.lstrip('#'), limit=limit)
+
+    def near_duplicates(self, caption: str, threshold: Optional[float] = None) -> List[Tuple[str, float]]:
+        """(media_id, estimated Jaccard similarity) of indexed captions like this one, best first"""
+        if not caption:
+            return []
+        with self._lock:
+            return self._matches(self.signatures([caption])[0], threshold or self.threshold)
+
+    def is_near_duplicate(self, caption: str, threshold: Optional[float] = None) -> bool:
+        return bool(self.near_duplicates(caption, threshold))
+
+    def _matches(self, signature: np.ndarray, threshold: float) -> List[Tuple[str, float]]:
+        keys = self._band_keys(signature[None, :])[0]
+        found = [np.array(self._tail[key], dtype=np.uint32) for key in keys.tolist() if key in self._tail]
+        left = np.searchsorted(self._keys, keys, side='left')
+        right = np.searchsorted(self._keys, keys, side='right')
+        found.extend(self._docs[lo:hi] for lo, hi in zip(left, right) if hi > lo)
+        if not found:
+            return []
+        docs = np.unique(np.concatenate(found))
+        similarity = (self._signatures[docs] == signature).mean(axis=1)
+        keep = similarity >= threshold
+        order = np.argsort(-similarity[keep], kind='stable')
+        return [(self.ids[doc], float(score)) for doc, score in zip(docs[keep][order], similarity[keep][order])]
@@ -0,0 +1,176 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Protocol, Sequence
+
+_WHITESPACE = re.compile(r'\s+')
+_URL = re.compile(r'https?://\S+')
+
+
+class GenerationBackend(Protocol):
+    """A model that writes one comment per caption, several captions per call"""
+
+    def generate_batch(self, captions: Sequence[str]) -> List[Optional[str]]:
+        ...
+
+
+class FakeBackend:
+    """Deterministic offline backend for tests and benchmarks.
+
+    Each call costs `call_latency` plus `item_latency` per caption, which
+    is roughly how hosted model calls behave.
+    """
+
+    def __init__(self, call_latency: float = 0.2, item_latency: float = 0.01):
+        self.call_latency = call_latency
+        self.item_latency = item_latency
+        self.calls = 0
+        self.items = 0
+        self._lock = threading.Lock()
+
+    def generate_batch(self, captions: Sequence[str]) -> List[Optional[str]]:
+        with self._lock:
+            self.calls += 1
+            self.items += len(captions)
+        time.sleep(self.call_latency + self.item_latency * len(captions))
+        return [f"Love this! ({hashlib.sha1(c.encode()).hexdigest()[:6]})" if c else None for c in captions]
+
+
+def normalize_caption(caption: str) -> str:
+    """Canonical form used for the cache key: no URLs, case or spacing differences"""
+    return _WHITESPACE.sub(' ', _URL.sub('', caption)).strip().casefold()
+
+
+class CommentGenerator:
+    """Batched, memoized, concurrency-bounded front-end to a GenerationBackend.
+
+    Callers block on generate(); behind it a batcher thread groups up to
+    `batch_size` distinct captions (waiting at most `max_wait` seconds
+    for a batch to fill) into one backend call, with at most
+    `max_concurrency` calls in flight. The backend sees the caption as
+    given; only the cache key uses the normalized form, so results are
+    memoized on its hash with LRU eviction, and captions that normalize
+    alike share one pending result while in flight.
+    """
+
+    def __init__(self, backend: GenerationBackend, batch_size: int = 8, max_wait: float = 0.05,
+                 cache_size: int = 4096, max_concurrency: int = 4):
+        self.backend = backend
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.cache_size = cache_size
+        self.cache: OrderedDict = OrderedDict()
+        self.stats = {'hits': 0, 'misses': 0, 'coalesced': 0, 'batches': 0, 'errors': 0}
+
+        self._pending: Dict[str, Future] = {}
+        self._queue: List[tuple] = []
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='generate')
+        self._closed = False
+        self._batcher = threading.Thread(target=self._run_batcher, name='generate-batcher', daemon=True)
+        self._batcher.start()
+
+    def generate(self, caption: Optional[str], timeout: Optional[float] = None) -> Optional[str]:
+        """Comment text for a caption (None if the backend declined or failed)"""
+        return self.submit(caption).result(timeout=timeout)
+
+    def generate_many(self, captions: Sequence[Optional[str]]) -> List[Optional[str]]:
+        futures = [self.submit(caption) for caption in captions]
+        return [future.result() for future in futures]
+
+    def __call__(self, item) -> Optional[str]:
+        """Pipeline adapter: accepts a caption string or a Media/Comment record"""
+        if isinstance(item, str) or item is None:
+            return self.generate(item)
+        text = getattr(item, 'caption', None) or getattr(item, 'text', None)
+        return self.generate(text)
+
+    def submit(self, caption: Optional[str]) -> Future:
+        future = Future()
+        if not caption:
+            future.set_result(None)
+            return future
+
+        key = hashlib.sha1(normalize_caption(caption).encode()).hexdigest()
+        with self._lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                self.stats['hits'] += 1
+                future.set_result(self.cache[key])
+                return future
+            if key in self._pending:
+                self.stats['coalesced'] += 1
+                return self._pending[key]
+            if self._closed:
+                raise RuntimeError("CommentGenerator is closed.")
+
+            self.stats['misses'] += 1
+            self._pending[key] = future
+            self._queue.append((key, caption))
+            self._ready.notify()
+        return future
+
+    def _run_batcher(self):
+        while True:
+            with self._lock:
+                while not self._queue and not self._closed:
+                    self._ready.wait()
+                if not self._queue and self._closed:
+                    return
+                # Give a partly filled batch a moment to fill up
+                deadline = time.monotonic() + self.max_wait
+                while len(self._queue) < self.batch_size and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._ready.wait(remaining)
+                batch, self._queue = self._queue[:self.batch_size], self._queue[self.batch_size:]
+
+            self._slots.acquire()
+            self._executor.submit(self._run_batch, batch)
+
+    def _run_batch(self, batch: List[tuple]):
+        try:
+            try:
+                results = self.backend.generate_batch([caption for _, caption in batch])
+            except Exception as exc:
+                print(f"Error generating comments: {exc}")
+                results = [None] * len(batch)
+                error = True
+            else:
+                error = False
+                results = list(results)[:len(batch)]
+                results += [None] * (len(batch) - len(results))
+
+            with self._lock:
+                self.stats['batches'] += 1
+                if error:
+                    self.stats['errors'] += 1
+                for (key, _), result in zip(batch, results):
+                    # Failures are not cached so a later call can retry them
+                    if not error:
+                        self.cache[key] = result
+                        self.cache.move_to_end(key)
+                    self._pending.pop(key).set_result(result)
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+        finally:
+            self._slots.release()
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.stats['hits'] + self.stats['misses'] + self.stats['coalesced']
+        return (self.stats['hits'] + self.stats['coalesced']) / lookups if lookups else 0.0
+
+    def close(self):
+        """Finish queued work and stop the batcher"""
+        with self._lock:
+            self._closed = True
+            self._ready.notify_all()
+        self._batcher.join()
+        self._executor.shutdown(wait=True)
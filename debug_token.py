@@ -1,11 +1,23 @@
-import requests
 import json
+import os
+import dotenv
 
-# Your long-lived access token
-ACCESS_TOKEN = "EAADGeTNJ1wwBO2TTCkxavd0469ZBXyZAf8P3NXq3t1sxdI57C5ROoTpqxjwoXcO9ZCgNV9DicXM8QYJKAzTBYbz3m7j2NtxiZBs1aPvYpdHzCPha5U0FZAUqbEI9K8IWIgRwZCLs2NNvJhxHW20bhZAdejkUpiPjLlpYq97nEfO7JLIVPWJqdrZAO9QQtbm4dXtGMAZDZD"
+from response_cache import ResponseCache
+from session_store import SessionStore
+from transport import GraphTransport
+
+dotenv.load_dotenv()
+
+# Your long-lived access token: the one kept fresh in session.json, else .env
+ACCESS_TOKEN = SessionStore.shared().get('tokens', {}).get('user', {}).get('token') or os.getenv("LONG_ACCESS_TOKEN")
 
 # Your Facebook page ID from the granular scopes
-PAGE_ID = "477006882171967"
+PAGE_ID = os.getenv("FACEBOOK_PAGE_ID")
+if not PAGE_ID:
+    raise SystemExit("Error: set FACEBOOK_PAGE_ID in .env to the Facebook page to look up.")
+
+# Token details and page lookups are cached on disk between runs
+transport = GraphTransport(cache=ResponseCache())
 
 # Debug the token
 print("Debugging token...")
@@ -15,7 +27,7 @@ params = {
     'access_token': ACCESS_TOKEN  # We can use the same token to debug itself
 }
 
-response = requests.get(url, params=params)
+response = transport.get(url, params=params)
 if response.status_code == 200:
     debug_data = response.json()
     print("\nToken Debug Information:")
@@ -44,7 +56,7 @@ params = {
     'access_token': ACCESS_TOKEN
 }
 
-response = requests.get(url, params=params)
+response = transport.get(url, params=params)
 if response.status_code == 200:
     user_data = response.json()
     print("\nUser Information:")
@@ -60,7 +72,7 @@ params = {
     'access_token': ACCESS_TOKEN
 }
 
-response = requests.get(url, params=params)
+response = transport.get(url, params=params)
 if response.status_code == 200:
     page_data = response.json()
     print("\nPage Information:")
@@ -0,0 +1,380 @@
+import hashlib
+import heapq
+import itertools
+import math
+import os
+import queue
+import re
+import struct
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterable, List, Optional
+
+from instagram_api import InstagramAPI
+from models import Media, decode_media
+from session_store import SessionStore
+
+# Graph limit: at most 30 unique hashtags searched per account in a rolling 7 days
+HASHTAG_LIMIT = 30
+HASHTAG_WINDOW = 7 * 24 * 3600
+
+HASHTAG = 'hashtag'
+BUSINESS = 'business'
+
+_HASHTAG_IN_TEXT = re.compile(r'#(\w+)')
+_DEFERRED = object()
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over string keys, saved as one small binary file.
+
+    Sized for `capacity` keys at `error_rate` false positives; a false
+    positive only means a candidate post is skipped, never fetched twice.
+    """
+
+    _HEADER = struct.Struct('<4sQQQ')
+    _MAGIC = b'BLM1'
+
+    def __init__(self, capacity: int = 5_000_000, error_rate: float = 0.001):
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def _positions(self, key: str) -> List[int]:
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(key))
+
+    def add(self, key: str) -> bool:
+        """Add a key; returns False if it was (probably) already present"""
+        positions = self._positions(key)
+        with self._lock:
+            new = False
+            for p in positions:
+                mask = 1 << (p & 7)
+                if not self.bits[p >> 3] & mask:
+                    self.bits[p >> 3] |= mask
+                    new = True
+            if new:
+                self.count += 1
+            return new
+
+    def save(self, path: str):
+        """Write atomically (temp file + rename), like SessionStore"""
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.bloom-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                with self._lock:
+                    f.write(self._HEADER.pack(self._MAGIC, self.size, self.hashes, self.count))
+                    f.write(self.bits)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> Optional['BloomFilter']:
+        try:
+            with open(path, 'rb') as f:
+                magic, size, hashes, count = cls._HEADER.unpack(f.read(cls._HEADER.size))
+                bits = bytearray(f.read())
+        except FileNotFoundError:
+            return None
+        if magic != cls._MAGIC or len(bits) != (size + 7) // 8:
+            print(f"Error reading {path}; starting with an empty seen-set")
+            return None
+        bloom = cls.__new__(cls)
+        bloom.size, bloom.hashes, bloom.count, bloom.bits = size, hashes, count, bits
+        bloom._lock = threading.Lock()
+        return bloom
+
+
+@dataclass(slots=True)
+class Target:
+    """A hashtag or business account the crawler revisits"""
+
+    kind: str
+    name: str
+    weight: float = 1.0
+    yield_rate: float = 1.0     # moving average of new/fetched posts per visit
+    next_visit: float = 0.0
+    visits: int = 0
+
+    @property
+    def key(self) -> str:
+        return f"{self.kind}:{self.name}"
+
+    @property
+    def priority(self) -> float:
+        return self.weight * self.yield_rate
+
+
+@dataclass(slots=True)
+class Candidate:
+    """A discovered post for the engagement side"""
+
+    media: Media
+    source: str
+    priority: float
+
+
+class Frontier:
+    """Targets ordered by readiness, then by priority.
+
+    Targets that are not due yet wait in a heap keyed by next_visit; due
+    ones move to a heap keyed by priority, so pop() always returns the
+    most productive target that may be visited now.
+    """
+
+    def __init__(self):
+        self.targets: Dict[str, Target] = {}
+        self._waiting: List[tuple] = []
+        self._ready: List[tuple] = []
+        self._queued = set()
+        self._seq = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self.targets)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.targets
+
+    def push(self, target: Target):
+        self.targets[target.key] = target
+        if target.key not in self._queued:
+            self._queued.add(target.key)
+            heapq.heappush(self._waiting, (target.next_visit, next(self._seq), target.key))
+
+    def pop(self, now: float) -> Optional[Target]:
+        while self._waiting and self._waiting[0][0] <= now:
+            _, seq, key = heapq.heappop(self._waiting)
+            heapq.heappush(self._ready, (-self.targets[key].priority, seq, key))
+        if not self._ready:
+            return None
+        _, _, key = heapq.heappop(self._ready)
+        self._queued.discard(key)
+        return self.targets[key]
+
+    def next_ready(self) -> Optional[float]:
+        if self._ready:
+            return 0.0
+        return self._waiting[0][0] if self._waiting else None
+
+
+class DiscoveryCrawler:
+    """Finds other accounts' posts through hashtags and business discovery.
+
+    Each pass pops the best due targets from the frontier and crawls them
+    concurrently. A hashtag visit reads top_media, then recent_media,
+    and stops at `per_target_budget` new posts or after `stop_after_seen`
+    consecutive already-seen posts (it has caught up). Every post id goes
+    through a Bloom filter seen-set first, so nothing is handed out
+    twice; new posts land on `candidates` as Candidate records. A
+    target's revisit delay shrinks when its visits yield mostly new posts
+    and grows when they do not. With `expand_hashtags` = N, a hashtag
+    seen in N new captions becomes a target of its own.
+
+    Hashtag ids are cached and searches are counted against the API's
+    30 hashtags per 7 days limit; a hashtag over the limit waits. The
+    frontier and hashtag state live in the session.json `discovery`
+    section, the seen-set in `seen_path`.
+    """
+
+    def __init__(self, api: InstagramAPI, store: Optional[SessionStore] = None,
+                 seen_path: str = 'discovery.bloom', candidates: Optional[queue.Queue] = None,
+                 per_target_budget: int = 200, stop_after_seen: int = 50, max_workers: int = 4,
+                 revisit_interval: float = 3600, hashtag_limit: int = HASHTAG_LIMIT,
+                 expand_hashtags: int = 0, seen_capacity: int = 5_000_000, clock=time.time):
+        self.api = api
+        self.store = store or SessionStore.shared()
+        self.seen_path = seen_path
+        self.seen = BloomFilter.load(seen_path) or BloomFilter(seen_capacity)
+        self.candidates = candidates if candidates is not None else queue.Queue(maxsize=100000)
+        self.per_target_budget = per_target_budget
+        self.stop_after_seen = stop_after_seen
+        self.max_workers = max_workers
+        self.revisit_interval = revisit_interval
+        self.hashtag_limit = hashtag_limit
+        self.expand_hashtags = expand_hashtags
+        self.clock = clock
+
+        self.frontier = Frontier()
+        self.stats = {'visits': 0, 'fetched': 0, 'new': 0, 'seen': 0, 'deferred': 0, 'errors': 0}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='discovery')
+        self._tag_counts: Dict[str, int] = {}
+        self._load_state()
+
+    # State
+
+    def _load_state(self):
+        state = self.store.get('discovery', {}) or {}
+        self.hashtag_ids: Dict[str, str] = state.get('hashtag_ids', {})
+        self.searches: Dict[str, float] = state.get('searches', {})
+        for data in state.get('targets', []):
+            self.frontier.push(Target(**data))
+
+    def save(self):
+        """Persist the frontier, hashtag state and seen-set"""
+        with self._lock:
+            state = {
+                'targets': [asdict(target) for target in self.frontier.targets.values()],
+                'hashtag_ids': dict(self.hashtag_ids),
+                'searches': dict(self.searches)
+            }
+        self.store.set('discovery', state)
+        self.seen.save(self.seen_path)
+
+    def add_hashtag(self, name: str, weight: float = 1.0):
+        self._add(Target(HASHTAG, name.lstrip('#').lower(), weight))
+
+    def add_business(self, username: str, weight: float = 1.0):
+        self._add(Target(BUSINESS, username.lstrip('@'), weight))
+
+    def _add(self, target: Target):
+        with self._lock:
+            if target.key not in self.frontier:
+                self.frontier.push(target)
+
+    # Crawling
+
+    def crawl_once(self, max_targets: Optional[int] = None) -> Dict[str, int]:
+        """Visit every due target (at most max_targets) concurrently; returns counts for the pass"""
+        now = self.clock()
+        targets = []
+        with self._lock:
+            while max_targets is None or len(targets) < max_targets:
+                target = self.frontier.pop(now)
+                if target is None:
+                    break
+                targets.append(target)
+        results = list(self._executor.map(self._visit, targets))
+        return {'targets': len(targets), 'fetched': sum(r[0] for r in results), 'new': sum(r[1] for r in results)}
+
+    def run(self, stop: threading.Event, save_interval: float = 300):
+        """Crawl until stop is set, sleeping until the next target is due"""
+        last_save = self.clock()
+        while not stop.is_set():
+            self.crawl_once()
+            if self.clock() - last_save >= save_interval:
+                self.save()
+                last_save = self.clock()
+            with self._lock:
+                next_ready = self.frontier.next_ready()
+            stop.wait(60 if next_ready is None else min(60, max(0.0, next_ready - self.clock())))
+        self.save()
+
+    def _visit(self, target: Target):
+        fetched = new = 0
+        try:
+            if target.kind == HASHTAG:
+                fetched, new = self._visit_hashtag(target)
+            else:
+                fetched, new = self._visit_business(target)
+        except Exception as exc:
+            print(f"Error crawling {target.key}: {exc}")
+            self._count('errors')
+        if fetched is None:
+            return 0, 0
+
+        now = self.clock()
+        with self._lock:
+            target.visits += 1
+            if fetched:
+                target.yield_rate = 0.5 * target.yield_rate + 0.5 * (new / fetched)
+            delay = self.revisit_interval / (0.1 + target.yield_rate)
+            target.next_visit = now + min(delay, 10 * self.revisit_interval)
+            self.frontier.push(target)
+            self.stats['visits'] += 1
+        return fetched, new
+
+    def _visit_hashtag(self, target: Target):
+        hashtag_id = self._hashtag_id(target)
+        if hashtag_id is _DEFERRED:
+            return None, 0
+        if hashtag_id is None:
+            return 0, 0
+        fetched = new = 0
+        for edge in ('top_media', 'recent_media'):
+            seen_run = 0
+            for item in self.api.iter_hashtag_media(hashtag_id, edge=edge, page_size=50):
+                fetched += 1
+                if self._offer(item, f"#{target.name}/{edge}", target.priority):
+                    new += 1
+                    seen_run = 0
+                else:
+                    seen_run += 1
+                if new >= self.per_target_budget or seen_run >= self.stop_after_seen:
+                    break
+            if new >= self.per_target_budget:
+                break
+        return fetched, new
+
+    def _visit_business(self, target: Target):
+        result = self.api.get_business_discovery(target.name, media_limit=min(self.per_target_budget, 50))
+        if result is None:
+            return 0, 0
+        media = decode_media(result.get('media') or {})
+        new = sum(1 for item in media if self._offer(item, f"@{target.name}", target.priority))
+        return len(media), new
+
+    def _hashtag_id(self, target: Target):
+        """Cached hashtag id, searching (and spending quota) only when needed; _DEFERRED if over quota"""
+        with self._lock:
+            if target.name in self.hashtag_ids:
+                return self.hashtag_ids[target.name]
+            now = self.clock()
+            self.searches = {name: ts for name, ts in self.searches.items() if now - ts < HASHTAG_WINDOW}
+            if len(self.searches) >= self.hashtag_limit:
+                # Over the weekly hashtag quota: come back when the oldest search expires
+                target.next_visit = min(self.searches.values()) + HASHTAG_WINDOW
+                self.frontier.push(target)
+                self.stats['deferred'] += 1
+                return _DEFERRED
+            self.searches[target.name] = now
+        hashtag_id = self.api.search_hashtag(target.name)
+        if hashtag_id:
+            with self._lock:
+                self.hashtag_ids[target.name] = hashtag_id
+        return hashtag_id
+
+    def _offer(self, media: Media, source: str, priority: float) -> bool:
+        self._count('fetched')
+        if not self.seen.add(media.id):
+            self._count('seen')
+            return False
+        self._count('new')
+        self.candidates.put(Candidate(media, source, priority))
+        if self.expand_hashtags and media.caption:
+            self._note_hashtags(_HASHTAG_IN_TEXT.findall(media.caption), priority)
+        return True
+
+    def _note_hashtags(self, names: Iterable[str], priority: float):
+        """Add hashtags that keep showing up in new posts as lower-weight targets"""
+        for name in names:
+            name = name.lower()
+            with self._lock:
+                count = self._tag_counts[name] = self._tag_counts.get(name, 0) + 1
+                known = f"{HASHTAG}:{name}" in self.frontier
+            if count == self.expand_hashtags and not known:
+                self._add(Target(HASHTAG, name, weight=0.5 * priority, next_visit=self.clock()))
+
+    def _count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.save()
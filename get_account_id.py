@@ -1,26 +1,29 @@
 from test2 import InstagramAuth
+from response_cache import ResponseCache
+from token_manager import TokenManager
+from transport import GraphTransport
 import os
 import dotenv
 import json
 
 dotenv.load_dotenv()
 
-# Your long-lived access token
-ACCESS_TOKEN = os.getenv("LONG_ACCESS_TOKEN")
-
 # Initialize the auth class with dummy values since we already have the token
 auth = InstagramAuth(
     app_id=os.getenv("APP_ID"),
     app_secret=os.getenv("APP_SECRET"),
-    redirect_uri="http://localhost:8000/callback"
+    redirect_uri="http://localhost:8000/callback",
+    transport=GraphTransport(cache=ResponseCache())
 )
 
-# Set the access token directly
-auth.long_lived_token = ACCESS_TOKEN
+# Use the token saved in session.json, falling back to the one in .env
+tokens = TokenManager(auth)
+if not tokens.user_token:
+    tokens.set_user_token(os.getenv("LONG_ACCESS_TOKEN"))
 
-# First, check if the token is valid
+# First, check if the token is valid (cached in session.json for a day)
 print("Checking token validity...")
-token_info = auth.get_token_info()
+token_info = tokens.token_info()
 if token_info:
     print("\nToken Information:")
     print(json.dumps(token_info, indent=2))
@@ -34,7 +37,9 @@ else:
 
 # Try to get Instagram accounts
 print("\nAttempting to get Instagram accounts...")
-accounts = auth.get_user_instagram_accounts()
+if not tokens.accounts():
+    tokens.refresh_accounts()
+accounts = tokens.accounts()
 if accounts:
     print("\nFound Instagram Business Accounts:")
     for i, account in enumerate(accounts, 1):
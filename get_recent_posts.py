@@ -1,25 +1,27 @@
 import os
 import json
-from datetime import datetime
-import requests
 from dotenv import load_dotenv
 
+from models import decode_media, media_fields
+from response_cache import ResponseCache
+from transport import BASE_URL, GraphTransport, get_default_transport
+
 load_dotenv()
 
-def format_timestamp(timestamp):
-    """Convert ISO timestamp to readable format"""
-    dt = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+def format_timestamp(dt):
+    """Convert a parsed timestamp to readable format"""
     return dt.strftime('%B %d, %Y at %I:%M %p')
 
-def get_business_account_id(access_token, page_id):
+def get_business_account_id(access_token, page_id, transport=None):
     """Get the Instagram business account ID associated with a Facebook page"""
-    url = f"https://graph.facebook.com/v18.0/{page_id}"
+    transport = transport or get_default_transport()
+    url = f"{BASE_URL}/{page_id}"
     params = {
         'fields': 'instagram_business_account{id,username}',
         'access_token': access_token
     }
     
-    response = requests.get(url, params=params)
+    response = transport.get(url, params=params)
     if response.status_code != 200:
         print(f"Error getting business account: {response.text}")
         return None
@@ -29,21 +31,22 @@ def get_business_account_id(access_token, page_id):
         return data['instagram_business_account']['id']
     return None
 
-def get_recent_posts(access_token, business_account_id, limit=10):
-    """Fetch recent posts from Instagram"""
-    url = f"https://graph.facebook.com/v18.0/{business_account_id}/media"
+def get_recent_posts(access_token, business_account_id, limit=10, transport=None, profile='full'):
+    """Fetch recent posts from Instagram using a field profile (ids, feed, full)"""
+    transport = transport or get_default_transport()
+    url = f"{BASE_URL}/{business_account_id}/media"
     params = {
-        'fields': 'id,caption,media_type,media_url,permalink,thumbnail_url,timestamp,like_count,comments_count',
+        'fields': media_fields(profile),
         'limit': limit,
         'access_token': access_token
     }
     
-    response = requests.get(url, params=params)
+    response = transport.get(url, params=params)
     if response.status_code != 200:
         print(f"Error fetching posts: {response.text}")
         return None
         
-    return response.json().get('data', [])
+    return decode_media(response.content)
 
 def main():
     # Get credentials from environment
@@ -55,8 +58,11 @@ def main():
         print("Please set LONG_ACCESS_TOKEN and FACEBOOK_PAGE_ID in your .env file")
         return
     
+    # The page -> business account mapping rarely changes, so reuse it across runs
+    transport = GraphTransport(cache=ResponseCache())
+    
     # First get the business account ID
-    business_account_id = get_business_account_id(access_token, page_id)
+    business_account_id = get_business_account_id(access_token, page_id, transport=transport)
     if not business_account_id:
         print("Could not find Instagram business account. Make sure:")
         print("1. The Facebook page is published")
@@ -67,7 +73,7 @@ def main():
     print(f"Found Instagram business account ID: {business_account_id}")
     
     # Fetch recent posts
-    posts = get_recent_posts(access_token, business_account_id)
+    posts = get_recent_posts(access_token, business_account_id, transport=transport, profile='feed')
     if not posts:
         print("No posts found or error occurred")
         return
@@ -76,14 +82,14 @@ def main():
     print(f"\nFound {len(posts)} recent posts:\n")
     for i, post in enumerate(posts, 1):
         print(f"Post {i}:")
-        print(f"  Posted: {format_timestamp(post['timestamp'])}")
-        print(f"  Type: {post['media_type']}")
-        if 'caption' in post:
-            caption = post['caption'][:100] + '...' if len(post['caption']) > 100 else post['caption']
+        print(f"  Posted: {format_timestamp(post.timestamp)}")
+        print(f"  Type: {post.media_type}")
+        if post.caption:
+            caption = post.caption[:100] + '...' if len(post.caption) > 100 else post.caption
             print(f"  Caption: {caption}")
         print(f"  Likes: {post.get('like_count', 0)}")
         print(f"  Comments: {post.get('comments_count', 0)}")
-        print(f"  Link: {post['permalink']}")
+        print(f"  Link: {post.permalink}")
         print()
 
 if __name__ == "__main__":
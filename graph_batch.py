@@ -0,0 +1,102 @@
+import json
+from typing import Dict, List, Optional
+from urllib.parse import urlencode
+
+from rate_limit import READ, WRITE
+from transport import BASE_URL, GraphTransport, get_default_transport
+
+# Graph API limit on sub-requests per batch
+MAX_BATCH_SIZE = 50
+
+
+class BatchCall:
+    """One queued Graph call; filled in when its batch is executed"""
+
+    def __init__(self, method: str, path: str, params: Optional[Dict] = None):
+        self.method = method.upper()
+        self.path = path.lstrip('/')
+        self.params = params or {}
+        self.status_code = None
+        self.body = None
+        self.done = False
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code == 200
+
+    def json(self) -> Optional[Dict]:
+        if self.body is None:
+            return None
+        try:
+            return json.loads(self.body)
+        except ValueError:
+            return None
+
+    def to_batch_item(self) -> Dict:
+        item = {'method': self.method, 'relative_url': self.path}
+        if self.params:
+            if self.method == 'GET':
+                item['relative_url'] = f"{self.path}?{urlencode(self.params)}"
+            else:
+                item['body'] = urlencode(self.params)
+        return item
+
+
+class GraphBatch:
+    """Queue Graph calls and ship them as batch requests of up to 50 each.
+
+    Sub-requests may carry their own access_token in params (for example a
+    page token); the batch-level token is used for everything else.
+    """
+
+    def __init__(self, access_token: str, transport: Optional[GraphTransport] = None,
+                 base_url: str = BASE_URL, account_id: Optional[str] = None):
+        self.access_token = access_token
+        self.account_id = account_id
+        self.base_url = base_url
+        self.transport = transport or get_default_transport()
+        self.pending: List[BatchCall] = []
+
+    def add(self, method: str, path: str, params: Optional[Dict] = None) -> BatchCall:
+        """Queue a call and return its handle"""
+        call = BatchCall(method, path, params)
+        self.pending.append(call)
+        return call
+
+    def get(self, path: str, params: Optional[Dict] = None) -> BatchCall:
+        return self.add('GET', path, params)
+
+    def post(self, path: str, params: Optional[Dict] = None) -> BatchCall:
+        return self.add('POST', path, params)
+
+    def execute(self) -> List[BatchCall]:
+        """Send every queued call, MAX_BATCH_SIZE per round-trip"""
+        calls, self.pending = self.pending, []
+        for start in range(0, len(calls), MAX_BATCH_SIZE):
+            self._send(calls[start:start + MAX_BATCH_SIZE])
+        return calls
+
+    def _send(self, chunk: List[BatchCall]):
+        data = {
+            'access_token': self.access_token,
+            'include_headers': 'false',
+            'batch': json.dumps([call.to_batch_item() for call in chunk])
+        }
+        kind = WRITE if any(call.method != 'GET' for call in chunk) else READ
+        response = self.transport.post(f"{self.base_url}/", data=data, account_id=self.account_id, kind=kind)
+        if response.status_code != 200:
+            print(f"Error sending batch: {response.text}")
+            for call in chunk:
+                call.status_code = response.status_code
+                call.body = response.text
+                call.done = True
+            return
+
+        # Entries come back in request order; a null entry means the
+        # sub-request did not complete within Graph's batch timeout.
+        for call, result in zip(chunk, response.json()):
+            call.done = True
+            if result is None:
+                continue
+            call.status_code = result.get('code')
+            call.body = result.get('body')
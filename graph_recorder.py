@@ -0,0 +1,232 @@
+import json
+import random
+import re
+import threading
+import time
+import urllib.parse
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import requests
+
+from response_cache import SECRET_PARAMS, fingerprint
+from stub_graph_server import StubGraphServer
+from transport import GRAPH_URL, GraphTransport
+
+# Credentials that never reach a recording, in params, form data or URLs
+SCRUBBED_PARAMS = SECRET_PARAMS | {'appsecret_proof', 'client_id_secret'}
+# Keys scrubbed in response bodies; 'code' is only a secret as the OAuth request param,
+# in bodies it is an error code or a batch item's HTTP status
+SCRUBBED_KEYS = SCRUBBED_PARAMS - {'code'}
+# Paging params, ignored when matching a request to a recorded page set
+PAGING_PARAMS = {'after', 'before', 'limit'}
+# Response headers worth keeping for replay
+RECORDED_HEADERS = ('content-type', 'etag', 'retry-after', 'x-app-usage', 'x-business-use-case-usage',
+                    'x-ad-account-usage')
+
+_SECRET_IN_URL = re.compile(r'(?<![\w])((?:%s)=)[^&"\s]+' % '|'.join(sorted(SCRUBBED_PARAMS)))
+_VERSION = re.compile(r'^/v\d+(\.\d+)?')
+
+
+def scrub_value(value) -> str:
+    """Stand-in for a secret: stable per secret, but not reversible"""
+    return f"scrubbed-{fingerprint(str(value))[:8]}"
+
+
+def scrub_params(params: Optional[Dict]) -> Dict:
+    return {name: scrub_value(value) if name in SCRUBBED_PARAMS else scrub_body(value)
+            for name, value in (params or {}).items()}
+
+
+def scrub_body(body):
+    """Recursively scrub secret keys, secrets in URLs (e.g. paging.next) and JSON held in strings (batch bodies)"""
+    if isinstance(body, dict):
+        return {key: scrub_value(value) if key in SCRUBBED_KEYS else scrub_body(value)
+                for key, value in body.items()}
+    if isinstance(body, list):
+        return [scrub_body(value) for value in body]
+    if isinstance(body, str):
+        if body[:1] in ('{', '['):
+            try:
+                parsed = json.loads(body)
+            except ValueError:
+                parsed = None
+            if isinstance(parsed, (dict, list)):
+                scrubbed = scrub_body(parsed)
+                if scrubbed != parsed:
+                    return json.dumps(scrubbed, separators=(',', ':'))
+        return _SECRET_IN_URL.sub(lambda m: m.group(1) + 'scrubbed', body)
+    return body
+
+
+def graph_path(url: str) -> str:
+    """Path of a Graph URL without the version prefix (/v18.0/123/media -> /123/media)"""
+    return _VERSION.sub('', urllib.parse.urlparse(url).path) or '/'
+
+
+class GraphRecorder:
+    """Transport hook that appends every Graph exchange to a JSONL file, secrets scrubbed.
+
+    Install with recorder.install(transport) or GraphTransport(hooks=[recorder]).
+    Each line holds method, path, scrubbed params/form data, status,
+    selected headers, the scrubbed body and the observed latency.
+    """
+
+    def __init__(self, path: str = 'graph_recording.jsonl'):
+        self.path = path
+        self.count = 0
+        self._lock = threading.Lock()
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def install(self, transport: GraphTransport) -> 'GraphRecorder':
+        transport.add_hook(self)
+        return self
+
+    def __call__(self, method: str, url: str, params: Optional[Dict], data: Optional[Dict],
+                 response: Optional[requests.Response], elapsed: float):
+        if response is None:
+            return
+        query = dict(urllib.parse.parse_qsl(urllib.parse.urlparse(url).query))
+        try:
+            body = scrub_body(response.json())
+        except ValueError:
+            body = scrub_body(response.text)
+        record = {
+            'ts': time.time(),
+            'method': method.upper(),
+            'path': graph_path(url),
+            'params': scrub_params({**query, **(params or {})}),
+            'data': scrub_params(data) if isinstance(data, dict) else None,
+            'status': response.status_code,
+            'headers': {name: response.headers[name] for name in RECORDED_HEADERS if name in response.headers},
+            'body': body,
+            'elapsed': round(elapsed, 6)
+        }
+        line = json.dumps(record, separators=(',', ':')) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            self.count += 1
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def load_recording(path: str) -> Iterator[Dict]:
+    """Records from a recording file, skipping a torn final line"""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def _match_key(method: str, path: str, params: Dict, paging: bool) -> Tuple:
+    skip = SCRUBBED_PARAMS | (PAGING_PARAMS if not paging else set())
+    # Values are scrubbed like the recording was, so tokens inside e.g. batch JSON still match
+    return method, path, tuple(sorted((k, str(scrub_body(v))) for k, v in params.items() if k not in skip))
+
+
+class ReplayGraphServer(StubGraphServer):
+    """Stub Graph server that answers from a recording.
+
+    Requests are matched on method, path and non-secret params. With
+    `page_size` set, every recorded page of a list endpoint is merged and
+    served again in pages of that size with working `after` cursors.
+    `latency` (seconds, or a (low, high) range) is added to every answer,
+    and `error_rate` of requests fail with a transient Graph error.
+    Unrecorded requests fall back to the synthetic stub answers unless
+    `fallback` is False, in which case they get a Graph 803 error.
+    """
+
+    def __init__(self, records: Union[str, List[Dict]], port: int = 0,
+                 latency: Union[float, Tuple[float, float]] = 0.0, error_rate: float = 0.0,
+                 page_size: Optional[int] = None, fallback: bool = True, seed: Optional[int] = None):
+        super().__init__(port=port)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.page_size = page_size
+        self.fallback = fallback
+        self.stats = {'replayed': 0, 'fallback': 0, 'missing': 0, 'errors': 0}
+        self._random = random.Random(seed)
+        self._exact: Dict[Tuple, Dict] = {}
+        self._pages: Dict[Tuple, List[Dict]] = {}
+        for record in load_recording(records) if isinstance(records, str) else records:
+            self._add(record)
+
+    def _add(self, record: Dict):
+        params = {**record.get('params', {}), **(record.get('data') or {})}
+        self._exact.setdefault(_match_key(record['method'], record['path'], params, True), record)
+        body = record.get('body')
+        if record['status'] == 200 and isinstance(body, dict) and isinstance(body.get('data'), list):
+            items = self._pages.setdefault(_match_key(record['method'], record['path'], params, False), [])
+            seen = {item.get('id') for item in items if isinstance(item, dict)}
+            items.extend(item for item in body['data'] if not isinstance(item, dict) or item.get('id') not in seen)
+
+    def _delay(self):
+        delay = self._random.uniform(*self.latency) if isinstance(self.latency, tuple) else self.latency
+        if delay > 0:
+            time.sleep(delay)
+
+    def route(self, method: str, path: str, params: Dict):
+        self._delay()
+        if self.error_rate and self._random.random() < self.error_rate:
+            with self._count_lock:
+                self.request_count += 1
+                self.stats['errors'] += 1
+            return 500, {'error': {'message': 'An unexpected error has occurred. Please retry your request later.',
+                                   'type': 'OAuthException', 'code': 2, 'is_transient': True}}, None
+
+        path = _VERSION.sub('', path) or '/'
+        if self.page_size:
+            items = self._pages.get(_match_key(method, path, params, False))
+            if items is not None:
+                self._count('replayed')
+                return 200, self.paginate(path, params, items, self.page_size), None
+
+        record = self._exact.get(_match_key(method, path, params, True))
+        if record is None:
+            record = self._exact.get(_match_key(method, path, {k: v for k, v in params.items()
+                                                               if k not in PAGING_PARAMS}, True))
+        if record is not None:
+            self._count('replayed')
+            body = record['body']
+            if isinstance(body, (dict, list)):
+                # Recorded paging links point at graph.facebook.com; keep clients on this server
+                body = json.loads(json.dumps(body).replace(GRAPH_URL, self.url))
+            headers = {k: v for k, v in record.get('headers', {}).items() if k != 'content-type'}
+            return record['status'], body, headers
+
+        if self.fallback:
+            with self._count_lock:
+                self.stats['fallback'] += 1
+            return super().route(method, path, params)
+        self._count('missing')
+        return 400, {'error': {'message': f"Unknown path components: {path} (not recorded)",
+                               'type': 'OAuthException', 'code': 803}}, None
+
+    def _count(self, name: str):
+        with self._count_lock:
+            self.request_count += 1
+            self.stats[name] += 1
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve a Graph API recording locally")
+    parser.add_argument('recording')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--page-size', type=int, default=None)
+    args = parser.parse_args()
+
+    server = ReplayGraphServer(args.recording, port=args.port, latency=args.latency,
+                               error_rate=args.error_rate, page_size=args.page_size)
+    print(f"Replaying {args.recording} at {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
@@ -0,0 +1,189 @@
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from instagram_api import InstagramAPI
+from pagination import parse_timestamp
+
+DAY = 86400
+# The Graph API rejects since/until ranges longer than 30 days for period=day
+MAX_WINDOW_DAYS = 30
+DEFAULT_METRICS = ('impressions', 'reach', 'profile_views', 'follower_count')
+
+
+class InsightsStore:
+    """Compact SQLite time series of account insights.
+
+    Each (account, metric, period) gets a small integer series id; points
+    are (series_id, end_time) keyed rows in a WITHOUT ROWID table, so a
+    year of daily values for a dozen metrics stays a few hundred KB.
+    Fetched windows are recorded so they are not requested again.
+    """
+
+    def __init__(self, path: str = 'instabot.sqlite'):
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._series_ids: Dict[Tuple[str, str, str], int] = {}
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS insight_series (
+                series_id INTEGER PRIMARY KEY,
+                account_id TEXT NOT NULL,
+                metric TEXT NOT NULL,
+                period TEXT NOT NULL,
+                UNIQUE (account_id, metric, period)
+            );
+            CREATE TABLE IF NOT EXISTS insight_points (
+                series_id INTEGER NOT NULL,
+                end_time INTEGER NOT NULL,
+                value REAL,
+                PRIMARY KEY (series_id, end_time)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS insight_windows (
+                account_id TEXT NOT NULL,
+                period TEXT NOT NULL,
+                metrics TEXT NOT NULL,
+                since INTEGER NOT NULL,
+                until INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (account_id, period, metrics, since)
+            ) WITHOUT ROWID;
+        """)
+        self.db.commit()
+
+    def _series_id(self, account_id: str, metric: str, period: str) -> int:
+        key = (account_id, metric, period)
+        if key not in self._series_ids:
+            self.db.execute("INSERT OR IGNORE INTO insight_series (account_id, metric, period) VALUES (?, ?, ?)", key)
+            row = self.db.execute(
+                "SELECT series_id FROM insight_series WHERE account_id = ? AND metric = ? AND period = ?", key
+            ).fetchone()
+            self._series_ids[key] = row[0]
+        return self._series_ids[key]
+
+    def fetched_at(self, account_id: str, period: str, metrics: str, since: int) -> Optional[float]:
+        with self._lock:
+            row = self.db.execute(
+                "SELECT fetched_at FROM insight_windows "
+                "WHERE account_id = ? AND period = ? AND metrics = ? AND since = ?",
+                (account_id, period, metrics, since)
+            ).fetchone()
+        return row[0] if row else None
+
+    def add_window(self, account_id: str, period: str, metrics: str, since: int, until: int,
+                   response: Dict) -> int:
+        """Store every value in a get_insights() response and mark the window fetched"""
+        rows = []
+        with self._lock:
+            for metric in response.get('data', []):
+                series_id = self._series_id(account_id, metric['name'], metric.get('period', period))
+                for value in metric.get('values', []):
+                    if not isinstance(value.get('value'), (int, float)):
+                        continue   # breakdown metrics come back as dicts; not stored here
+                    end_time = int(parse_timestamp(value['end_time']).timestamp())
+                    rows.append((series_id, end_time, value['value']))
+            self.db.executemany("INSERT OR REPLACE INTO insight_points VALUES (?, ?, ?)", rows)
+            self.db.execute("INSERT OR REPLACE INTO insight_windows VALUES (?, ?, ?, ?, ?, ?)",
+                            (account_id, period, metrics, since, until, time.time()))
+            self.db.commit()
+        return len(rows)
+
+    def series(self, account_id: str, metric: str, period: str = 'day',
+               since: Optional[datetime] = None, until: Optional[datetime] = None) -> Dict[str, np.ndarray]:
+        """Stored points as {'end_time', 'value'} arrays, the shape analytics.insight_series() uses"""
+        with self._lock:
+            rows = self.db.execute("""
+                SELECT p.end_time, p.value FROM insight_points p
+                JOIN insight_series s ON s.series_id = p.series_id
+                WHERE s.account_id = ? AND s.metric = ? AND s.period = ? AND p.end_time > ? AND p.end_time <= ?
+                ORDER BY p.end_time
+            """, (account_id, metric, period,
+                  int(since.timestamp()) if since else 0,
+                  int(until.timestamp()) if until else 2 ** 62)).fetchall()
+        return {
+            'end_time': np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows)),
+            'value': np.fromiter((r[1] or 0 for r in rows), dtype=np.float64, count=len(rows)),
+        }
+
+    def close(self):
+        with self._lock:
+            self.db.close()
+
+
+class InsightsCollector:
+    """Backfills and refreshes account insights in as few calls as the API allows.
+
+    All `metrics` go in one request per window, and a date range is split
+    into windows of at most `window_days` that are fetched concurrently.
+    Windows are aligned to multiples of the window length since the
+    epoch, so the same range always maps to the same windows and a window
+    that was fetched after it fully settled (`settle_days` past its end)
+    is skipped on later runs. Only the recent, still-changing windows are
+    requested again by a daily refresh.
+    """
+
+    def __init__(self, api: InstagramAPI, store: Optional[InsightsStore] = None,
+                 metrics: Sequence[str] = DEFAULT_METRICS, period: str = 'day',
+                 window_days: int = MAX_WINDOW_DAYS, settle_days: int = 2, max_workers: int = 4):
+        if window_days > MAX_WINDOW_DAYS:
+            raise ValueError(f"window_days cannot exceed {MAX_WINDOW_DAYS}")
+        self.api = api
+        self.store = store or InsightsStore()
+        self.metrics = list(metrics)
+        self.metrics_key = ','.join(sorted(self.metrics))
+        self.period = period
+        self.window = window_days * DAY
+        self.settle = settle_days * DAY
+        self.max_workers = max_workers
+
+    def windows(self, since: datetime, until: datetime) -> List[Tuple[int, int]]:
+        """Aligned (since, until) unix-second windows covering the range"""
+        start = int(since.timestamp()) // self.window * self.window
+        end = int(until.timestamp())
+        return [(s, min(s + self.window, end)) for s in range(start, end, self.window)]
+
+    def _is_complete(self, since: int) -> bool:
+        fetched_at = self.store.fetched_at(self.api.instagram_account_id, self.period, self.metrics_key, since)
+        return fetched_at is not None and fetched_at >= since + self.window + self.settle
+
+    def _fetch(self, since: int, until: int) -> int:
+        response = self.api.get_insights(self.metrics, self.period,
+                                         since=datetime.fromtimestamp(since, timezone.utc),
+                                         until=datetime.fromtimestamp(until, timezone.utc))
+        if response is None:
+            raise RuntimeError(f"insights window {since}-{until} failed")
+        return self.store.add_window(self.api.instagram_account_id, self.period, self.metrics_key,
+                                     since, until, response)
+
+    def collect(self, since: datetime, until: Optional[datetime] = None) -> Dict[str, int]:
+        """Fetch every missing window in [since, until) and return run counts"""
+        until = until or datetime.now(timezone.utc)
+        windows = self.windows(since, until)
+        todo = [w for w in windows if not self._is_complete(w[0])]
+        stats = {'windows': len(windows), 'skipped': len(windows) - len(todo), 'fetched': 0, 'failed': 0, 'points': 0}
+        if not todo:
+            return stats
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='insights') as pool:
+            futures = [pool.submit(self._fetch, *window) for window in todo]
+            for future in as_completed(futures):
+                try:
+                    stats['points'] += future.result()
+                    stats['fetched'] += 1
+                except Exception as exc:
+                    print(f"Error collecting insights: {exc}")
+                    stats['failed'] += 1
+        return stats
+
+
+if __name__ == "__main__":
+    import os
+    from datetime import timedelta
+
+    api = InstagramAPI(os.getenv("LONG_ACCESS_TOKEN"), os.getenv("INSTAGRAM_ACCOUNT_ID"))
+    collector = InsightsCollector(api)
+    print(collector.collect(datetime.now(timezone.utc) - timedelta(days=90)))
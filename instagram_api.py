@@ -1,12 +1,20 @@
-import requests
-from typing import Dict, List, Optional, Union
+from datetime import datetime
+from functools import partial
+from typing import Dict, Iterator, List, Optional, Union
 import json
 
+from graph_batch import GraphBatch
+from models import Comment, Media, MediaHydrator, decode_comments, decode_media, media_fields
+from pagination import as_utc, iter_items, iter_pages
+from transport import BASE_URL, GraphTransport, get_default_transport
+
 class InstagramAPI:
-    def __init__(self, access_token: str, instagram_account_id: str):
+    def __init__(self, access_token: str, instagram_account_id: str,
+                 transport: Optional[GraphTransport] = None, base_url: str = BASE_URL):
         self.access_token = access_token
         self.instagram_account_id = instagram_account_id
-        self.base_url = "https://graph.facebook.com/v18.0"
+        self.base_url = base_url
+        self.transport = transport or get_default_transport()
     
     def get_account_info(self) -> Optional[Dict]:
         """Get basic information about the Instagram business account"""
@@ -15,40 +23,106 @@ class InstagramAPI:
             'fields': 'id,username,profile_picture_url,followers_count,media_count',
             'access_token': self.access_token
         }
-        response = requests.get(url, params=params)
+        response = self.transport.get(url, params=params, account_id=self.instagram_account_id)
         if response.status_code == 200:
             return response.json()
         print(f"Error getting account info: {response.text}")
         return None
     
-    def get_media(self, limit: int = 25) -> Optional[List[Dict]]:
-        """Get recent media (posts) from the Instagram account"""
+    def get_media(self, limit: int = 25, profile: str = 'full',
+                  hydrator: Optional[MediaHydrator] = None) -> Optional[List[Media]]:
+        """Get recent media (posts) from the Instagram account using a field profile (ids, feed, full)"""
         url = f"{self.base_url}/{self.instagram_account_id}/media"
         params = {
-            'fields': 'id,caption,media_type,media_url,permalink,thumbnail_url,timestamp,like_count,comments_count',
+            'fields': media_fields(profile),
             'limit': limit,
             'access_token': self.access_token
         }
-        response = requests.get(url, params=params)
+        response = self.transport.get(url, params=params, account_id=self.instagram_account_id)
         if response.status_code == 200:
-            return response.json().get('data', [])
+            return decode_media(response.content, hydrator)
         print(f"Error getting media: {response.text}")
         return None
     
-    def create_media(self, image_url: str, caption: str) -> Optional[str]:
-        """Create a new media container (first step in posting)"""
+    def iter_media(self, page_size: int = 50, max_items: Optional[int] = None,
+                   since: Optional[datetime] = None, profile: str = 'full') -> Iterator[Media]:
+        """Walk the account's full media history newest-first, one page at a time"""
         url = f"{self.base_url}/{self.instagram_account_id}/media"
         params = {
-            'image_url': image_url,
-            'caption': caption,
+            'fields': media_fields(profile),
+            'limit': page_size,
             'access_token': self.access_token
         }
-        response = requests.post(url, params=params)
+        if since is not None:
+            since = as_utc(since)
+            params['since'] = int(since.timestamp())
+        pages = iter_pages(self.transport, url, params, account_id=self.instagram_account_id)
+        return iter_items(pages, max_items=max_items, since=since, decode=Media.from_graph)
+    
+    def get_lazy_media(self, limit: int = 25, profile: str = 'ids') -> Optional[List[Media]]:
+        """Get recent media with a cheap profile; other fields load in one batch when first read"""
+        return self.get_media(limit=limit, profile=profile, hydrator=MediaHydrator(self))
+    
+    def get_objects(self, ids: List[str], fields: str) -> Optional[Dict[str, Dict]]:
+        """Get fields for up to 50 objects in one request, keyed by id"""
+        url = f"{self.base_url}/"
+        params = {
+            'ids': ','.join(ids),
+            'fields': fields,
+            'access_token': self.access_token
+        }
+        response = self.transport.get(url, params=params, account_id=self.instagram_account_id)
+        if response.status_code == 200:
+            return response.json()
+        print(f"Error getting objects: {response.text}")
+        return None
+    
+    def create_media(self, image_url: Optional[str] = None, caption: Optional[str] = None,
+                     video_url: Optional[str] = None, media_type: Optional[str] = None,
+                     is_carousel_item: bool = False, children: Optional[List[str]] = None) -> Optional[str]:
+        """Create a new media container (first step in posting).
+
+        Pass image_url or video_url for a single item (media_type REELS,
+        VIDEO or STORIES for video), is_carousel_item=True for a carousel
+        child, or children=[container ids] for the CAROUSEL container itself.
+        """
+        url = f"{self.base_url}/{self.instagram_account_id}/media"
+        params = {'access_token': self.access_token}
+        if image_url:
+            params['image_url'] = image_url
+        if video_url:
+            params['video_url'] = video_url
+            params['media_type'] = media_type or 'REELS'
+        if children:
+            params['children'] = ','.join(children)
+            params['media_type'] = 'CAROUSEL'
+        elif media_type and not video_url:
+            params['media_type'] = media_type
+        if is_carousel_item:
+            params['is_carousel_item'] = 'true'
+            if video_url:
+                params['media_type'] = 'VIDEO'
+        elif caption:
+            params['caption'] = caption
+        response = self.transport.post(url, params=params, account_id=self.instagram_account_id)
         if response.status_code == 200:
             return response.json().get('id')
         print(f"Error creating media: {response.text}")
         return None
     
+    def get_container_status(self, container_id: str) -> Optional[Dict]:
+        """Get the processing status of a media container (status_code is IN_PROGRESS, FINISHED, ERROR, EXPIRED or PUBLISHED)"""
+        url = f"{self.base_url}/{container_id}"
+        params = {
+            'fields': 'id,status_code,status',
+            'access_token': self.access_token
+        }
+        response = self.transport.get(url, params=params, account_id=self.instagram_account_id)
+        if response.status_code == 200:
+            return response.json()
+        print(f"Error getting container status: {response.text}")
+        return None
+    
     def publish_media(self, creation_id: str) -> Optional[str]:
         """Publish a previously created media container"""
         url = f"{self.base_url}/{self.instagram_account_id}/media_publish"
@@ -56,39 +130,95 @@ class InstagramAPI:
             'creation_id': creation_id,
             'access_token': self.access_token
         }
-        response = requests.post(url, params=params)
+        response = self.transport.post(url, params=params, account_id=self.instagram_account_id)
         if response.status_code == 200:
             return response.json().get('id')
         print(f"Error publishing media: {response.text}")
         return None
     
-    def get_insights(self, metric: str = 'impressions', period: str = 'day') -> Optional[Dict]:
-        """Get insights for the Instagram account"""
+    def get_insights(self, metric: Union[str, List[str]] = 'impressions', period: str = 'day',
+                     since: Optional[datetime] = None, until: Optional[datetime] = None,
+                     metric_type: Optional[str] = None) -> Optional[Dict]:
+        """Get insights for the Instagram account, several metrics per call when given a list"""
         url = f"{self.base_url}/{self.instagram_account_id}/insights"
         params = {
-            'metric': metric,
+            'metric': metric if isinstance(metric, str) else ','.join(metric),
             'period': period,
             'access_token': self.access_token
         }
-        response = requests.get(url, params=params)
+        if since is not None:
+            params['since'] = int(since.timestamp())
+        if until is not None:
+            params['until'] = int(until.timestamp())
+        if metric_type:
+            params['metric_type'] = metric_type
+        response = self.transport.get(url, params=params, account_id=self.instagram_account_id)
         if response.status_code == 200:
             return response.json()
         print(f"Error getting insights: {response.text}")
         return None
     
-    def get_comments(self, media_id: str) -> Optional[List[Dict]]:
+    def get_comments(self, media_id: str) -> Optional[List[Comment]]:
         """Get comments for a specific media post"""
         url = f"{self.base_url}/{media_id}/comments"
         params = {
             'fields': 'id,text,username,timestamp,like_count',
             'access_token': self.access_token
         }
-        response = requests.get(url, params=params)
+        response = self.transport.get(url, params=params, account_id=self.instagram_account_id)
         if response.status_code == 200:
-            return response.json().get('data', [])
+            return decode_comments(response.content, media_id)
         print(f"Error getting comments: {response.text}")
         return None
     
+    def iter_comments(self, media_id: str, page_size: int = 50, max_items: Optional[int] = None,
+                      since: Optional[datetime] = None) -> Iterator[Comment]:
+        """Walk every comment on a post, following cursors lazily"""
+        url = f"{self.base_url}/{media_id}/comments"
+        params = {
+            'fields': 'id,text,username,timestamp,like_count',
+            'limit': page_size,
+            'access_token': self.access_token
+        }
+        if since is not None:
+            since = as_utc(since)
+            params['since'] = int(since.timestamp())
+        pages = iter_pages(self.transport, url, params, account_id=self.instagram_account_id)
+        return iter_items(pages, max_items=max_items, since=since, newest_first=False,
+                          decode=partial(Comment.from_graph, media_id=media_id))
+    
+    def get_comments_batch(self, media_ids: List[str]) -> Dict[str, Optional[List[Comment]]]:
+        """Get comments for many posts using Graph batch requests (50 posts per call)"""
+        batch = GraphBatch(self.access_token, transport=self.transport, base_url=self.base_url,
+                           account_id=self.instagram_account_id)
+        calls = {
+            media_id: batch.get(f"{media_id}/comments", {'fields': 'id,text,username,timestamp,like_count'})
+            for media_id in media_ids
+        }
+        batch.execute()
+        
+        comments = {}
+        for media_id, call in calls.items():
+            if call.ok:
+                comments[media_id] = decode_comments(call.body, media_id)
+            else:
+                print(f"Error getting comments for {media_id}: {call.body}")
+                comments[media_id] = None
+        return comments
+    
+    def get_replies(self, comment_id: str) -> Optional[List[Comment]]:
+        """Get replies to a specific comment"""
+        url = f"{self.base_url}/{comment_id}/replies"
+        params = {
+            'fields': 'id,text,username,timestamp',
+            'access_token': self.access_token
+        }
+        response = self.transport.get(url, params=params, account_id=self.instagram_account_id)
+        if response.status_code == 200:
+            return decode_comments(response.content)
+        print(f"Error getting replies: {response.text}")
+        return None
+    
     def reply_to_comment(self, comment_id: str, message: str) -> Optional[str]:
         """Reply to a specific comment"""
         url = f"{self.base_url}/{comment_id}/replies"
@@ -96,11 +226,57 @@ class InstagramAPI:
             'message': message,
             'access_token': self.access_token
         }
-        response = requests.post(url, params=params)
+        response = self.transport.post(url, params=params, account_id=self.instagram_account_id)
         if response.status_code == 200:
             return response.json().get('id')
         print(f"Error replying to comment: {response.text}")
         return None
+    
+    def search_hashtag(self, name: str) -> Optional[str]:
+        """Get the id of a hashtag (counts toward the 30 unique hashtags per 7 days limit)"""
+        url = f"{self.base_url}/ig_hashtag_search"
+        params = {
+            'user_id': self.instagram_account_id,
+            'q': name.lstrip('#'),
+            'access_token': self.access_token
+        }
+        response = self.transport.get(url, params=params, account_id=self.instagram_account_id)
+        if response.status_code == 200:
+            data = response.json().get('data', [])
+            return data[0]['id'] if data else None
+        print(f"Error searching hashtag: {response.text}")
+        return None
+    
+    def iter_hashtag_media(self, hashtag_id: str, edge: str = 'recent_media', page_size: int = 50,
+                           max_items: Optional[int] = None, profile: str = 'feed') -> Iterator[Media]:
+        """Walk a hashtag's top_media or recent_media (public posts by other accounts)"""
+        if edge not in ('top_media', 'recent_media'):
+            raise ValueError("edge must be 'top_media' or 'recent_media'.")
+        url = f"{self.base_url}/{hashtag_id}/{edge}"
+        params = {
+            'user_id': self.instagram_account_id,
+            'fields': media_fields(profile),
+            'limit': page_size,
+            'access_token': self.access_token
+        }
+        pages = iter_pages(self.transport, url, params, account_id=self.instagram_account_id)
+        return iter_items(pages, max_items=max_items, newest_first=False, decode=Media.from_graph)
+    
+    def get_business_discovery(self, username: str, media_limit: int = 25,
+                               profile: str = 'feed') -> Optional[Dict]:
+        """Get another business/creator account's profile and recent media by username"""
+        url = f"{self.base_url}/{self.instagram_account_id}"
+        fields = (f"business_discovery.username({username}){{id,username,followers_count,media_count,"
+                  f"media.limit({media_limit}){{{media_fields(profile)}}}}}")
+        params = {
+            'fields': fields,
+            'access_token': self.access_token
+        }
+        response = self.transport.get(url, params=params, account_id=self.instagram_account_id)
+        if response.status_code == 200:
+            return response.json().get('business_discovery')
+        print(f"Error getting business discovery: {response.text}")
+        return None
 
 # Example usage:
 if __name__ == "__main__":
@@ -119,7 +295,7 @@ if __name__ == "__main__":
     # Get recent posts
     media = api.get_media(limit=5)
     if media:
-        print(f"\nRecent Posts: {json.dumps(media, indent=2)}")
+        print(f"\nRecent Posts: {json.dumps([m.to_dict() for m in media], indent=2)}")
     
     # Get insights
     insights = api.get_insights()
@@ -0,0 +1,255 @@
+import bisect
+import http.server
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import requests
+
+from retry import endpoint_key
+from transport import GraphTransport
+
+# Upper bounds in seconds; Graph calls usually land between 50ms and 2s
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram (cumulative on export, like Prometheus)"""
+
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds: Sequence[float] = LATENCY_BUCKETS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (inf if past the last bucket)"""
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for bound, count in zip(self.bounds + (float('inf'),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        total, result = 0, []
+        for bound, count in zip(self.bounds + (float('inf'),), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+class EndpointStats:
+    """Everything measured for one method + endpoint shape"""
+
+    __slots__ = ('latency', 'statuses', 'errors', 'bytes_in', 'bytes_out')
+
+    def __init__(self, bounds: Sequence[float]):
+        self.latency = Histogram(bounds)
+        self.statuses: Dict[int, int] = {}
+        self.errors = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+
+class GraphMetrics:
+    """Per-endpoint Graph call metrics, collected by a transport hook.
+
+    Every request sent on the wire is recorded under its endpoint shape
+    (e.g. GET /{id}/comments): a latency histogram, status code counts,
+    transport errors and bytes sent/received. Retry counters, rate-limit
+    usage and cache hits are read from the transport's retry policy,
+    scheduler and cache when a snapshot or export is taken, so they cost
+    nothing per call.
+    """
+
+    def __init__(self, transport: Optional[GraphTransport] = None, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.endpoints: Dict[str, EndpointStats] = {}
+        self.transport = None
+        self._lock = threading.Lock()
+        if transport is not None:
+            self.install(transport)
+
+    def install(self, transport: GraphTransport) -> 'GraphMetrics':
+        self.transport = transport
+        transport.add_hook(self)
+        return self
+
+    def __call__(self, method: str, url: str, params: Optional[Dict], data: Optional[Dict],
+                 response: Optional[requests.Response], elapsed: float):
+        endpoint = endpoint_key(method, url)
+        if response is not None:
+            length = response.headers.get('Content-Length')
+            bytes_in = int(length) if length and length.isdigit() else len(response.content)
+            body = response.request.body or b''
+            bytes_out = len(response.request.url) + len(body)
+        with self._lock:
+            stats = self.endpoints.get(endpoint)
+            if stats is None:
+                stats = self.endpoints[endpoint] = EndpointStats(self.buckets)
+            stats.latency.observe(elapsed)
+            if response is None:
+                stats.errors += 1
+                return
+            stats.statuses[response.status_code] = stats.statuses.get(response.status_code, 0) + 1
+            stats.bytes_in += bytes_in
+            stats.bytes_out += bytes_out
+
+    def snapshot(self) -> Dict:
+        """Plain-dict view of every metric, for logging or in-process checks"""
+        with self._lock:
+            endpoints = {
+                endpoint: {
+                    'calls': stats.latency.count,
+                    'seconds': stats.latency.sum,
+                    'p50': stats.latency.quantile(0.5),
+                    'p95': stats.latency.quantile(0.95),
+                    'statuses': dict(stats.statuses),
+                    'errors': stats.errors,
+                    'bytes_in': stats.bytes_in,
+                    'bytes_out': stats.bytes_out
+                } for endpoint, stats in self.endpoints.items()
+            }
+        snapshot = {'endpoints': endpoints}
+        transport = self.transport
+        if transport is not None and transport.retry_policy is not None:
+            snapshot['retries'] = transport.retry_policy.stats.snapshot()
+        if transport is not None and transport.scheduler is not None:
+            snapshot['rate_limit'] = transport.scheduler.snapshot()
+        if transport is not None and transport.cache is not None:
+            snapshot['cache'] = transport.cache.stats()
+        return snapshot
+
+    def top_endpoints(self, n: int = 10) -> List[Tuple[str, float, int]]:
+        """(endpoint, total seconds, calls) for the endpoints that took the most wall-clock time"""
+        with self._lock:
+            totals = [(endpoint, stats.latency.sum, stats.latency.count) for endpoint, stats in self.endpoints.items()]
+        return sorted(totals, key=lambda t: t[1], reverse=True)[:n]
+
+    def render(self) -> str:
+        """Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        lines: List[str] = []
+
+        def family(name: str, kind: str, help_text: str):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            endpoints = sorted(self.endpoints.items())
+            family('graph_request_duration_seconds', 'histogram', 'Graph API request latency.')
+            for endpoint, stats in endpoints:
+                labels = _endpoint_labels(endpoint)
+                for bound, count in stats.latency.cumulative():
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'graph_request_duration_seconds_bucket{{{labels},le="{le}"}} {count}')
+                lines.append(f"graph_request_duration_seconds_sum{{{labels}}} {stats.latency.sum:.6f}")
+                lines.append(f"graph_request_duration_seconds_count{{{labels}}} {stats.latency.count}")
+
+            family('graph_requests_total', 'counter', 'Graph API responses by status code.')
+            for endpoint, stats in endpoints:
+                for status, count in sorted(stats.statuses.items()):
+                    lines.append(f'graph_requests_total{{{_endpoint_labels(endpoint)},status="{status}"}} {count}')
+
+            family('graph_request_errors_total', 'counter', 'Graph API requests that failed without a response.')
+            for endpoint, stats in endpoints:
+                lines.append(f"graph_request_errors_total{{{_endpoint_labels(endpoint)}}} {stats.errors}")
+
+            family('graph_response_bytes_total', 'counter', 'Response bytes received (as sent on the wire).')
+            for endpoint, stats in endpoints:
+                lines.append(f"graph_response_bytes_total{{{_endpoint_labels(endpoint)}}} {stats.bytes_in}")
+
+            family('graph_request_bytes_total', 'counter', 'Request bytes sent (URL and body).')
+            for endpoint, stats in endpoints:
+                lines.append(f"graph_request_bytes_total{{{_endpoint_labels(endpoint)}}} {stats.bytes_out}")
+
+        retries = snapshot.get('retries', {})
+        for name, key, help_text in (
+                ('graph_retries_total', 'retries', 'Retried Graph API attempts.'),
+                ('graph_retry_seconds_total', 'retry_latency', 'Time spent waiting and retrying.'),
+                ('graph_retries_exhausted_total', 'exhausted', 'Calls that failed after all retries.'),
+                ('graph_circuit_opens_total', 'circuit_opens', 'Times an endpoint circuit breaker opened.')):
+            if retries:
+                family(name, 'counter', help_text)
+            for endpoint, entry in sorted(retries.items()):
+                lines.append(f"{name}{{{_endpoint_labels(endpoint)}}} {entry[key]}")
+
+        rate_limit = snapshot.get('rate_limit')
+        if rate_limit:
+            family('graph_rate_limit_usage_percent', 'gauge', 'Latest reported rate-limit usage.')
+            lines.append(f'graph_rate_limit_usage_percent{{scope="app"}} {rate_limit["app"]}')
+            for account_id, usage in sorted(rate_limit['accounts'].items()):
+                lines.append(f'graph_rate_limit_usage_percent{{scope="account",account="{_escape(account_id)}"}} {usage}')
+            family('graph_throttled_total', 'counter', 'Throttling responses seen by the scheduler.')
+            lines.append(f"graph_throttled_total {rate_limit['throttled']}")
+
+        cache = snapshot.get('cache')
+        if cache:
+            family('graph_cache_events_total', 'counter', 'Response cache lookups by outcome.')
+            for outcome in ('hits', 'misses', 'revalidated'):
+                lines.append(f'graph_cache_events_total{{outcome="{outcome}"}} {cache[outcome]}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _endpoint_labels(endpoint: str) -> str:
+    method, _, path = endpoint.partition(' ')
+    return f'method="{method}",endpoint="{_escape(path)}"'
+
+
+class MetricsHandler(http.server.BaseHTTPRequestHandler):
+    """Serves GraphMetrics.render() at the server's path"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split('?')[0] != self.server.path:
+            self.send_error(404)
+            return
+        payload = self.server.metrics.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class MetricsServer(http.server.ThreadingHTTPServer):
+    """Prometheus scrape endpoint for a GraphMetrics instance"""
+
+    daemon_threads = True
+
+    def __init__(self, metrics: GraphMetrics, port: int = 9100, path: str = '/metrics', host: str = ''):
+        super().__init__((host, port), MetricsHandler)
+        self.metrics = metrics
+        self.path = path
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host or 'localhost'}:{port}{self.path}"
+
+    def start(self):
+        """Serve in a background thread"""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        print(f"Metrics listening at {self.url}")
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
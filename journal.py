@@ -0,0 +1,254 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from session_store import SessionStore
+
+INTENT = 'intent'
+DONE = 'done'
+FAILED = 'failed'
+UNKNOWN = 'unknown'          # the call raised; it may or may not have taken effect
+
+DAY = 24 * 3600
+
+
+class RequestJournal:
+    """Write-ahead log of Graph write operations (requests.jsonl).
+
+    Every write (create_media, publish_media, reply_to_comment, ...) is
+    journaled under an idempotency key: an intent record before the call
+    and a done, failed or unknown (the call raised) record after it.
+    append() returns once its record is on disk. Concurrent writers
+    share fsyncs (group commit):
+    one thread writes and syncs everything buffered while the others
+    wait, so the cost per record drops as the write rate goes up.
+
+    Every `compact_every` records or `compact_interval` seconds the latest
+    state of each operation is saved to the "journal" section of
+    session.json and the log is truncated. Finished operations are kept
+    there for `retain` seconds so their keys still dedupe; unfinished ones
+    (intent or unknown) for `retain_unfinished`, after which they are too
+    old to resume. On open only the snapshot and the records after it are
+    replayed.
+
+    Compaction truncates the log, so only one journal may be open per path
+    in a process; components share it through RequestJournal.shared().
+    """
+
+    _open: Dict[str, 'RequestJournal'] = {}
+    _open_lock = threading.RLock()
+
+    @classmethod
+    def shared(cls, path: str = 'requests.jsonl', store: Optional[SessionStore] = None) -> 'RequestJournal':
+        """The journal already open for path, or a new one"""
+        with cls._open_lock:
+            return cls._open.get(os.path.abspath(path)) or cls(path, store)
+
+    def __init__(self, path: str = 'requests.jsonl', store: Optional[SessionStore] = None,
+                 compact_every: int = 1000, compact_interval: float = 3600, retain: float = 30 * DAY,
+                 retain_unfinished: float = 7 * DAY):
+        self.path = path
+        if os.path.abspath(path) in self._open:
+            raise ValueError(f"A journal is already open for {path}; use RequestJournal.shared().")
+        self.store = store or SessionStore.shared()
+        self.compact_every = compact_every
+        self.compact_interval = compact_interval
+        self.retain = retain
+        self.retain_unfinished = retain_unfinished
+
+        self._lock = threading.Lock()
+        self._committed = threading.Condition(self._lock)
+        self._buffer: List[str] = []
+        self._writing = False
+        self._compacting = False
+        self._entries: Dict[Tuple[str, str], Dict] = {}
+        self.stats = {'records': 0, 'commits': 0, 'compactions': 0}
+
+        snapshot = self.store.get('journal', {}) or {}
+        for entry in snapshot.get('entries', []):
+            self._entries[entry['op'], entry['key']] = entry
+        self._seq = self._durable = self._compacted_seq = snapshot.get('seq', 0)
+        self._compacted_at = time.time()
+        tail = 0
+        for record in self.records():
+            # Records at or below the snapshot's seq survived a crash mid-compaction
+            seq = record.get('seq')
+            if seq is not None and seq <= self._compacted_seq:
+                continue
+            self._apply(record)
+            self._seq = self._durable = max(self._seq, seq or 0)
+            tail += 1
+        if tail:
+            print(f"Replayed {tail} journal records after snapshot {self._compacted_seq}")
+        self._trim_torn_tail()
+        self._file = open(path, 'a', encoding='utf-8')
+        with self._open_lock:
+            self._open[os.path.abspath(path)] = self
+
+    # Writing
+
+    def append(self, record: Dict) -> Dict:
+        """Journal a record and wait until it is durable; returns it with its seq and ts"""
+        with self._lock:
+            self._seq += 1
+            record = dict(record, seq=self._seq, ts=record.get('ts', time.time()))
+            self._apply(record)
+            self._buffer.append(json.dumps(record, separators=(',', ':')) + '\n')
+            self.stats['records'] += 1
+            while self._durable < record['seq']:
+                if self._writing or self._compacting:
+                    # A pending compaction snapshots this record too
+                    self._committed.wait()
+                else:
+                    self._commit()
+            compact = not self._compacting and (self._seq - self._compacted_seq >= self.compact_every or
+                                                time.time() - self._compacted_at >= self.compact_interval)
+            if compact:
+                self._compacting = True
+        if compact:
+            self.compact()
+        return record
+
+    def intent(self, op: str, key: str, **fields) -> Dict:
+        """Record that a write is about to be sent"""
+        return self.append(dict(fields, op=op, key=key, state=INTENT))
+
+    def done(self, op: str, key: str, **fields) -> Dict:
+        return self.append(dict(fields, op=op, key=key, state=DONE))
+
+    def failed(self, op: str, key: str, **fields) -> Dict:
+        return self.append(dict(fields, op=op, key=key, state=FAILED))
+
+    def unknown(self, op: str, key: str, **fields) -> Dict:
+        """Record that the call raised, so whether it took effect must be checked"""
+        return self.append(dict(fields, op=op, key=key, state=UNKNOWN))
+
+    def _commit(self):
+        """Write and fsync everything buffered; called holding the lock, which is released meanwhile"""
+        lines, upto = self._buffer, self._seq
+        self._buffer = []
+        self._writing = True
+        self._lock.release()
+        try:
+            self._file.write(''.join(lines))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except BaseException:
+            self._lock.acquire()
+            self._buffer[:0] = lines
+            self._writing = False
+            self._committed.notify_all()
+            raise
+        self._lock.acquire()
+        self.stats['commits'] += 1
+        self._durable = upto
+        self._writing = False
+        self._committed.notify_all()
+
+    def _apply(self, record: Dict):
+        ident = (record.get('op'), record.get('key'))
+        if record.get('state') == INTENT:
+            self._entries[ident] = record
+        else:
+            # Outcomes keep the intent's fields (message, container_id, ...)
+            self._entries[ident] = dict(self._entries.get(ident, {}), **record)
+
+    # Compaction
+
+    def compact(self):
+        """Snapshot the latest state of every operation into session.json and truncate the log"""
+        with self._lock:
+            self._compacting = True
+            while self._writing:
+                self._committed.wait()
+            now = time.time()
+            self._entries = {ident: entry for ident, entry in self._entries.items() if not self._expired(entry, now)}
+            # Buffered records are covered by the snapshot and durable once it is saved
+            snapshot = {'seq': self._seq, 'entries': list(self._entries.values())}
+            covered, self._buffer = self._buffer, []
+            # Hold off other writers until the log is truncated; new records wait in the buffer
+            self._writing = True
+        try:
+            self.store.set('journal', snapshot)
+            self._file.truncate(0)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except BaseException:
+            with self._lock:
+                self._buffer[:0] = covered
+                self._writing = self._compacting = False
+                self._committed.notify_all()
+            raise
+        with self._lock:
+            self._writing = self._compacting = False
+            self._durable = self._compacted_seq = snapshot['seq']
+            self._compacted_at = time.time()
+            self.stats['compactions'] += 1
+            self._committed.notify_all()
+
+    def _expired(self, entry: Dict, now: float) -> bool:
+        keep = self.retain_unfinished if entry.get('state') in (INTENT, UNKNOWN) else self.retain
+        return entry.get('ts', 0) < now - keep
+
+    # Reading
+
+    def get(self, op: str, key: str) -> Optional[Dict]:
+        """Latest state of one operation"""
+        with self._lock:
+            entry = self._entries.get((op, key))
+            return dict(entry) if entry else None
+
+    def completed(self, op: str, key: str) -> Optional[Dict]:
+        """The operation's done record, if it already succeeded"""
+        entry = self.get(op, key)
+        return entry if entry and entry['state'] == DONE else None
+
+    def entries(self, op: Optional[str] = None) -> List[Dict]:
+        """Latest state of every known operation (or of one op)"""
+        with self._lock:
+            return [dict(entry) for (entry_op, _), entry in self._entries.items() if op is None or entry_op == op]
+
+    def unfinished(self, op: Optional[str] = None) -> List[Dict]:
+        """Intents with no recorded or an unknown outcome: the tail to verify after a crash"""
+        return [entry for entry in self.entries(op) if entry['state'] in (INTENT, UNKNOWN)]
+
+    def records(self) -> Iterator[Dict]:
+        """Records written since the last compaction, skipping a torn final line"""
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+        except FileNotFoundError:
+            return
+
+    def _trim_torn_tail(self):
+        """Cut a partial last line left by a crash, so the next record starts on a line of its own"""
+        try:
+            with open(self.path, 'rb+') as f:
+                end = f.seek(0, os.SEEK_END)
+                f.seek(max(0, end - 1))
+                if end == 0 or f.read(1) == b'\n':
+                    return
+                while end > 0:
+                    start = max(0, end - 4096)
+                    f.seek(start)
+                    newline = f.read(end - start).rfind(b'\n')
+                    if newline >= 0:
+                        end = start + newline + 1
+                        break
+                    end = start
+                f.truncate(end)
+        except FileNotFoundError:
+            return
+
+    def close(self):
+        self.compact()
+        with self._lock:
+            self._file.close()
+        with self._open_lock:
+            self._open.pop(os.path.abspath(self.path), None)
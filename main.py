@@ -1,5 +1,360 @@
+import asyncio
+import os
+import queue
+import random
+import signal
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Union
+
+from dotenv import load_dotenv
+
+from comment_generation import CommentGenerator, FakeBackend
+from insights_collector import InsightsCollector, InsightsStore
+from instagram_api import InstagramAPI
+from instrumentation import GraphMetrics, MetricsServer
+from journal import RequestJournal
+from media_sync import MediaSync, SyncStore
+from models import Account, Comment
+from publisher import Publisher, ScheduleQueue
+from rate_limit import RateLimitScheduler
+from reply_pipeline import ReplyPipeline
+from response_cache import ResponseCache
+from session_store import SessionStore
+from test2 import InstagramAuth
+from token_manager import TokenManager
+from transport import GraphTransport
+from webhook import WebhookEvent, WebhookServer
+
+
+@dataclass
+class Job:
+    """A periodic job and its run history"""
+
+    name: str
+    interval: float
+    fn: Callable[['BotState'], Union[None, Awaitable[None]]]
+    jitter: float = 0.1             # fraction of interval, applied both ways
+    initial_delay: float = 0.0
+    timeout: Optional[float] = None  # coroutine jobs only
+    runs: int = 0
+    failures: int = 0
+    overlaps: int = 0
+    last_started: Optional[float] = None
+    last_duration: Optional[float] = None
+    task: Optional[asyncio.Task] = field(default=None, repr=False)
+    thread: Optional[Future] = field(default=None, repr=False)
+
+    @property
+    def running(self) -> bool:
+        # A plain function's thread outlives its task if the task is cancelled
+        return any(run is not None and not run.done() for run in (self.task, self.thread))
+
+    def next_delay(self) -> float:
+        return max(0.0, self.interval * (1 + random.uniform(-self.jitter, self.jitter)))
+
+
+class Scheduler:
+    """Cooperative asyncio scheduler for periodic jobs.
+
+    Each job ticks on its own jittered interval (so jobs across restarts
+    and accounts do not line up). A tick that finds the previous run still
+    going is skipped and counted as an overlap, so a slow job never runs
+    twice at once. Plain functions run on worker threads; coroutines run
+    on the loop. Only coroutines can have a timeout, since a thread cannot
+    be interrupted. shutdown() stops new ticks and waits for running jobs,
+    and always for the threads, so nothing they use is closed under them.
+    """
+
+    def __init__(self, state: 'BotState', max_threads: int = 8):
+        self.state = state
+        self.jobs: Dict[str, Job] = {}
+        self._stopping = asyncio.Event()
+        self._tickers: List[asyncio.Task] = []
+        self._threads = ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix='job')
+
+    def add(self, name: str, interval: float, fn: Callable, jitter: float = 0.1,
+            initial_delay: float = 0.0, timeout: Optional[float] = None) -> Job:
+        if timeout is not None and not asyncio.iscoroutinefunction(fn):
+            raise ValueError(f"Job {name} runs on a thread, which cannot be timed out")
+        job = Job(name, interval, fn, jitter, initial_delay, timeout)
+        self.jobs[name] = job
+        return job
+
+    async def run(self):
+        """Tick every job until shutdown() is called"""
+        self._tickers = [asyncio.create_task(self._tick(job), name=f"tick-{job.name}")
+                         for job in self.jobs.values()]
+        await self._stopping.wait()
+        for ticker in self._tickers:
+            ticker.cancel()
+        await asyncio.gather(*self._tickers, return_exceptions=True)
+
+    async def _tick(self, job: Job):
+        delay = job.initial_delay + random.uniform(0, job.jitter * job.interval)
+        while True:
+            await asyncio.sleep(delay)
+            delay = job.next_delay()
+            if job.running:
+                job.overlaps += 1
+                print(f"Skipping {job.name}: previous run still in progress")
+                continue
+            job.task = asyncio.create_task(self._run_job(job), name=f"job-{job.name}")
+
+    async def _run_job(self, job: Job):
+        job.last_started = time.time()
+        job.runs += 1
+        try:
+            if asyncio.iscoroutinefunction(job.fn):
+                call = job.fn(self.state)
+                await asyncio.wait_for(call, job.timeout) if job.timeout else await call
+            else:
+                job.thread = self._threads.submit(job.fn, self.state)
+                await asyncio.wrap_future(job.thread)
+        except Exception as exc:
+            job.failures += 1
+            print(f"Error in job {job.name}: {exc!r}")
+        finally:
+            job.last_duration = time.time() - job.last_started
+
+    def stop(self):
+        self._stopping.set()
+
+    async def shutdown(self, timeout: float = 60):
+        """Stop ticking, give running coroutine jobs up to `timeout` seconds and wait for job threads"""
+        self.stop()
+        running = [job.task for job in self.jobs.values() if job.task is not None and not job.task.done()]
+        if running:
+            print(f"Waiting for {len(running)} running job(s)...")
+            done, pending = await asyncio.wait(running, timeout=timeout)
+            for task in pending:
+                task.cancel()
+        threads = [job.thread for job in self.jobs.values() if job.thread is not None and not job.thread.done()]
+        if threads:
+            print(f"Waiting for {len(threads)} job thread(s) to finish...")
+            await asyncio.wait([asyncio.wrap_future(thread) for thread in threads])
+        self._threads.shutdown(wait=False)
+
+    def status(self) -> Dict[str, Dict]:
+        return {name: {'runs': job.runs, 'failures': job.failures, 'overlaps': job.overlaps,
+                       'last_started': job.last_started, 'last_duration': job.last_duration,
+                       'running': job.running}
+                for name, job in self.jobs.items()}
+
+
+class EventRouter:
+    """Feeds webhook events to the reply pipeline of the account they belong to.
+
+    Runs on its own thread so the webhook handlers only ever enqueue; when
+    a pipeline's ingest queue is full the router blocks, the webhook queue
+    fills and the server answers 503 until there is room again. Events for
+    accounts without a pipeline are counted and dropped.
+    """
+
+    def __init__(self, events: queue.Queue, pipelines: Dict[str, ReplyPipeline]):
+        self.events = events
+        self.pipelines = pipelines
+        self.stats = {'routed': 0, 'unrouted': 0}
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> 'EventRouter':
+        self._thread = threading.Thread(target=self._run, name='webhook-router', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Route everything already queued, then stop"""
+        if self._thread is not None:
+            self.events.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while True:
+            event: Optional[WebhookEvent] = self.events.get()
+            if event is None:
+                return
+            pipeline = self.pipelines.get(event.account_id)
+            if pipeline is None:
+                self.stats['unrouted'] += 1
+                continue
+            try:
+                pipeline.submit_event(event)
+                self.stats['routed'] += 1
+            except Exception as exc:
+                print(f"Error routing webhook event for {event.account_id}: {exc}")
+
+
+class BotState:
+    """Everything the jobs share, built once at startup and kept warm.
+
+    One pooled transport (rate-limit scheduler, retries, response cache,
+    metrics), the token manager and the resolved accounts, one
+    InstagramAPI per account, the SQLite stores, the per-account reply
+    pipelines and publishers, and the webhook receiver feeding the
+    pipelines when one is started.
+    """
+
+    def __init__(self, transport: GraphTransport, tokens: TokenManager,
+                 generate: Optional[Callable[[Comment], Optional[str]]] = None):
+        self.transport = transport
+        self.tokens = tokens
+        self.session = tokens.store
+        self.metrics = GraphMetrics(transport)
+        self.sync_store = SyncStore()
+        self.insights_store = InsightsStore()
+        self.schedule = ScheduleQueue()
+        self.journal = RequestJournal.shared(store=self.session)
+        self.generate = generate
+        self.apis: Dict[str, InstagramAPI] = {}
+        self.pipelines: Dict[str, ReplyPipeline] = {}
+        self.publishers: Dict[str, Publisher] = {}
+        self.replied_runs: Dict[str, int] = {}     # account id -> last sync run handed to its pipeline
+        self.webhook: Optional[WebhookServer] = None
+        self.router: Optional[EventRouter] = None
+        tokens.on_refresh(self.update_tokens)
+
+    @classmethod
+    def from_env(cls) -> 'BotState':
+        load_dotenv()
+        transport = GraphTransport(scheduler=RateLimitScheduler(), cache=ResponseCache())
+        auth = InstagramAuth(os.getenv("APP_ID"), os.getenv("APP_SECRET"), "http://localhost:8000/callback",
+                             transport=transport)
+        tokens = TokenManager(auth, SessionStore.shared())
+        if not tokens.user_token and os.getenv("LONG_ACCESS_TOKEN"):
+            tokens.set_user_token(os.getenv("LONG_ACCESS_TOKEN"))
+
+        generate = None
+        if os.getenv("GENERATION_BACKEND") == 'fake':
+            generate = CommentGenerator(FakeBackend())
+        return cls(transport, tokens, generate)
+
+    def resolve_accounts(self):
+        """Use the accounts saved in session.json; only ask the API when there are none"""
+        if not self.tokens.accounts():
+            self.tokens.refresh_accounts()
+        for account in self.tokens.accounts():
+            account_id = account.instagram_account_id
+            if account_id in self.apis:
+                continue
+            api = InstagramAPI(account.page_token, account_id, transport=self.transport)
+            self.apis[account_id] = api
+            self.publishers[account_id] = Publisher(api, self.schedule, journal=self.journal).start()
+            if self.generate is not None:
+                self.pipelines[account_id] = ReplyPipeline(api, self.generate, journal=self.journal).start()
+
+    def start_webhook(self, server: WebhookServer):
+        """Serve webhook notifications and route their comments to the reply pipelines"""
+        self.webhook = server
+        self.router = EventRouter(server.events, self.pipelines).start()
+        server.start()
+
+    def update_tokens(self, accounts: List[Account]):
+        """Point the existing APIs (and so their publishers and pipelines) at refreshed page tokens"""
+        for account in accounts:
+            api = self.apis.get(account.instagram_account_id)
+            if api is not None:
+                api.access_token = account.page_token
+
+    def close(self):
+        """Flush pending work, then release files and connections"""
+        if self.webhook is not None:
+            self.webhook.stop()
+            self.router.stop()
+        for pipeline in self.pipelines.values():
+            pipeline.stop()
+        for publisher in self.publishers.values():
+            publisher.stop()
+        if isinstance(self.generate, CommentGenerator):
+            self.generate.close()
+        self.journal.close()
+        self.sync_store.close()
+        self.insights_store.close()
+        self.schedule.close()
+        self.transport.close()
+
+
+# Jobs
+
+def sync_job(state: BotState):
+    for account_id, api in list(state.apis.items()):
+        stats = MediaSync(api, state.sync_store).sync()
+        print(f"Synced {account_id}: {stats}")
+
+
+def reply_job(state: BotState):
+    """Queue comments first seen in a sync run not yet handed to the pipeline"""
+    for account_id, pipeline in list(state.pipelines.items()):
+        run_id = state.sync_store.last_run(account_id)
+        if run_id is None or state.replied_runs.get(account_id) == run_id:
+            continue
+        for row in state.sync_store.new_comments(run_id):
+            pipeline.submit(Comment(row['id'], row['text'], row['username'], None,
+                                    row['like_count'] or 0, row['media_id']))
+        state.replied_runs[account_id] = run_id
+
+
+def insights_job(state: BotState):
+    since = datetime.now(timezone.utc) - timedelta(days=30)
+    for account_id, api in list(state.apis.items()):
+        stats = InsightsCollector(api, state.insights_store).collect(since)
+        print(f"Insights for {account_id}: {stats}")
+
+
+def token_job(state: BotState):
+    state.tokens.token_info()
+    if state.tokens.needs_refresh():
+        state.tokens.refresh()
+    # New or changed accounts get their APIs, publishers and pipelines here
+    state.resolve_accounts()
+
+
+# name -> (job, interval, initial delay), in seconds
+JOBS = {
+    'tokens': (token_job, 6 * 3600, 6 * 3600),
+    'sync': (sync_job, 15 * 60, 0),
+    'replies': (reply_job, 60, 30),
+    'insights': (insights_job, 3600, 60),
+}
+
+
+async def run_daemon(state: BotState, jobs: Dict = JOBS):
+    scheduler = Scheduler(state)
+    for name, (fn, interval, initial_delay) in jobs.items():
+        scheduler.add(name, interval, fn, initial_delay=initial_delay)
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, scheduler.stop)
+
+    metrics_port = os.getenv("METRICS_PORT")
+    metrics_server = MetricsServer(state.metrics, port=int(metrics_port)).start() if metrics_port else None
+    # Webhooks deliver comments as they happen; the replies job still catches anything missed
+    if os.getenv("WEBHOOK_VERIFY_TOKEN"):
+        state.start_webhook(WebhookServer(os.getenv("APP_SECRET"), os.getenv("WEBHOOK_VERIFY_TOKEN"),
+                                          port=int(os.getenv("WEBHOOK_PORT", "8000"))))
+
+    print(f"instabot running for {len(state.apis)} account(s); Ctrl+C to stop")
+    await scheduler.run()
+
+    print("Shutting down...")
+    await scheduler.shutdown()
+    if metrics_server:
+        metrics_server.stop()
+    await asyncio.to_thread(state.close)
+    print(f"Stopped. Jobs: {scheduler.status()}")
+
+
 def main():
-    print("Hello from instabot!")
+    state = BotState.from_env()
+    if not state.tokens.user_token:
+        print("Error: no user token; set LONG_ACCESS_TOKEN or run the auth flow in test2.py first.")
+        return
+    state.resolve_accounts()
+    asyncio.run(run_daemon(state))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,220 @@
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from instagram_api import InstagramAPI
+from models import GRAPH_TIMESTAMP_FORMAT, Comment, Media
+from pagination import parse_timestamp
+
+
+class SyncStore:
+    """SQLite store of synced media and comments plus per-account high-water marks"""
+
+    def __init__(self, path: str = 'instabot.sqlite'):
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS sync_runs (
+                run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                account_id TEXT NOT NULL,
+                started_at REAL NOT NULL,
+                finished_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS sync_state (
+                account_id TEXT PRIMARY KEY,
+                media_high_water TEXT
+            );
+            CREATE TABLE IF NOT EXISTS media (
+                id TEXT PRIMARY KEY,
+                account_id TEXT NOT NULL,
+                timestamp TEXT NOT NULL,
+                caption TEXT,
+                media_type TEXT,
+                media_url TEXT,
+                permalink TEXT,
+                like_count INTEGER,
+                comments_count INTEGER,
+                synced_comments_count INTEGER NOT NULL DEFAULT 0,
+                comments_high_water TEXT,
+                first_seen_run INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS comments (
+                id TEXT PRIMARY KEY,
+                media_id TEXT NOT NULL,
+                text TEXT,
+                username TEXT,
+                timestamp TEXT,
+                like_count INTEGER,
+                first_seen_run INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS media_account_timestamp ON media (account_id, timestamp);
+            CREATE INDEX IF NOT EXISTS comments_first_seen ON comments (first_seen_run);
+        """)
+        self.db.commit()
+
+    def start_run(self, account_id: str) -> int:
+        with self._lock:
+            cursor = self.db.execute(
+                "INSERT INTO sync_runs (account_id, started_at) VALUES (?, ?)", (account_id, time.time())
+            )
+            self.db.commit()
+            return cursor.lastrowid
+
+    def finish_run(self, run_id: int, account_id: str, media_high_water: Optional[str]):
+        with self._lock:
+            self.db.execute("UPDATE sync_runs SET finished_at = ? WHERE run_id = ?", (time.time(), run_id))
+            if media_high_water:
+                self.db.execute(
+                    "INSERT INTO sync_state (account_id, media_high_water) VALUES (?, ?) "
+                    "ON CONFLICT (account_id) DO UPDATE SET media_high_water = excluded.media_high_water",
+                    (account_id, media_high_water)
+                )
+            self.db.commit()
+
+    def _fetchone(self, sql: str, params: tuple):
+        # The connection is shared by the sync and reply jobs; reads take the lock like writes
+        with self._lock:
+            return self.db.execute(sql, params).fetchone()
+
+    def _fetchall(self, sql: str, params: tuple) -> List[Dict]:
+        with self._lock:
+            return [dict(row) for row in self.db.execute(sql, params).fetchall()]
+
+    def last_run(self, account_id: str) -> Optional[int]:
+        row = self._fetchone(
+            "SELECT MAX(run_id) FROM sync_runs WHERE account_id = ? AND finished_at IS NOT NULL", (account_id,)
+        )
+        return row[0]
+
+    def media_high_water(self, account_id: str) -> Optional[str]:
+        row = self._fetchone("SELECT media_high_water FROM sync_state WHERE account_id = ?", (account_id,))
+        return row[0] if row else None
+
+    def synced_comments_count(self, media_id: str) -> Optional[int]:
+        row = self._fetchone("SELECT synced_comments_count FROM media WHERE id = ?", (media_id,))
+        return row[0] if row else None
+
+    def comments_high_water(self, media_id: str) -> Optional[str]:
+        """Timestamp of the newest comment stored for a post"""
+        row = self._fetchone("SELECT comments_high_water FROM media WHERE id = ?", (media_id,))
+        return row[0] if row else None
+
+    def upsert_media(self, account_id: str, media: Media, run_id: int):
+        with self._lock:
+            self.db.execute("""
+                INSERT INTO media (id, account_id, timestamp, caption, media_type, media_url, permalink,
+                                   like_count, comments_count, first_seen_run)
+                VALUES (:id, :account_id, :timestamp, :caption, :media_type, :media_url, :permalink,
+                        :like_count, :comments_count, :run_id)
+                ON CONFLICT (id) DO UPDATE SET
+                    caption = excluded.caption,
+                    media_url = excluded.media_url,
+                    like_count = excluded.like_count,
+                    comments_count = excluded.comments_count
+            """, {
+                'id': media.id,
+                'account_id': account_id,
+                'timestamp': _graph_timestamp(media.timestamp),
+                'caption': media.caption,
+                'media_type': media.media_type,
+                'media_url': media.media_url,
+                'permalink': media.permalink,
+                'like_count': media.like_count or 0,
+                'comments_count': media.comments_count or 0,
+                'run_id': run_id
+            })
+            self.db.commit()
+
+    def add_comments(self, media_id: str, comments: List[Comment], comments_count: int, run_id: int) -> int:
+        """Insert unseen comments and record how many the post had; returns the number added"""
+        with self._lock:
+            before = self.db.total_changes
+            self.db.executemany("""
+                INSERT OR IGNORE INTO comments (id, media_id, text, username, timestamp, like_count, first_seen_run)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, [
+                (c.id, media_id, c.text, c.username, _graph_timestamp(c.timestamp), c.like_count or 0, run_id)
+                for c in comments
+            ])
+            added = self.db.total_changes - before
+            newest = _graph_timestamp(max((c.timestamp for c in comments if c.timestamp), default=None))
+            self.db.execute(
+                "UPDATE media SET synced_comments_count = ?, "
+                "comments_high_water = MAX(COALESCE(comments_high_water, ''), COALESCE(?, '')) WHERE id = ?",
+                (comments_count, newest, media_id)
+            )
+            self.db.commit()
+            return added
+
+    def new_media(self, run_id: int) -> List[Dict]:
+        return self._fetchall("SELECT * FROM media WHERE first_seen_run = ? ORDER BY timestamp DESC", (run_id,))
+
+    def new_comments(self, run_id: int) -> List[Dict]:
+        return self._fetchall("SELECT * FROM comments WHERE first_seen_run = ? ORDER BY timestamp", (run_id,))
+
+    def close(self):
+        with self._lock:
+            self.db.close()
+
+
+def _graph_timestamp(value: Optional[datetime]) -> Optional[str]:
+    # Stored in the Graph's own format so TEXT comparisons keep time order
+    return value.strftime(GRAPH_TIMESTAMP_FORMAT) if value is not None else None
+
+
+class MediaSync:
+    """Incrementally mirrors an account's media and comments into a SyncStore.
+
+    Media is walked newest-first and the walk stops once it is past the
+    stored high-water mark and the `refresh_recent` newest posts (whose
+    like/comment counts still move). Comments are only fetched for posts
+    whose comments_count changed since the last sync, and only those since
+    the newest one already stored, so steady-state traffic follows new
+    activity rather than account or thread size.
+    """
+
+    def __init__(self, api: InstagramAPI, store: SyncStore, refresh_recent: int = 50):
+        self.api = api
+        self.store = store
+        self.refresh_recent = refresh_recent
+        self.account_id = api.instagram_account_id
+
+    def sync(self) -> Dict:
+        """Pull deltas since the last run; returns counts for this run"""
+        run_id = self.store.start_run(self.account_id)
+        high_water = self.store.media_high_water(self.account_id)
+        newest = parse_timestamp(high_water) if high_water else None
+        high_water_dt = newest
+        stats = {'run_id': run_id, 'media_seen': 0, 'comment_fetches': 0, 'comments_added': 0}
+
+        for index, media in enumerate(self.api.iter_media()):
+            is_old = high_water_dt is not None and media.timestamp <= high_water_dt
+            if is_old and index >= self.refresh_recent:
+                break
+
+            synced = self.store.synced_comments_count(media.id)
+            self.store.upsert_media(self.account_id, media, run_id)
+            stats['media_seen'] += 1
+            if newest is None or media.timestamp > newest:
+                newest = media.timestamp
+
+            comments_count = media.comments_count or 0
+            if comments_count and comments_count != (synced or 0):
+                # Inclusive bound: comments from the same second are re-read and ignored by the store
+                since = self.store.comments_high_water(media.id)
+                comments = list(self.api.iter_comments(media.id, since=parse_timestamp(since) if since else None))
+                stats['comment_fetches'] += 1
+                stats['comments_added'] += self.store.add_comments(media.id, comments, comments_count, run_id)
+
+        self.store.finish_run(run_id, self.account_id, _graph_timestamp(newest))
+        return stats
+
+    def new_since_last_run(self) -> Dict[str, List[Dict]]:
+        """Media and comments first seen in the most recent completed sync"""
+        run_id = self.store.last_run(self.account_id)
+        if run_id is None:
+            return {'media': [], 'comments': []}
+        return {'media': self.store.new_media(run_id), 'comments': self.store.new_comments(run_id)}
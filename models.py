@@ -0,0 +1,236 @@
+import json
+import sys
+import threading
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Union
+
+from pagination import parse_timestamp
+
+# Named field selections for media requests, smallest first
+MEDIA_FIELD_PROFILES = {
+    'ids': 'id,timestamp',
+    'feed': 'id,caption,media_type,permalink,timestamp,like_count,comments_count',
+    'full': 'id,caption,media_type,media_url,permalink,thumbnail_url,timestamp,like_count,comments_count',
+}
+MEDIA_FIELDS = tuple(MEDIA_FIELD_PROFILES['full'].split(','))
+_MEDIA_FIELD_SET = frozenset(MEDIA_FIELDS)
+
+# The ?ids= lookup accepts at most 50 ids per request
+MAX_IDS_PER_LOOKUP = 50
+
+GRAPH_TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S%z'
+
+
+def media_fields(profile: str) -> str:
+    """Field list for a profile name; unknown names are treated as a raw field list"""
+    return MEDIA_FIELD_PROFILES.get(profile, profile)
+
+
+def _timestamp(value: Optional[str]) -> Optional[datetime]:
+    return parse_timestamp(value) if value else None
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    # Usernames and media types repeat across thousands of records
+    return sys.intern(value) if value else value
+
+
+class Media:
+    """A post with its timestamp parsed once, stored in __slots__.
+
+    Fields that were not part of the fetched profile stay unset. Reading
+    one asks the shared MediaHydrator to load every missing field for
+    every not-yet-hydrated Media in the same group, in a single ?ids=
+    request.
+    """
+
+    __slots__ = MEDIA_FIELDS + ('_hydrator',)
+
+    def __init__(self, hydrator: Optional['MediaHydrator'] = None, **fields):
+        self._hydrator = hydrator
+        self._set_fields(fields)
+
+    @classmethod
+    def from_graph(cls, data: Dict, hydrator: Optional['MediaHydrator'] = None) -> 'Media':
+        """Build from a Graph media object, leaving absent fields unset"""
+        media = cls.__new__(cls)
+        media._hydrator = hydrator
+        media._set_fields(data)
+        return media
+
+    def _set_fields(self, fields: Dict):
+        for name, value in fields.items():
+            if name in _MEDIA_FIELD_SET:
+                setattr(self, name, value)
+        timestamp = fields.get('timestamp')
+        if isinstance(timestamp, str):
+            self.timestamp = _timestamp(timestamp)
+        if 'media_type' in fields:
+            self.media_type = _intern(fields['media_type'])
+
+    def __getattr__(self, name):
+        # Only reached for unset slots
+        if name not in _MEDIA_FIELD_SET:
+            raise AttributeError(name)
+        hydrator = object.__getattribute__(self, '_hydrator')
+        if hydrator is None:
+            return None
+        hydrator.hydrate(self)
+        try:
+            return object.__getattribute__(self, name)
+        except AttributeError:
+            # The lookup failed; the field stays unset and is retried on the next read
+            return None
+
+    def __getitem__(self, name):
+        return getattr(self, name)
+
+    def get(self, name, default=None):
+        value = getattr(self, name)
+        return default if value is None else value
+
+    def has(self, name: str) -> bool:
+        """True if the field was fetched (without triggering hydration)"""
+        try:
+            object.__getattribute__(self, name)
+            return True
+        except AttributeError:
+            return False
+
+    @property
+    def is_hydrated(self) -> bool:
+        return all(self.has(name) for name in MEDIA_FIELDS)
+
+    def to_dict(self) -> Dict:
+        """Graph-shaped dict of the fields fetched so far"""
+        data = {}
+        for name in MEDIA_FIELDS:
+            if self.has(name):
+                value = object.__getattribute__(self, name)
+                if name == 'timestamp' and value is not None:
+                    value = value.strftime(GRAPH_TIMESTAMP_FORMAT)
+                data[name] = value
+        return data
+
+    def __repr__(self):
+        return f"Media({self.id if self.has('id') else None!r})"
+
+
+@dataclass(slots=True)
+class Comment:
+    id: str
+    text: Optional[str] = None
+    username: Optional[str] = None
+    timestamp: Optional[datetime] = None
+    like_count: int = 0
+    media_id: Optional[str] = None
+
+    @classmethod
+    def from_graph(cls, data: Dict, media_id: Optional[str] = None) -> 'Comment':
+        return cls(
+            data['id'],
+            data.get('text'),
+            _intern(data.get('username')),
+            _timestamp(data.get('timestamp')),
+            data.get('like_count', 0),
+            media_id
+        )
+
+    def __getitem__(self, name):
+        # Keeps older comment['text'] style callers working
+        return getattr(self, name)
+
+    def get(self, name, default=None):
+        value = getattr(self, name, None)
+        return default if value is None else value
+
+
+@dataclass(slots=True)
+class Account:
+    """An Instagram business account linked to a Facebook page"""
+
+    page_id: str
+    page_name: Optional[str]
+    page_token: str
+    instagram_account_id: str
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Account':
+        return cls(data['page_id'], data.get('page_name'), data['page_token'], data['instagram_account_id'])
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+    def __getitem__(self, name):
+        # Keeps older account['page_token'] style callers working
+        return getattr(self, name)
+
+
+def decode_media(payload: Union[bytes, str, Dict], hydrator: Optional['MediaHydrator'] = None) -> List[Media]:
+    """Decode a Graph media list response (raw body or parsed) into Media records"""
+    if not isinstance(payload, dict):
+        payload = json.loads(payload)
+    from_graph = Media.from_graph
+    media = [from_graph(item, hydrator) for item in payload.get('data', [])]
+    if hydrator is not None:
+        hydrator.track(media)
+    return media
+
+
+def decode_comments(payload: Union[bytes, str, Dict], media_id: Optional[str] = None) -> List[Comment]:
+    """Decode a Graph comments response (raw body or parsed) into Comment records"""
+    if not isinstance(payload, dict):
+        payload = json.loads(payload)
+    from_graph = Comment.from_graph
+    return [from_graph(item, media_id) for item in payload.get('data', [])]
+
+
+class MediaHydrator:
+    """Loads the missing fields for a group of Media objects in batched lookups"""
+
+    def __init__(self, api, fields: str = MEDIA_FIELD_PROFILES['full']):
+        self.api = api
+        self.fields = fields
+        self.pending: List[Media] = []
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def wrap(self, items: Iterable[Dict]) -> List[Media]:
+        return self.track([Media.from_graph(item, self) for item in items])
+
+    def track(self, media: List[Media]) -> List[Media]:
+        """Queue Media built with this hydrator for the next batched lookup"""
+        with self._lock:
+            self.pending.extend(m for m in media if not m.is_hydrated)
+        return media
+
+    def hydrate(self, target: Media):
+        with self._lock:
+            if target.is_hydrated:
+                return
+            group = [m for m in self.pending if not m.is_hydrated]
+            if target not in group:
+                group.append(target)
+            self.pending = []
+            # Without an id there is nothing to look up; m.id would also re-enter hydrate()
+            group = [m for m in group if m.has('id')]
+
+            field_names = self.fields.split(',')
+            for start in range(0, len(group), MAX_IDS_PER_LOOKUP):
+                chunk = group[start:start + MAX_IDS_PER_LOOKUP]
+                ids = [object.__getattribute__(m, 'id') for m in chunk]
+                found = self.api.get_objects(ids, self.fields)
+                self.requests += 1
+                if found is None:
+                    # Keep them for the next hydration instead of recording every field as None
+                    self.pending.extend(chunk)
+                    continue
+                for media_id, m in zip(ids, chunk):
+                    data = found.get(media_id)
+                    if data is not None:
+                        # Fields the API omits (e.g. thumbnail_url on images) are recorded as None
+                        m._set_fields({name: data.get(name) for name in field_names})
+                    else:
+                        # Deleted or not visible: record it so later reads do not ask again
+                        m._set_fields({name: None for name in field_names if not m.has(name)})
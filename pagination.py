@@ -0,0 +1,98 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from transport import GraphTransport
+
+
+def parse_timestamp(timestamp: str) -> datetime:
+    """Parse a Graph API timestamp such as 2024-01-01T12:00:00+0000"""
+    return datetime.fromisoformat(timestamp)
+
+
+def as_utc(moment: datetime) -> datetime:
+    """Aware copy of a datetime; naive values are taken to be UTC like Graph timestamps"""
+    return moment.replace(tzinfo=timezone.utc) if moment.tzinfo is None else moment
+
+
+def iter_pages(transport: GraphTransport, url: str, params: Optional[Dict] = None,
+               prefetch: bool = True, account_id: Optional[str] = None) -> Iterator[List[Dict]]:
+    """Yield each page's `data` list, following paging.next until it runs out.
+
+    With prefetch on, the request for page N+1 is already in flight on a
+    background thread while the caller is consuming page N.
+    """
+    def fetch(page_url, page_params):
+        response = transport.get(page_url, params=page_params, account_id=account_id)
+        if response.status_code == 200:
+            return response.json()
+        print(f"Error fetching page: {response.text}")
+        return None
+
+    executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+    submit = executor.submit if executor else _run_now
+    future = submit(fetch, url, params)
+    try:
+        while future is not None:
+            payload = future.result()
+            if payload is None:
+                return
+            # paging.next already carries the cursor, limit and access token
+            next_url = payload.get('paging', {}).get('next')
+            future = submit(fetch, next_url, None) if next_url else None
+            yield payload.get('data', [])
+    finally:
+        if executor:
+            if future is not None:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+
+def iter_items(pages: Iterator[List[Dict]], max_items: Optional[int] = None,
+               since: Optional[datetime] = None, newest_first: bool = True,
+               decode: Optional[Callable[[Dict], Any]] = None) -> Iterator[Any]:
+    """Flatten pages into items, stopping at max_items or at the `since` bound.
+
+    When results are newest-first the walk stops at the first item older
+    than `since`; otherwise older items are skipped and the walk continues.
+    A naive `since` is taken to be UTC. With `decode` (e.g. Media.from_graph)
+    each item is turned into a record whose parsed `timestamp` is used for
+    the bound.
+    """
+    if since is not None:
+        since = as_utc(since)
+    count = 0
+    for page in pages:
+        for item in page:
+            if decode is not None:
+                item = decode(item)
+                timestamp = item.timestamp if since is not None else None
+            elif since is not None and item.get('timestamp'):
+                timestamp = parse_timestamp(item['timestamp'])
+            else:
+                timestamp = None
+            if timestamp is not None and timestamp < since:
+                if newest_first:
+                    return
+                continue
+            yield item
+            count += 1
+            if max_items is not None and count >= max_items:
+                return
+
+
+class _Done:
+    """Already-completed stand-in for a Future when prefetch is off"""
+
+    def __init__(self, value):
+        self.value = value
+
+    def result(self):
+        return self.value
+
+    def cancel(self):
+        return False
+
+
+def _run_now(fn, *args):
+    return _Done(fn(*args))
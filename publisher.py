@@ -0,0 +1,455 @@
+import heapq
+import json
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from instagram_api import InstagramAPI
+from journal import RequestJournal
+from models import MAX_IDS_PER_LOOKUP
+
+# Post states, in order
+PENDING = 'pending'          # waiting for publish_at
+CREATING = 'creating'        # container calls in flight
+CHILDREN = 'children'        # carousel children processing
+PROCESSING = 'processing'    # top-level container processing
+PUBLISHING = 'publishing'    # media_publish in flight
+PUBLISHED = 'published'
+FAILED = 'failed'
+
+MAX_PUBLISH_ATTEMPTS = 3
+# Graph deletes unpublished containers after 24 hours; older ones are created again
+CONTAINER_TTL = 23 * 3600
+
+
+@dataclass(slots=True)
+class ScheduledPost:
+    """One queued post: a single image/video or a carousel of up to 10 items"""
+
+    post_id: int
+    account_id: str
+    publish_at: float
+    caption: Optional[str]
+    items: List[Dict]            # [{'image_url': ...} or {'video_url': ...}]
+    media_type: Optional[str] = None
+    state: str = PENDING
+    children: List[str] = field(default_factory=list)
+    container_id: Optional[str] = None
+    media_id: Optional[str] = None
+    error: Optional[str] = None
+
+    @property
+    def is_carousel(self) -> bool:
+        return len(self.items) > 1
+
+    @property
+    def has_video(self) -> bool:
+        return any('video_url' in item for item in self.items)
+
+
+class ScheduleQueue:
+    """Persistent SQLite queue of scheduled posts and their publish progress"""
+
+    def __init__(self, path: str = 'instabot.sqlite'):
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS scheduled_posts (
+                post_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                account_id TEXT NOT NULL,
+                publish_at REAL NOT NULL,
+                caption TEXT,
+                items TEXT NOT NULL,
+                media_type TEXT,
+                state TEXT NOT NULL,
+                children TEXT NOT NULL DEFAULT '[]',
+                container_id TEXT,
+                media_id TEXT,
+                error TEXT,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS scheduled_posts_due ON scheduled_posts (state, publish_at);
+        """)
+        self.db.commit()
+
+    def add(self, account_id: str, items: List[Dict], caption: Optional[str] = None,
+            publish_at: Optional[float] = None, media_type: Optional[str] = None) -> int:
+        """Queue a post; publish_at is a unix time (now if omitted)"""
+        if not 1 <= len(items) <= 10:
+            raise ValueError("A post needs between 1 and 10 items.")
+        with self._lock:
+            cursor = self.db.execute(
+                "INSERT INTO scheduled_posts (account_id, publish_at, caption, items, media_type, state, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (account_id, publish_at or time.time(), caption, json.dumps(items), media_type, PENDING, time.time())
+            )
+            self.db.commit()
+        return cursor.lastrowid
+
+    def _post(self, row) -> ScheduledPost:
+        return ScheduledPost(row[0], row[1], row[2], row[3], json.loads(row[4]), row[5], row[6],
+                             json.loads(row[7]), row[8], row[9], row[10])
+
+    def get(self, post_id: int) -> Optional[ScheduledPost]:
+        row = self.db.execute("SELECT * FROM scheduled_posts WHERE post_id = ?", (post_id,)).fetchone()
+        return self._post(row) if row else None
+
+    def claim_due(self, account_id: str, now: float, limit: int = 50) -> List[ScheduledPost]:
+        """Move due pending posts to CREATING and return them"""
+        with self._lock:
+            rows = self.db.execute(
+                "SELECT * FROM scheduled_posts WHERE state = ? AND account_id = ? AND publish_at <= ? "
+                "ORDER BY publish_at LIMIT ?", (PENDING, account_id, now, limit)
+            ).fetchall()
+            self.db.executemany("UPDATE scheduled_posts SET state = ?, updated_at = ? WHERE post_id = ?",
+                                [(CREATING, now, row[0]) for row in rows])
+            self.db.commit()
+        return [self._post(row) for row in rows]
+
+    def next_due(self, account_id: str) -> Optional[float]:
+        row = self.db.execute(
+            "SELECT MIN(publish_at) FROM scheduled_posts WHERE state = ? AND account_id = ?", (PENDING, account_id)
+        ).fetchone()
+        return row[0]
+
+    def in_flight(self, account_id: str) -> List[ScheduledPost]:
+        rows = self.db.execute(
+            "SELECT * FROM scheduled_posts WHERE account_id = ? AND state IN (?, ?, ?, ?)",
+            (account_id, CREATING, CHILDREN, PROCESSING, PUBLISHING)
+        ).fetchall()
+        return [self._post(row) for row in rows]
+
+    def update(self, post: ScheduledPost):
+        with self._lock:
+            self.db.execute(
+                "UPDATE scheduled_posts SET state = ?, children = ?, container_id = ?, media_id = ?, error = ?, "
+                "updated_at = ? WHERE post_id = ?",
+                (post.state, json.dumps(post.children), post.container_id, post.media_id, post.error,
+                 time.time(), post.post_id)
+            )
+            self.db.commit()
+
+    def counts(self) -> Dict[str, int]:
+        return dict(self.db.execute("SELECT state, COUNT(*) FROM scheduled_posts GROUP BY state").fetchall())
+
+    def close(self):
+        with self._lock:
+            self.db.close()
+
+
+class Publisher:
+    """Works through the schedule queue for one account in a background thread.
+
+    Due posts get their containers created on a worker pool (carousel
+    children concurrently, then the CAROUSEL container). Containers that
+    are still processing wait in a heap keyed by their next check time;
+    every pass checks all containers that are due in one multi-id lookup
+    and backs each off by `backoff` up to `max_delay` while it stays
+    IN_PROGRESS, starting from `image_delay` or `video_delay`. A post is
+    published as soon as its container reports FINISHED. Status lookups,
+    like every other Graph call, run on the workers; the loop only claims
+    due posts and hands out work, so many posts can be in flight at once.
+
+    Progress is saved after every step, so a restarted publisher resumes
+    in-flight posts from their containers instead of creating new ones.
+    create_media and publish_media calls are also journaled under
+    per-post keys: a post retried after a crash reuses the containers it
+    already made, and a publish whose result was lost keeps its media id.
+    Containers older than `container_ttl` are not reused, since Graph
+    expires them after a day; in-flight posts whose containers are that
+    old go back to pending on restart and are created again.
+    """
+
+    def __init__(self, api: InstagramAPI, queue: Optional[ScheduleQueue] = None, max_workers: int = 4,
+                 upload_workers: int = 8, image_delay: float = 1.0, video_delay: float = 5.0,
+                 backoff: float = 1.5, max_delay: float = 60.0, timeout: float = 15 * 60,
+                 on_result: Optional[Callable[[ScheduledPost], None]] = None,
+                 journal: Optional[RequestJournal] = None, container_ttl: float = CONTAINER_TTL):
+        self.api = api
+        self.queue = queue or ScheduleQueue()
+        self.journal = journal or RequestJournal.shared()
+        self.account_id = api.instagram_account_id
+        self.image_delay = image_delay
+        self.video_delay = video_delay
+        self.backoff = backoff
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.on_result = on_result
+        self.container_ttl = container_ttl
+
+        self._workers = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='publish')
+        self._uploads = ThreadPoolExecutor(max_workers=upload_workers, thread_name_prefix='publish-upload')
+        self._checks: List[tuple] = []             # (next_check, post_id, delay, deadline)
+        self._posts: Dict[int, ScheduledPost] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self.stats = {'created': 0, 'checks': 0, 'published': 0, 'failed': 0}
+
+    def _count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+    def schedule(self, items: List[Dict], caption: Optional[str] = None, publish_at: Optional[float] = None,
+                 media_type: Optional[str] = None) -> int:
+        """Queue a post for this account and wake the loop"""
+        post_id = self.queue.add(self.account_id, items, caption, publish_at, media_type)
+        self._wake.set()
+        return post_id
+
+    # Lifecycle
+
+    def start(self) -> 'Publisher':
+        self._recover()
+        self._thread = threading.Thread(target=self._run, name='publisher', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, wait: bool = True):
+        """Stop the loop; in-flight posts stay in the queue and resume on the next start"""
+        self._stopping.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join()
+        self._workers.shutdown(wait=wait)
+        self._uploads.shutdown(wait=wait)
+
+    def _recover(self):
+        for post in self.queue.in_flight(self.account_id):
+            published = self.journal.completed('publish_media', self._key(post, 'publish'))
+            if published:
+                self._finish(post, published['media_id'])
+            elif post.state == CREATING or (post.state != PUBLISHING and self._containers_expired(post)):
+                # Journaled containers are reused while fresh; ones whose result was lost just expire unused
+                post.state, post.children, post.container_id = PENDING, [], None
+                self.queue.update(post)
+            else:
+                # PUBLISHING is re-checked too: a PUBLISHED container is not published twice
+                self._watch(post)
+
+    # Loop
+
+    def _run(self):
+        while not self._stopping.is_set():
+            now = time.time()
+            try:
+                for post in self.queue.claim_due(self.account_id, now):
+                    self._workers.submit(self._create, post)
+                self._check_containers(now)
+
+                with self._lock:
+                    next_check = self._checks[0][0] if self._checks else None
+                next_due = self.queue.next_due(self.account_id)
+            except Exception as exc:
+                # Keep the loop alive; whatever failed is retried on the next pass
+                print(f"Error in publisher loop: {exc}")
+                next_check = next_due = now + 5
+            wake_at = min(t for t in (next_check, next_due, now + 60) if t is not None)
+            self._wake.wait(max(0.0, wake_at - time.time()))
+            self._wake.clear()
+
+    def _watch(self, post: ScheduledPost, delay: Optional[float] = None):
+        delay = delay or (self.video_delay if post.has_video else self.image_delay)
+        with self._lock:
+            self._posts[post.post_id] = post
+            heapq.heappush(self._checks, (time.time() + delay, post.post_id, delay, time.time() + self.timeout))
+        self._wake.set()
+
+    def _check_containers(self, now: float):
+        """Hand the containers due for a check to a worker, so the loop never waits on Graph"""
+        with self._lock:
+            due = []
+            while self._checks and self._checks[0][0] <= now:
+                due.append(heapq.heappop(self._checks))
+        if due:
+            self._workers.submit(self._check_statuses, due)
+
+    def _check_statuses(self, due: List[tuple]):
+        waiting = {}
+        with self._lock:
+            for entry in due:
+                post = self._posts.get(entry[1])
+                if post is not None:
+                    waiting[entry] = post.children if post.state == CHILDREN else [post.container_id]
+        try:
+            statuses = self._statuses([i for ids in waiting.values() for i in ids])
+        except Exception as exc:
+            print(f"Error checking containers: {exc}")
+            statuses = {}
+        self._count('checks')
+
+        for entry, ids in waiting.items():
+            _, post_id, delay, deadline = entry
+            with self._lock:
+                post = self._posts.get(post_id)
+            if post is None:
+                # Finished or re-watched by another thread meanwhile
+                continue
+            codes = [statuses.get(i) for i in ids]
+            try:
+                if any(code in ('ERROR', 'EXPIRED') for code in codes):
+                    self._fail(post, f"container {'/'.join(str(code) for code in codes)}")
+                elif post.state != CHILDREN and codes == ['PUBLISHED']:
+                    # Published by a call whose response was lost; the media id is unknown
+                    self.journal.done('publish_media', self._key(post, 'publish'), media_id=post.media_id)
+                    self._finish(post, post.media_id)
+                elif all(code == 'FINISHED' for code in codes):
+                    with self._lock:
+                        claimed = self._posts.get(post_id) is post
+                        if claimed:
+                            del self._posts[post_id]
+                    if claimed:
+                        self._workers.submit(self._create_carousel if post.state == CHILDREN else self._publish, post)
+                elif time.time() > deadline:
+                    self._fail(post, "container processing timed out")
+                else:
+                    # IN_PROGRESS, or the status call failed: check again later, less often
+                    self._recheck(post_id, delay, deadline)
+            except Exception as exc:
+                print(f"Error handling post {post_id}: {exc}")
+                self._recheck(post_id, delay, deadline)
+
+    def _recheck(self, post_id: int, delay: float, deadline: float):
+        delay = min(delay * self.backoff, self.max_delay)
+        with self._lock:
+            heapq.heappush(self._checks, (time.time() + delay, post_id, delay, deadline))
+        self._wake.set()
+
+    def _statuses(self, container_ids: List[str]) -> Dict[str, str]:
+        if len(container_ids) == 1:
+            status = self.api.get_container_status(container_ids[0])
+            return {container_ids[0]: status.get('status_code')} if status else {}
+        statuses = {}
+        for start in range(0, len(container_ids), MAX_IDS_PER_LOOKUP):
+            found = self.api.get_objects(container_ids[start:start + MAX_IDS_PER_LOOKUP], 'id,status_code') or {}
+            statuses.update({object_id: obj.get('status_code') for object_id, obj in found.items()})
+        return statuses
+
+    # Steps (run on worker threads)
+
+    def _create(self, post: ScheduledPost):
+        try:
+            if post.is_carousel:
+                children = list(self._uploads.map(lambda part: self._create_child(post, *part),
+                                                  enumerate(post.items)))
+                if not all(children):
+                    return self._fail(post, "could not create carousel items")
+                post.state, post.children = CHILDREN, children
+            else:
+                item = post.items[0]
+                post.container_id = self._create_container(post, '0', image_url=item.get('image_url'),
+                                                           caption=post.caption, video_url=item.get('video_url'),
+                                                           media_type=post.media_type)
+                if not post.container_id:
+                    return self._fail(post, "could not create container")
+                post.state = PROCESSING
+            self._count('created')
+            self.queue.update(post)
+            self._watch(post)
+        except Exception as exc:
+            self._fail(post, str(exc))
+
+    def _create_child(self, post: ScheduledPost, index: int, item: Dict) -> Optional[str]:
+        return self._create_container(post, str(index), image_url=item.get('image_url'),
+                                      video_url=item.get('video_url'), is_carousel_item=True)
+
+    @staticmethod
+    def _key(post: ScheduledPost, part: str) -> str:
+        # publish_at keeps keys unique even if the queue database is recreated
+        return f"{post.account_id}/{post.post_id}@{post.publish_at:.0f}/{part}"
+
+    def _fresh_container(self, key: str) -> Optional[Dict]:
+        """The journaled create_media result for key, unless the container has expired"""
+        done = self.journal.completed('create_media', key)
+        if done and time.time() - done.get('created_at', done['ts']) < self.container_ttl:
+            return done
+        return None
+
+    def _containers_expired(self, post: ScheduledPost) -> bool:
+        if post.state == CHILDREN:
+            parts = [str(index) for index in range(len(post.items))]
+        else:
+            parts = ['carousel' if post.is_carousel else '0']
+        return not all(self._fresh_container(self._key(post, part)) for part in parts)
+
+    def _create_container(self, post: ScheduledPost, part: str, **kwargs) -> Optional[str]:
+        """create_media at most once per post part ('0', '1', ..., 'carousel') while the container lasts"""
+        key = self._key(post, part)
+        done = self._fresh_container(key)
+        # A carousel container is only reused with the same (possibly recreated) children
+        if done and done.get('children') == kwargs.get('children'):
+            return done['container_id']
+        self.journal.intent('create_media', key, account_id=self.account_id)
+        try:
+            container_id = self.api.create_media(**kwargs)
+        except Exception as exc:
+            # A container made anyway is never reused and just expires
+            self.journal.unknown('create_media', key, error=str(exc))
+            raise
+        if container_id:
+            self.journal.done('create_media', key, container_id=container_id, created_at=time.time(),
+                              children=kwargs.get('children'))
+        else:
+            self.journal.failed('create_media', key)
+        return container_id
+
+    def _create_carousel(self, post: ScheduledPost):
+        try:
+            post.container_id = self._create_container(post, 'carousel', caption=post.caption,
+                                                       children=post.children)
+            if not post.container_id:
+                return self._fail(post, "could not create carousel container")
+            post.state = PROCESSING
+            self.queue.update(post)
+            self._watch(post, self.image_delay)
+        except Exception as exc:
+            self._fail(post, str(exc))
+
+    def _publish(self, post: ScheduledPost):
+        try:
+            key = self._key(post, 'publish')
+            done = self.journal.completed('publish_media', key)
+            if done:
+                return self._finish(post, done['media_id'])
+            attempts = (self.journal.get('publish_media', key) or {}).get('attempts', 0) + 1
+            post.state = PUBLISHING
+            self.queue.update(post)
+            self.journal.intent('publish_media', key, account_id=self.account_id, container_id=post.container_id,
+                                attempts=attempts)
+            try:
+                media_id = self.api.publish_media(post.container_id)
+            except Exception as exc:
+                self.journal.unknown('publish_media', key, error=str(exc))
+                if attempts >= MAX_PUBLISH_ATTEMPTS:
+                    return self._fail(post, f"publish failed: {exc}")
+                # It may have gone through: the container's status decides (PUBLISHED, or FINISHED to retry)
+                print(f"Error publishing post {post.post_id}: {exc}; checking its container")
+                return self._watch(post)
+            if not media_id:
+                self.journal.failed('publish_media', key)
+                return self._fail(post, "publish failed")
+            self.journal.done('publish_media', key, media_id=media_id)
+            self._finish(post, media_id)
+        except Exception as exc:
+            self._fail(post, str(exc))
+
+    def _finish(self, post: ScheduledPost, media_id: Optional[str]):
+        post.state, post.media_id = PUBLISHED, media_id
+        self._done(post, 'published')
+
+    def _fail(self, post: ScheduledPost, error: str):
+        print(f"Error publishing post {post.post_id}: {error}")
+        post.state, post.error = FAILED, error
+        self._done(post, 'failed')
+
+    def _done(self, post: ScheduledPost, stat: str):
+        self.queue.update(post)
+        with self._lock:
+            self._posts.pop(post.post_id, None)
+        self._count(stat)
+        if self.on_result:
+            self.on_result(post)
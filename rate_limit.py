@@ -0,0 +1,209 @@
+import json
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+READ = 'read'
+WRITE = 'write'
+
+# Graph error codes that mean "slow down": app, user, page, per-hour and
+# Instagram business use case limits respectively.
+THROTTLE_ERROR_CODES = {4, 17, 32, 613, 80002}
+
+
+class TokenBucket:
+    """Classic token bucket whose refill rate can be changed on the fly"""
+
+    def __init__(self, rate: float, capacity: float, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.clock = clock
+        self.updated = clock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until one token is available (0 if one is available now)"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else 1.0
+
+    def take(self):
+        self.tokens -= 1
+
+
+class UsageState:
+    """Latest usage reading (percent of quota) for the app or one account"""
+
+    def __init__(self, base_rate: float, burst: float, clock=time.monotonic):
+        self.base_rate = base_rate
+        self.bucket = TokenBucket(base_rate, burst, clock)
+        self.usage = 0.0
+        self.observed_at = 0.0
+        self.blocked_until = 0.0
+        self.waiting_writes = 0
+
+
+class RateLimitScheduler:
+    """Paces Graph calls from the X-App-Usage / X-Business-Use-Case-Usage headers.
+
+    Keeps one token bucket for the app and one per business account. The
+    refill rate shrinks as reported usage climbs past `soft_limit`, reads
+    stop at `read_ceiling` so writes (replies, publishes) keep headroom up
+    to `write_ceiling`, and a write waiting on a bucket goes ahead of reads
+    that need the same bucket (a write held up on one account's bucket
+    does not delay reads for other accounts).
+    Throttle errors block the affected scope until the reported regain
+    time (or `penalty` seconds) has passed.
+    """
+
+    def __init__(self, app_rate: float = 20.0, account_rate: float = 5.0, burst: float = 10.0,
+                 soft_limit: float = 50.0, read_ceiling: float = 80.0, write_ceiling: float = 95.0,
+                 min_rate_scale: float = 0.05, probe_interval: float = 30.0, penalty: float = 60.0,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.account_rate = account_rate
+        self.burst = burst
+        self.soft_limit = soft_limit
+        self.read_ceiling = read_ceiling
+        self.write_ceiling = write_ceiling
+        self.min_rate_scale = min_rate_scale
+        self.probe_interval = probe_interval
+        self.penalty = penalty
+        self.clock = clock
+        self.sleep = sleep
+
+        self.app = UsageState(app_rate, burst, clock)
+        self.accounts: Dict[str, UsageState] = {}
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def _account(self, account_id: Optional[str]) -> Optional[UsageState]:
+        if account_id is None:
+            return None
+        state = self.accounts.get(account_id)
+        if state is None:
+            state = UsageState(self.account_rate, self.burst, self.clock)
+            self.accounts[account_id] = state
+        return state
+
+    def acquire(self, account_id: Optional[str] = None, kind: str = READ):
+        """Block until a call of this kind may be sent for this account"""
+        # A waiting write is counted against the bucket it is waiting on
+        waiting_on = None
+        try:
+            while True:
+                with self._lock:
+                    wait, blocker = self._reserve(account_id, kind)
+                    if kind == WRITE and blocker is not waiting_on:
+                        if waiting_on is not None:
+                            waiting_on.waiting_writes -= 1
+                        if blocker is not None:
+                            blocker.waiting_writes += 1
+                        waiting_on = blocker
+                if wait <= 0:
+                    return
+                self.sleep(wait)
+        finally:
+            if waiting_on is not None:
+                with self._lock:
+                    waiting_on.waiting_writes -= 1
+
+    def _reserve(self, account_id: Optional[str], kind: str) -> Tuple[float, Optional[UsageState]]:
+        """Take tokens and return (0, None), or return the wait and the state causing it"""
+        now = self.clock()
+        states = [self.app]
+        account = self._account(account_id)
+        if account is not None:
+            states.append(account)
+
+        for state in states:
+            if state.blocked_until > now:
+                return state.blocked_until - now, state
+
+        ceiling = self.write_ceiling if kind == WRITE else self.read_ceiling
+        for state in states:
+            if state.usage >= ceiling:
+                # Usage only updates when a response comes back, so let a
+                # single probe through every probe_interval to re-read it.
+                since_observed = now - state.observed_at
+                if since_observed < self.probe_interval:
+                    return self.probe_interval - since_observed, state
+                state.observed_at = now
+
+        if kind == READ:
+            for state in states:
+                if state.waiting_writes:
+                    return 0.01, state
+
+        wait, blocker = max(((state.bucket.wait_time(now), state) for state in states), key=lambda pair: pair[0])
+        if wait > 0:
+            return wait, blocker
+        for state in states:
+            state.bucket.take()
+        return 0.0, None
+
+    def observe(self, headers, status_code: int = 200, body: Optional[str] = None,
+                account_id: Optional[str] = None):
+        """Update usage and pacing from a Graph response"""
+        now = self.clock()
+        with self._lock:
+            app_usage = _parse_json_header(headers.get('X-App-Usage'))
+            if app_usage:
+                self._update(self.app, _max_usage(app_usage), now)
+
+            buc_usage = _parse_json_header(headers.get('X-Business-Use-Case-Usage'))
+            for business_id, entries in (buc_usage or {}).items():
+                state = self._account(business_id)
+                self._update(state, max((_max_usage(entry) for entry in entries), default=0.0), now)
+                regain = max((entry.get('estimated_time_to_regain_access', 0) for entry in entries), default=0)
+                if regain:
+                    state.blocked_until = max(state.blocked_until, now + regain * 60)
+
+            if status_code != 200 and _is_throttle_error(status_code, body):
+                self.throttled += 1
+                state = self._account(account_id) or self.app
+                state.blocked_until = max(state.blocked_until, now + self.penalty)
+
+    def _update(self, state: UsageState, usage: float, now: float):
+        state.usage = usage
+        state.observed_at = now
+        if usage <= self.soft_limit:
+            scale = 1.0
+        else:
+            scale = (self.write_ceiling - usage) / (self.write_ceiling - self.soft_limit)
+        state.bucket.rate = state.base_rate * max(self.min_rate_scale, min(1.0, scale))
+
+    def snapshot(self) -> Dict:
+        """Current usage readings, for logging and metrics"""
+        with self._lock:
+            return {
+                'app': self.app.usage,
+                'accounts': {account_id: state.usage for account_id, state in self.accounts.items()},
+                'throttled': self.throttled
+            }
+
+
+def _parse_json_header(value: Optional[str]):
+    if not value:
+        return None
+    try:
+        return json.loads(value)
+    except ValueError:
+        return None
+
+
+def _max_usage(entry: Dict) -> float:
+    return float(max(entry.get('call_count', 0), entry.get('total_cputime', 0), entry.get('total_time', 0)))
+
+
+def _is_throttle_error(status_code: int, body: Optional[str]) -> bool:
+    if status_code == 429:
+        return True
+    error = _parse_json_header(body)
+    if not isinstance(error, dict):
+        return False
+    return error.get('error', {}).get('code') in THROTTLE_ERROR_CODES
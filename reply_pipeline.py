@@ -0,0 +1,216 @@
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from instagram_api import InstagramAPI
+from journal import INTENT, UNKNOWN, RequestJournal
+from models import Comment
+from rate_limit import TokenBucket
+from webhook import WebhookEvent
+
+_STOP = object()
+
+
+class ReplyPipeline:
+    """Staged, crash-safe comment reply pipeline.
+
+    ingest -> dedup -> generate (worker pool) -> send (paced) -> record
+
+    Stages are connected by bounded queues, so a slow stage pushes back
+    on the ones before it instead of buffering without limit. Every send
+    is journaled in requests.jsonl as an intent before the API call and
+    as done/failed after it (unknown if the call raised), keyed by comment
+    id, and the journal is what keeps finished comments from being replied
+    to again; dedup only remembers the last `seen_size` comment ids so
+    repeats are dropped before generation without growing forever. On
+    start, intents with no or an unknown outcome are checked against the
+    comment's existing replies and only re-sent if our reply is not there.
+    """
+
+    def __init__(self, api: InstagramAPI, generate: Callable[[Comment], Optional[str]],
+                 journal: Optional[RequestJournal] = None, writes_per_second: float = 0.5,
+                 burst: float = 3, generator_workers: int = 4, queue_size: int = 1000,
+                 own_username: Optional[str] = None, seen_size: int = 50000,
+                 on_result: Optional[Callable[[Dict], None]] = None):
+        self.api = api
+        self.generate = generate
+        self.journal = journal or RequestJournal.shared()
+        self.bucket = TokenBucket(writes_per_second, burst)
+        self.generator_workers = generator_workers
+        self.own_username = own_username
+        self.on_result = on_result
+
+        self.ingest: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._to_generate: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._to_send: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.seen_size = seen_size
+        self._seen: OrderedDict = OrderedDict()
+        self._seen_lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self._generators = None
+        self.stats = {'ingested': 0, 'duplicates': 0, 'skipped': 0, 'sent': 0, 'failed': 0, 'resumed': 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    # Ingest
+
+    def submit(self, comment: Comment, block: bool = True, timeout: Optional[float] = None):
+        """Queue a comment for a reply; blocks when the pipeline is saturated"""
+        self.ingest.put(comment, block=block, timeout=timeout)
+
+    def submit_event(self, event: WebhookEvent, **kwargs):
+        """Queue a comment from a webhook notification"""
+        if event.field != 'comments' or not event.comment_id:
+            return
+        sender = event.value.get('from') or {}
+        self.submit(Comment(event.comment_id, event.value.get('text'), sender.get('username'),
+                            None, 0, event.media_id), **kwargs)
+
+    # Lifecycle
+
+    def start(self) -> 'ReplyPipeline':
+        pending = self._replay_journal()
+        self._generators = ThreadPoolExecutor(max_workers=self.generator_workers, thread_name_prefix='reply-gen')
+        for target, name in ((self._dedup_stage, 'reply-dedup'),
+                             (self._generate_stage, 'reply-generate'),
+                             (self._send_stage, 'reply-send')):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        for comment, message in pending:
+            self._to_send.put((comment, message))
+        return self
+
+    def stop(self):
+        """Finish everything already ingested, then stop all stages"""
+        self.ingest.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    # Stages
+
+    def _dedup_stage(self):
+        while True:
+            comment = self.ingest.get()
+            if comment is _STOP:
+                self._to_generate.put(_STOP)
+                return
+            self._count('ingested')
+            if not self._remember(comment.id) or self.journal.completed('reply', comment.id):
+                self._count('duplicates')
+                continue
+            if self.own_username and comment.username == self.own_username:
+                self._count('skipped')
+                continue
+            self._to_generate.put(comment)
+
+    def _remember(self, comment_id: str) -> bool:
+        """Record a comment id as recently seen; False if it already was"""
+        with self._seen_lock:
+            if comment_id in self._seen:
+                self._seen.move_to_end(comment_id)
+                return False
+            self._seen[comment_id] = True
+            while len(self._seen) > self.seen_size:
+                self._seen.popitem(last=False)
+            return True
+
+    def _generate_stage(self):
+        # Keep at most generator_workers * 2 generations in flight
+        in_flight = threading.BoundedSemaphore(self.generator_workers * 2)
+
+        def run(comment):
+            try:
+                message = self.generate(comment)
+            except Exception as exc:
+                print(f"Error generating reply for {comment.id}: {exc}")
+                message = None
+            finally:
+                in_flight.release()
+            if message:
+                self._to_send.put((comment, message))
+            else:
+                self._count('skipped')
+
+        while True:
+            comment = self._to_generate.get()
+            if comment is _STOP:
+                self._generators.shutdown(wait=True)
+                self._to_send.put(_STOP)
+                return
+            in_flight.acquire()
+            self._generators.submit(run, comment)
+
+    def _send_stage(self):
+        while True:
+            item = self._to_send.get()
+            if item is _STOP:
+                return
+            comment, message = item
+            wait = self.bucket.wait_time(time.monotonic())
+            while wait > 0:
+                time.sleep(wait)
+                wait = self.bucket.wait_time(time.monotonic())
+            self.bucket.take()
+            try:
+                self._send(comment, message)
+            except Exception as exc:
+                print(f"Error sending reply to {comment.id}: {exc}")
+
+    def _send(self, comment: Comment, message: str):
+        if self.journal.completed('reply', comment.id):
+            self._count('duplicates')
+            return
+        self.journal.intent('reply', comment.id, account_id=self.api.instagram_account_id,
+                            media_id=comment.media_id, message=message)
+        try:
+            reply_id = self.api.reply_to_comment(comment.id, message)
+        except Exception as exc:
+            # The reply may have been posted; it is verified before any re-send on restart
+            print(f"Error replying to {comment.id}: {exc}")
+            self._count('failed')
+            result = self.journal.unknown('reply', comment.id, error=str(exc))
+        else:
+            if reply_id:
+                self._count('sent')
+                result = self.journal.done('reply', comment.id, reply_id=reply_id)
+            else:
+                self._count('failed')
+                result = self.journal.failed('reply', comment.id)
+        if self.on_result:
+            self.on_result(result)
+
+    # Recovery
+
+    def _replay_journal(self):
+        """Load finished replies and work out which unfinished ones must be re-sent"""
+        pending = []
+        for entry in self.journal.entries('reply'):
+            if entry.get('account_id', self.api.instagram_account_id) != self.api.instagram_account_id:
+                continue
+            key = entry['key']
+            if entry['state'] in (INTENT, UNKNOWN):
+                self._remember(key)
+                if self._already_replied(key, entry['message']):
+                    self.journal.done('reply', key, reply_id=None)
+                    continue
+                self._count('resumed')
+                pending.append((Comment(key, media_id=entry.get('media_id')), entry['message']))
+        return pending
+
+    def _already_replied(self, comment_id: str, message: str) -> bool:
+        replies = self.api.get_replies(comment_id)
+        if replies is None:
+            # Cannot tell; not re-sending is the safe side of a duplicate reply
+            print(f"Could not verify reply to {comment_id}; not re-sending")
+            return True
+        return any(reply.text == message and
+                   (self.own_username is None or reply.username == self.own_username)
+                   for reply in replies)
@@ -0,0 +1,200 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from retry import endpoint_key
+
+# (endpoint shape, required prefix of the `fields` param or None, TTL seconds).
+# /me/accounts is not cached: its body holds every page's access token.
+DEFAULT_TTLS: List[Tuple[str, Optional[str], int]] = [
+    ('GET /debug_token', None, 3600),
+    ('GET /me', None, 3600),
+    ('GET /{id}', 'instagram_business_account', 24 * 3600),
+    ('GET /{id}', 'id,username,profile_picture_url', 3600),
+]
+
+# Params holding credentials; they are fingerprinted, never stored
+SECRET_PARAMS = {'access_token', 'input_token', 'client_secret', 'fb_exchange_token', 'code'}
+# Responses containing this key carry tokens (e.g. /me?fields=accounts{access_token}) and are never stored
+TOKEN_IN_BODY = b'"access_token"'
+
+
+def fingerprint(secret: str) -> str:
+    return hashlib.sha256(secret.encode()).hexdigest()[:16]
+
+
+class CacheEntry:
+    """A stored Graph response body plus its validators"""
+
+    __slots__ = ('body', 'etag', 'content_type', 'expires_at')
+
+    def __init__(self, body: bytes, etag: Optional[str], content_type: Optional[str], expires_at: float):
+        self.body = body
+        self.etag = etag
+        self.content_type = content_type
+        self.expires_at = expires_at
+
+    def to_response(self, url: str) -> requests.Response:
+        response = requests.Response()
+        response.status_code = 200
+        response._content = self.body
+        response.url = url
+        response.encoding = 'utf-8'
+        response.headers = CaseInsensitiveDict({'Content-Type': self.content_type or 'application/json',
+                                                'X-Cache': 'HIT'})
+        if self.etag:
+            response.headers['ETag'] = self.etag
+        return response
+
+
+class ResponseCache:
+    """Two-tier (in-memory LRU + SQLite) cache for slow-changing Graph GETs.
+
+    Keys are the endpoint, its params and a fingerprint of the token, so
+    different tokens never share entries. Only endpoints with a TTL rule
+    are cached, and responses whose body holds an access token never are.
+    Expired entries with an ETag are revalidated with If-None-Match
+    instead of being refetched.
+    """
+
+    def __init__(self, path: str = '.graph_cache.sqlite', memory_size: int = 512,
+                 ttls: Optional[List[Tuple[str, Optional[str], int]]] = None, clock=time.time):
+        self.memory_size = memory_size
+        self.ttls = DEFAULT_TTLS if ttls is None else ttls
+        self.clock = clock
+        self.memory: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self._lock = threading.Lock()
+
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                etag TEXT,
+                content_type TEXT,
+                expires_at REAL NOT NULL
+            )
+        """)
+        # Entries written before token-bearing bodies were refused
+        self.db.execute("DELETE FROM responses WHERE instr(body, ?) > 0", (TOKEN_IN_BODY,))
+        self.db.commit()
+
+    def ttl_for(self, method: str, url: str, params: Optional[Dict]) -> int:
+        """TTL in seconds for this request, or 0 if it should not be cached"""
+        if method.upper() != 'GET':
+            return 0
+        endpoint = endpoint_key(method, url)
+        fields = (params or {}).get('fields', '')
+        for rule_endpoint, fields_prefix, ttl in self.ttls:
+            if rule_endpoint == endpoint and (fields_prefix is None or fields.startswith(fields_prefix)):
+                return ttl
+        return 0
+
+    def key(self, method: str, url: str, params: Optional[Dict]) -> str:
+        parts = []
+        for name, value in sorted((params or {}).items()):
+            if name in SECRET_PARAMS:
+                value = fingerprint(str(value))
+            parts.append(f"{name}={value}")
+        raw = f"{method.upper()} {url.split('?')[0]}?{'&'.join(parts)}"
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """Return the entry (fresh or stale) for key, promoting disk hits to memory"""
+        with self._lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                self.memory.move_to_end(key)
+                return entry
+            row = self.db.execute(
+                "SELECT body, etag, content_type, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            entry = CacheEntry(*row)
+            self._remember(key, entry)
+            return entry
+
+    def put(self, key: str, response: requests.Response, ttl: int) -> CacheEntry:
+        entry = CacheEntry(response.content, response.headers.get('ETag'),
+                           response.headers.get('Content-Type'), self.clock() + ttl)
+        self._write(key, entry)
+        return entry
+
+    def refresh(self, key: str, entry: CacheEntry, ttl: int) -> CacheEntry:
+        """Extend an entry after a 304 Not Modified"""
+        entry.expires_at = self.clock() + ttl
+        self._write(key, entry)
+        return entry
+
+    def _write(self, key: str, entry: CacheEntry):
+        with self._lock:
+            self._remember(key, entry)
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses (key, body, etag, content_type, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (key, entry.body, entry.etag, entry.content_type, entry.expires_at)
+            )
+            self.db.commit()
+
+    def _remember(self, key: str, entry: CacheEntry):
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_size:
+            self.memory.popitem(last=False)
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        return entry.expires_at > self.clock()
+
+    def purge_expired(self):
+        """Drop expired entries that cannot be revalidated"""
+        with self._lock:
+            self.db.execute("DELETE FROM responses WHERE expires_at < ? AND etag IS NULL", (self.clock(),))
+            self.db.commit()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'revalidated': self.revalidated,
+                    'memory_entries': len(self.memory)}
+
+    def close(self):
+        self.db.close()
+
+    def fetch(self, method: str, url: str, params: Optional[Dict], send) -> Optional[requests.Response]:
+        """Serve a cacheable request, calling send(extra_headers) only when needed.
+
+        Returns None if the request is not cacheable so the caller can send
+        it normally.
+        """
+        ttl = self.ttl_for(method, url, params)
+        if not ttl:
+            return None
+
+        key = self.key(method, url, params)
+        entry = self.get(key)
+        if entry is not None and self.is_fresh(entry):
+            with self._lock:
+                self.hits += 1
+            return entry.to_response(url)
+
+        headers = {'If-None-Match': entry.etag} if entry is not None and entry.etag else {}
+        response = send(headers)
+        if response.status_code == 304 and entry is not None:
+            with self._lock:
+                self.revalidated += 1
+            return self.refresh(key, entry, ttl).to_response(url)
+
+        with self._lock:
+            self.misses += 1
+        if response.status_code == 200 and TOKEN_IN_BODY not in response.content:
+            self.put(key, response, ttl)
+        return response
+
@@ -0,0 +1,233 @@
+import json
+import random
+import re
+import threading
+import time
+from typing import Callable, Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+
+from rate_limit import THROTTLE_ERROR_CODES
+
+# Graph error codes documented as temporary: unknown error, service
+# unavailable, application limit reached, plus the throttling codes.
+TRANSIENT_ERROR_CODES = {1, 2, 341} | THROTTLE_ERROR_CODES
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+_ID_SEGMENT = re.compile(r'^\d+(_\d+)?$')
+
+
+def endpoint_key(method: str, url: str) -> str:
+    """Group URLs by shape, e.g. GET /{id}/comments"""
+    parts = [p for p in urlparse(url).path.split('/') if p]
+    if parts and re.match(r'^v\d+\.\d+$', parts[0]):
+        parts = parts[1:]
+    shape = '/'.join('{id}' if _ID_SEGMENT.match(p) else p for p in parts)
+    return f"{method.upper()} /{shape}"
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of calling an endpoint whose circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures and lets one trial call through after a cool-down"""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def end_trial(self):
+        """Let a later call run the trial if this one ended without recording a result"""
+        with self._lock:
+            self.trial_in_flight = False
+
+    def record_failure(self) -> bool:
+        """Count a failure; returns True if this failure opened the circuit"""
+        with self._lock:
+            self.failures += 1
+            was_open = self.opened_at is not None
+            if self.trial_in_flight or self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+            self.trial_in_flight = False
+            return self.opened_at is not None and not was_open
+
+
+class RetryStats:
+    """Per-endpoint counters for retries and the latency they added"""
+
+    def __init__(self):
+        self.endpoints: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, endpoint: str) -> Dict:
+        entry = self.endpoints.get(endpoint)
+        if entry is None:
+            entry = {'calls': 0, 'retries': 0, 'retry_latency': 0.0, 'exhausted': 0, 'circuit_opens': 0}
+            self.endpoints[endpoint] = entry
+        return entry
+
+    def record_call(self, endpoint: str, retries: int, retry_latency: float, exhausted: bool):
+        with self._lock:
+            entry = self._entry(endpoint)
+            entry['calls'] += 1
+            entry['retries'] += retries
+            entry['retry_latency'] += retry_latency
+            entry['exhausted'] += int(exhausted)
+
+    def record_circuit_open(self, endpoint: str):
+        with self._lock:
+            self._entry(endpoint)['circuit_opens'] += 1
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {endpoint: dict(entry) for endpoint, entry in self.endpoints.items()}
+
+
+class RetryPolicy:
+    """Retries transient Graph failures with exponential backoff and full jitter.
+
+    Idempotent calls (reads) are retried on timeouts, connection errors,
+    5xx and transient Graph error codes. Writes are only retried when the
+    request provably did not run: connect timeouts and throttling
+    rejections. Retry-After is honoured when present.
+    """
+
+    def __init__(self, max_retries: int = 3, base_delay: float = 0.5, max_delay: float = 20.0,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.sleep = sleep
+        self.stats = RetryStats()
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, endpoint: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self.breakers.get(endpoint)
+            if breaker is None:
+                breaker = CircuitBreaker(self.failure_threshold, self.reset_timeout, self.clock)
+                self.breakers[endpoint] = breaker
+            return breaker
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def call(self, send: Callable[[], requests.Response], method: str, url: str,
+             idempotent: bool) -> requests.Response:
+        """Run send() until it succeeds, fails permanently or runs out of retries"""
+        endpoint = endpoint_key(method, url)
+        breaker = self.breaker(endpoint)
+        started = self.clock()
+        attempt = 0
+
+        while True:
+            if not breaker.allow():
+                self.stats.record_call(endpoint, attempt, self.clock() - started, exhausted=True)
+                raise CircuitOpenError(f"Circuit open for {endpoint}")
+
+            attempt_started = self.clock()
+            try:
+                response = send()
+            except requests.exceptions.RequestException as exc:
+                self._failure(breaker, endpoint)
+                if attempt >= self.max_retries or not _retryable_exception(exc, idempotent):
+                    self.stats.record_call(endpoint, attempt, attempt_started - started, exhausted=True)
+                    raise
+                delay = self.backoff(attempt)
+            else:
+                throttled, transient = _classify(response)
+                if response.status_code >= 500:
+                    self._failure(breaker, endpoint)
+                else:
+                    breaker.record_success()
+
+                retryable = throttled or (transient and idempotent)
+                if not retryable or attempt >= self.max_retries:
+                    self.stats.record_call(endpoint, attempt, attempt_started - started,
+                                           exhausted=retryable)
+                    return response
+                delay = _retry_after(response)
+                if delay is None:
+                    delay = self.backoff(attempt)
+            finally:
+                # Anything else send() raises (bad JSON, a bug, a cancellation) must not hold the trial
+                breaker.end_trial()
+
+            attempt += 1
+            self.sleep(min(delay, self.max_delay))
+
+    def _failure(self, breaker: CircuitBreaker, endpoint: str):
+        if breaker.record_failure():
+            self.stats.record_circuit_open(endpoint)
+
+
+def _retryable_exception(exc: Exception, idempotent: bool) -> bool:
+    if isinstance(exc, CircuitOpenError):
+        return False
+    if isinstance(exc, requests.exceptions.ConnectTimeout):
+        return True
+    return idempotent and isinstance(exc, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+
+def _classify(response: requests.Response):
+    """Return (throttled, transient) for a Graph response"""
+    if response.status_code == 200:
+        return False, False
+    if response.status_code == 429:
+        return True, True
+    try:
+        error = json.loads(response.text).get('error', {})
+    except (ValueError, AttributeError):
+        error = {}
+    code = error.get('code')
+    throttled = code in THROTTLE_ERROR_CODES
+    transient = (response.status_code in RETRYABLE_STATUS_CODES
+                 or code in TRANSIENT_ERROR_CODES
+                 or bool(error.get('is_transient')))
+    return throttled, transient
+
+
+def _retry_after(response: requests.Response) -> Optional[float]:
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
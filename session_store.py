@@ -0,0 +1,75 @@
+import json
+import os
+import tempfile
+import threading
+from typing import Any, Callable, Dict
+
+
+class SessionStore:
+    """Small JSON document (session.json) shared by components that persist state.
+
+    Each component owns one top-level section. Writes go to a temp file
+    that is renamed over the original, so a crash never leaves a
+    half-written session behind.
+
+    Each instance writes its whole cached document, so two instances over
+    one file overwrite each other's sections; components share one through
+    SessionStore.shared().
+    """
+
+    _shared: Dict[str, 'SessionStore'] = {}
+    _shared_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, path: str = 'session.json') -> 'SessionStore':
+        """The process-wide store for path"""
+        key = os.path.abspath(path)
+        with cls._shared_lock:
+            store = cls._shared.get(key)
+            if store is None:
+                store = cls._shared[key] = cls(path)
+            return store
+
+    def __init__(self, path: str = 'session.json'):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = self._load()
+
+    def _load(self) -> Dict:
+        try:
+            with open(self.path) as f:
+                return json.load(f) or {}
+        except FileNotFoundError:
+            return {}
+        except ValueError:
+            print(f"Error reading {self.path}; starting with an empty session")
+            return {}
+
+    def get(self, section: str, default: Any = None) -> Any:
+        with self._lock:
+            value = self._data.get(section, default)
+            return json.loads(json.dumps(value))
+
+    def set(self, section: str, value: Any):
+        with self._lock:
+            self._data[section] = value
+            self._write()
+
+    def update(self, section: str, fn: Callable[[Any], Any]):
+        """Replace a section with fn(current value) under the store lock"""
+        with self._lock:
+            self._data[section] = fn(self._data.get(section))
+            self._write()
+
+    def _write(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.session-', suffix='.json')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self._data, f, indent=2, sort_keys=True)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
@@ -0,0 +1,264 @@
+import gzip
+import http.server
+import json
+import random
+import threading
+import time
+import urllib.parse
+from typing import Dict, List, Optional
+
+
+class StubGraphHandler(http.server.BaseHTTPRequestHandler):
+    """Answers Graph API paths with small canned JSON payloads"""
+
+    # HTTP/1.1 so clients can keep connections open between requests
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.startswith('/cdn/'):
+            self.send_asset()
+            return
+        self.handle_graph_request('GET')
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length).decode() if length else ''
+        self.handle_graph_request('POST', dict(urllib.parse.parse_qsl(body)))
+
+    def handle_graph_request(self, method, form: Optional[Dict] = None):
+        parsed = urllib.parse.urlparse(self.path)
+        params = dict(urllib.parse.parse_qsl(parsed.query))
+        params.update(form or {})
+        status, body, headers = self.server.route(method, parsed.path, params)
+        self.send_json(status, body, headers)
+
+    def send_json(self, status: int, body: Dict, headers: Optional[Dict] = None):
+        payload = json.dumps(body).encode()
+        accept = self.headers.get('Accept-Encoding', '')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        if 'gzip' in accept and len(payload) > 256:
+            payload = gzip.compress(payload)
+            self.send_header('Content-Encoding', 'gzip')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def send_asset(self):
+        """Binary media for /cdn/... paths; the same file name always gets the same bytes"""
+        name = urllib.parse.urlparse(self.path).path.rsplit('/', 1)[-1]
+        payload = self.server.asset_bytes(name)
+        time.sleep(self.server.asset_latency)
+        self.send_response(200)
+        self.send_header('Content-Type', 'video/mp4' if name.endswith('.mp4') else 'image/jpeg')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class StubGraphServer(http.server.ThreadingHTTPServer):
+    """Local stand-in for graph.facebook.com used by benchmarks"""
+
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, media_count: int = 25, video_processing: float = 0.5,
+                 hashtag_media_count: int = 500, asset_size: int = 200_000, asset_latency: float = 0.0):
+        super().__init__(("127.0.0.1", port), StubGraphHandler)
+        self.media_count = media_count
+        self.asset_size = asset_size
+        self.asset_latency = asset_latency
+        self._assets: Dict[str, bytes] = {}
+        self.hashtag_media_count = hashtag_media_count
+        self.video_processing = video_processing
+        self.containers: Dict[str, Dict] = {}
+        self.request_count = 0
+        self._count_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def route(self, method: str, path: str, params: Dict):
+        """Return (status, body, headers) for a Graph path"""
+        with self._count_lock:
+            self.request_count += 1
+
+        parts = [p for p in path.split('/') if p]
+        if parts and parts[0].startswith('v') and parts[0][1:].replace('.', '').isdigit():
+            parts = parts[1:]
+
+        if not parts and method == 'POST' and 'batch' in params:
+            return 200, self.route_batch(json.loads(params['batch'])), None
+        if not parts and method == 'GET' and 'ids' in params:
+            return 200, self.route_ids(params['ids'].split(','), params.get('fields')), None
+        if not parts:
+            return 400, {'error': {'message': 'Unsupported request', 'code': 100}}, None
+        if parts[-1] == 'ig_hashtag_search':
+            name = params.get('q', '')
+            return 200, {'data': [{'id': f"1784{sum(map(ord, name)) % 10 ** 6:06d}{len(name):02d}"}]}, None
+        if parts[-1] in ('top_media', 'recent_media'):
+            # top_media is a sample of popular posts that recent_media also contains
+            indexes = range(self.hashtag_media_count) if parts[-1] == 'recent_media' else \
+                range(0, self.hashtag_media_count, 20)
+            media = [self.make_media(parts[0], i) for i in indexes]
+            return 200, self.paginate(path, params, [_select(m, params.get('fields')) for m in media]), None
+        if 'business_discovery' in params.get('fields', ''):
+            username = params['fields'].split('username(', 1)[1].split(')', 1)[0]
+            owner = f"1790{sum(map(ord, username)) % 10 ** 6:06d}"
+            return 200, {'business_discovery': {
+                'id': owner, 'username': username, 'followers_count': 1200, 'media_count': self.media_count,
+                'media': {'data': [self.make_media(owner, i) for i in range(min(self.media_count, 25))]}
+            }, 'id': parts[0]}, None
+        if parts[-1] == 'media' and method == 'GET':
+            media = [self.make_media(parts[0], i) for i in range(self.media_count)]
+            return 200, {'data': [_select(m, params.get('fields')) for m in media]}, None
+        if parts[-1] == 'insights':
+            return 200, self.make_insights(parts[0], params), None
+        if parts[-1] == 'comments':
+            return 200, {'data': [self.make_comment(parts[0], i) for i in range(5)]}, None
+        if parts[-1] == 'media' and method == 'POST':
+            return 200, self.create_container(parts[0], params), None
+        if parts[-1] == 'media_publish' and method == 'POST':
+            return self.publish_container(params.get('creation_id'))
+        if method == 'POST':
+            return 200, {'id': f"{parts[0]}_{self.request_count}"}, None
+        if parts[0] in self.containers:
+            return 200, _select(self.container_status(parts[0]), params.get('fields')), None
+        return 200, {'id': parts[0], 'username': 'stub_account', 'media_count': self.media_count}, None
+
+    def paginate(self, path: str, params: Dict, items: List, page_size: int = 50) -> Dict:
+        """One page of items with offset cursors and a paging.next link back to this server"""
+        offset = int(params.get('after') or 0)
+        size = min(int(params.get('limit') or page_size), page_size)
+        body = {'data': items[offset:offset + size], 'paging': {'cursors': {'before': str(offset)}}}
+        if offset + size < len(items):
+            body['paging']['cursors']['after'] = str(offset + size)
+            query = urllib.parse.urlencode({**params, 'after': offset + size})
+            body['paging']['next'] = f"{self.url}{path}?{query}"
+        return body
+
+    def route_batch(self, items):
+        """Answer a Graph batch request item by item"""
+        results = []
+        for item in items:
+            parsed = urllib.parse.urlparse('/' + item['relative_url'])
+            params = dict(urllib.parse.parse_qsl(parsed.query))
+            params.update(urllib.parse.parse_qsl(item.get('body', '')))
+            status, body, _ = self.route(item['method'], parsed.path, params)
+            results.append({'code': status, 'body': json.dumps(body)})
+        return results
+
+    def route_ids(self, ids, fields):
+        """Answer a multi-id lookup (GET /?ids=a,b&fields=...) with media objects"""
+        found = {}
+        for object_id in ids:
+            if object_id in self.containers:
+                found[object_id] = _select(self.container_status(object_id), fields)
+                continue
+            index = int(object_id[-4:]) if object_id[-4:].isdigit() else 0
+            media = self.make_media(object_id[:-4] or object_id, index)
+            media['id'] = object_id
+            found[object_id] = _select(media, fields)
+        return found
+
+    def asset_bytes(self, name: str) -> bytes:
+        # Videos are ten times larger than images, like on the real CDN
+        payload = self._assets.get(name)
+        if payload is None:
+            size = self.asset_size * (10 if name.endswith('.mp4') else 1)
+            payload = self._assets[name] = random.Random(name).randbytes(size)
+        return payload
+
+    def make_media(self, account_id: str, index: int) -> Dict:
+        return {
+            'id': f"{account_id}{index:04d}",
+            'caption': f"Stub post number {index} #oldnews",
+            'media_type': 'IMAGE',
+            'media_url': f"https://cdn.example.com/{account_id}/{index}.jpg",
+            'permalink': f"https://www.instagram.com/p/stub{index}/",
+            'timestamp': f"2024-01-{index % 28 + 1:02d}T12:00:00+0000",
+            'like_count': index * 3,
+            'comments_count': index % 7
+        }
+
+    def create_container(self, account_id: str, params: Dict) -> Dict:
+        """Media containers: video ones stay IN_PROGRESS for video_processing seconds"""
+        with self._count_lock:
+            container_id = f"{account_id}c{len(self.containers) + 1}"
+            processing = self.video_processing if 'video_url' in params else 0
+            self.containers[container_id] = {'ready_at': time.monotonic() + processing, 'published': False}
+        return {'id': container_id}
+
+    def container_status(self, container_id: str) -> Dict:
+        container = self.containers[container_id]
+        if container['published']:
+            status = 'PUBLISHED'
+        elif time.monotonic() < container['ready_at']:
+            status = 'IN_PROGRESS'
+        else:
+            status = 'FINISHED'
+        return {'id': container_id, 'status_code': status, 'status': status}
+
+    def publish_container(self, container_id: Optional[str]):
+        if container_id not in self.containers or self.container_status(container_id)['status_code'] != 'FINISHED':
+            return 400, {'error': {'message': 'Media ID is not available', 'code': 9007}}, None
+        self.containers[container_id]['published'] = True
+        return 200, {'id': f"{container_id}m"}, None
+
+    def make_comment(self, media_id: str, index: int) -> Dict:
+        return {
+            'id': f"{media_id}c{index}",
+            'text': f"Comment {index}",
+            'username': f"user{index}",
+            'timestamp': "2024-01-01T12:00:00+0000",
+            'like_count': index
+        }
+
+    def make_insights(self, account_id: str, params: Dict) -> Dict:
+        """Daily values for each requested metric between since and until"""
+        until = int(params.get('until') or 1704067200) // 86400 * 86400
+        since = int(params.get('since') or until - 2 * 86400) // 86400 * 86400
+        days = range(since + 86400, until + 86400, 86400)
+        return {'data': [{
+            'name': metric,
+            'period': params.get('period', 'day'),
+            'values': [{'value': (day // 86400) % 1000 + len(metric),
+                        'end_time': time.strftime('%Y-%m-%dT%H:%M:%S+0000', time.gmtime(day))}
+                       for day in days],
+            'id': f"{account_id}/insights/{metric}/{params.get('period', 'day')}"
+        } for metric in params.get('metric', 'impressions').split(',')]}
+
+    def start(self):
+        """Serve in a background thread"""
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def _select(obj: Dict, fields: Optional[str]) -> Dict:
+    """Keep only the requested top-level fields, like the Graph API does"""
+    if not fields:
+        return obj
+    wanted = set(fields.split(','))
+    return {k: v for k, v in obj.items() if k in wanted or k == 'id'}
+
+
+if __name__ == "__main__":
+    server = StubGraphServer(port=8081)
+    print(f"Stub Graph API listening at {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
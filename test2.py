@@ -1,4 +1,3 @@
-import requests
 import webbrowser
 from urllib.parse import urlencode
 import http.server
@@ -10,16 +9,24 @@ import time
 import os
 import dotenv
 
+from graph_batch import GraphBatch
+from models import Account
+from transport import GRAPH_URL, GRAPH_VERSION, get_default_transport
+
 dotenv.load_dotenv()
 
 class InstagramAuth:
-    def __init__(self, app_id, app_secret, redirect_uri, scopes=None):
+    def __init__(self, app_id, app_secret, redirect_uri, scopes=None, transport=None, graph_url=GRAPH_URL):
         self.app_id = app_id
         self.app_secret = app_secret
         self.redirect_uri = redirect_uri
         self.auth_code = None
         self.access_token = None
         self.long_lived_token = None
+        self.long_lived_expires_at = None
+        self.graph_url = graph_url
+        self.base_url = f"{graph_url}/{GRAPH_VERSION}"
+        self.transport = transport or get_default_transport()
         
         # Default scopes if none provided
         self.scopes = scopes or [
@@ -95,7 +102,7 @@ class InstagramAuth:
         if not self.auth_code:
             raise ValueError("No authorization code available. Run the authorization flow first.")
         
-        url = "https://graph.facebook.com/v18.0/oauth/access_token"
+        url = f"{self.base_url}/oauth/access_token"
         params = {
             'client_id': self.app_id,
             'client_secret': self.app_secret,
@@ -103,7 +110,7 @@ class InstagramAuth:
             'code': self.auth_code
         }
         
-        response = requests.get(url, params=params)
+        response = self.transport.get(url, params=params)
         if response.status_code == 200:
             data = response.json()
             self.access_token = data.get('access_token')
@@ -117,7 +124,7 @@ class InstagramAuth:
         if not self.access_token:
             raise ValueError("No short-lived access token available.")
         
-        url = "https://graph.facebook.com/v18.0/oauth/access_token"
+        url = f"{self.base_url}/oauth/access_token"
         params = {
             'grant_type': 'fb_exchange_token',
             'client_id': self.app_id,
@@ -125,10 +132,12 @@ class InstagramAuth:
             'fb_exchange_token': self.access_token
         }
         
-        response = requests.get(url, params=params)
+        response = self.transport.get(url, params=params)
         if response.status_code == 200:
             data = response.json()
             self.long_lived_token = data.get('access_token')
+            if data.get('expires_in'):
+                self.long_lived_expires_at = int(time.time()) + int(data['expires_in'])
             return self.long_lived_token
         else:
             print(f"Error getting long-lived token: {response.text}")
@@ -141,13 +150,13 @@ class InstagramAuth:
         if not token_to_check:
             raise ValueError("No token available to check.")
         
-        url = "https://graph.facebook.com/debug_token"
+        url = f"{self.graph_url}/debug_token"
         params = {
             'input_token': token_to_check,
             'access_token': f"{self.app_id}|{self.app_secret}"
         }
         
-        response = requests.get(url, params=params)
+        response = self.transport.get(url, params=params)
         if response.status_code == 200:
             return response.json()
         else:
@@ -162,12 +171,12 @@ class InstagramAuth:
         token = self.long_lived_token or self.access_token
         
         # First, get the user's Facebook pages
-        url = "https://graph.facebook.com/v18.0/me/accounts"
+        url = f"{self.base_url}/me/accounts"
         params = {
             'access_token': token
         }
         
-        response = requests.get(url, params=params)
+        response = self.transport.get(url, params=params)
         if response.status_code != 200:
             print(f"Error getting Facebook pages: {response.text}")
             return None
@@ -177,29 +186,28 @@ class InstagramAuth:
             print("No Facebook pages found.")
             return None
         
-        # For each page, check if it has an Instagram business account
-        instagram_accounts = []
+        # Look up every page's Instagram business account in one batch request
+        batch = GraphBatch(token, transport=self.transport, base_url=self.base_url)
+        lookups = []
         for page in pages:
-            page_id = page.get('id')
-            page_name = page.get('name')
-            page_token = page.get('access_token')
-            
-            ig_url = f"https://graph.facebook.com/v18.0/{page_id}/"
-            ig_params = {
+            call = batch.get(page.get('id'), {
                 'fields': 'instagram_business_account',
-                'access_token': page_token
-            }
-            
-            ig_response = requests.get(ig_url, params=ig_params)
-            if ig_response.status_code == 200:
-                ig_data = ig_response.json()
+                'access_token': page.get('access_token')
+            })
+            lookups.append((page, call))
+        batch.execute()
+        
+        instagram_accounts = []
+        for page, call in lookups:
+            if call.ok:
+                ig_data = call.json()
                 if 'instagram_business_account' in ig_data:
-                    instagram_accounts.append({
-                        'page_id': page_id,
-                        'page_name': page_name,
-                        'page_token': page_token,
-                        'instagram_account_id': ig_data['instagram_business_account']['id']
-                    })
+                    instagram_accounts.append(Account(
+                        page_id=page.get('id'),
+                        page_name=page.get('name'),
+                        page_token=page.get('access_token'),
+                        instagram_account_id=ig_data['instagram_business_account']['id']
+                    ))
         
         return instagram_accounts
     
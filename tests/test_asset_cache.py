@@ -0,0 +1,88 @@
+import hashlib
+import os
+import tempfile
+import time
+import unittest
+
+from asset_cache import STALE_PART_AGE, AssetFetcher, AssetStore
+from stub_graph_server import StubGraphServer
+
+
+class AssetStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        self.index = os.path.join(self.root, 'index.sqlite')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_only_stale_partial_downloads_are_removed_on_open(self):
+        tmp_dir = os.path.join(self.root, 'tmp')
+        os.makedirs(tmp_dir)
+        names = {
+            'in_progress': f"{os.getpid()}-a1b2.part",
+            'dead_process': "999999999-c3d4.part",
+            'old': f"{os.getpid()}-e5f6.part",
+            'unnamed': "tmpx7y8.part",
+            'other': "notes.txt",
+        }
+        for name in names.values():
+            open(os.path.join(tmp_dir, name), 'wb').close()
+        past = time.time() - STALE_PART_AGE - 60
+        os.utime(os.path.join(tmp_dir, names['old']), (past, past))
+
+        AssetStore(self.root, path=self.index).close()
+        self.assertEqual(sorted(os.listdir(tmp_dir)), sorted([names['in_progress'], names['other']]))
+
+    def test_lookup_drops_assets_whose_file_is_gone(self):
+        server = StubGraphServer().start()
+        try:
+            fetcher = AssetFetcher(AssetStore(self.root, path=self.index), max_workers=2)
+            url = f"{server.url}/cdn/acct/1.jpg"
+            asset = fetcher.fetch(url)
+            os.unlink(asset.path)
+
+            store = fetcher.store
+            self.assertIsNone(store.lookup(url))
+            self.assertEqual((len(store), store.total_bytes, store.stats['missing']), (0, 0, 1))
+            self.assertTrue(os.path.exists(fetcher.fetch(url).path))
+            self.assertEqual(fetcher.stats['downloads'], 2)
+            fetcher.close()
+        finally:
+            server.stop()
+
+    def put(self, store, url, data: bytes):
+        f, tmp_path = store.temp_file()
+        with f:
+            f.write(data)
+        return store.commit(url, tmp_path, hashlib.sha256(data).hexdigest(), len(data), 'image/jpeg')
+
+    def test_a_fresh_download_replaces_a_file_deleted_behind_the_store(self):
+        store = AssetStore(self.root, path=self.index)
+        first = self.put(store, 'https://cdn.example.com/a.jpg', b'x' * 100)
+        os.unlink(first.path)
+
+        second = self.put(store, 'https://cdn.example.com/b.jpg', b'x' * 100)
+        self.assertIsNotNone(second)
+        self.assertTrue(os.path.exists(second.path))
+        self.assertEqual(store.lookup('https://cdn.example.com/a.jpg').sha256, first.sha256)
+        self.assertEqual((len(store), store.total_bytes, store.stats['deduplicated']), (1, 100, 0))
+        store.close()
+
+    def test_eviction_forgets_the_evicted_urls(self):
+        store = AssetStore(self.root, path=self.index, max_bytes=250, low_water=0.5)
+        self.put(store, 'https://cdn.example.com/a.jpg', b'a' * 100)
+        self.put(store, 'https://cdn.example.com/a2.jpg', b'a' * 100)
+        self.put(store, 'https://cdn.example.com/b.jpg', b'b' * 100)
+        self.put(store, 'https://cdn.example.com/c.jpg', b'c' * 100)
+
+        self.assertIsNone(store.lookup('https://cdn.example.com/a.jpg'))
+        self.assertIsNone(store.lookup('https://cdn.example.com/a2.jpg'))
+        self.assertIsNotNone(store.lookup('https://cdn.example.com/c.jpg'))
+        self.assertEqual(store.stats['missing'], 0)
+        store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
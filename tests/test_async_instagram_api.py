@@ -0,0 +1,40 @@
+import asyncio
+import unittest
+
+from async_instagram_api import AsyncInstagramAPI
+from stub_graph_server import StubGraphServer
+
+
+class SemaphoreTest(unittest.TestCase):
+    def setUp(self):
+        self.server = StubGraphServer().start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def fan_out(self, api: AsyncInstagramAPI, calls: int = 10):
+        async def run():
+            return await asyncio.gather(*(api.get_account_info() for _ in range(calls)))
+        return asyncio.run(run())
+
+    def test_each_event_loop_gets_its_own_semaphore(self):
+        api = AsyncInstagramAPI('token', '1789', concurrency=2, base_url=self.server.url)
+        # The second asyncio.run() is a new loop; a shared semaphore bound to the first would raise
+        for _ in range(2):
+            self.assertEqual(len(self.fan_out(api)), 10)
+
+    def test_instances_on_one_loop_share_the_account_semaphore(self):
+        first = AsyncInstagramAPI('token', '1789', concurrency=2, base_url=self.server.url)
+        second = AsyncInstagramAPI('token', '1789', concurrency=2, base_url=self.server.url)
+        other = AsyncInstagramAPI('token', '1790', concurrency=2, base_url=self.server.url)
+
+        async def semaphores():
+            return first.semaphore, second.semaphore, other.semaphore
+
+        a, b, c = asyncio.run(semaphores())
+        self.assertIs(a, b)
+        self.assertIsNot(a, c)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+
+from caption_index import CaptionIndex
+
+ORIGINAL = "Sunset over the harbour tonight, the boats coming home one by one #sunset #harbour"
+EDITED = "Sunset over the harbour tonight, the boats coming home one by one! #sunset #harbour"
+UNRELATED = "New recipe: slow roasted tomatoes with garlic and basil, recipe in bio #food"
+
+
+class SearchTest(unittest.TestCase):
+    def setUp(self):
+        self.index = CaptionIndex()
+        self.index.add_many([
+            ('1', "Morning coffee #coffee #morning"),
+            ('2', "Coffee and a book #coffee"),
+            ('3', "Evening walk #morning? no, evening"),
+            ('4', "More coffee #Coffee"),
+        ])
+
+    def test_results_are_newest_first_with_or_without_a_limit(self):
+        self.assertEqual(self.index.search('coffee'), ['4', '2', '1'])
+        self.assertEqual(self.index.search('coffee', limit=2), ['4', '2'])
+        self.assertEqual(self.index.search('coffee', limit=10), ['4', '2', '1'])
+
+    def test_zero_limit_returns_nothing(self):
+        self.assertEqual(self.index.search('coffee', limit=0), [])
+        self.assertEqual(self.index.hashtag('coffee', limit=0), [])
+
+    def test_every_term_must_match(self):
+        self.assertEqual(self.index.search('coffee book'), ['2'])
+        self.assertEqual(self.index.search('coffee tea'), [])
+        self.assertEqual(self.index.search(''), [])
+
+    def test_hashtag_lookup(self):
+        self.assertEqual(self.index.hashtag('#coffee'), ['4', '2', '1'])
+        self.assertEqual(self.index.hashtag('morning'), ['3', '1'])
+        self.assertEqual(self.index.hashtag('evening'), [])
+
+
+class NearDuplicateTest(unittest.TestCase):
+    def check(self, index):
+        matches = index.near_duplicates(EDITED)
+        self.assertEqual([media_id for media_id, _ in matches], ['original'])
+        self.assertGreaterEqual(matches[0][1], index.threshold)
+        self.assertFalse(index.is_near_duplicate(UNRELATED))
+
+    def test_edited_caption_is_found_before_merge(self):
+        index = CaptionIndex()
+        index.add('original', ORIGINAL)
+        index.add('other', "Quiet morning at the studio, new prints drying on the line #art")
+        self.assertTrue(index._tail)
+        self.assertEqual(len(index._keys), 0)
+        self.check(index)
+
+    def test_edited_caption_is_found_after_merge(self):
+        index = CaptionIndex(merge_every=2)
+        index.add('original', ORIGINAL)
+        index.add('other', "Quiet morning at the studio, new prints drying on the line #art")
+        self.assertFalse(index._tail)
+        self.assertEqual(len(index._keys), 2 * index.bands)
+        self.check(index)
+
+    def test_found_across_merged_and_recent_keys(self):
+        index = CaptionIndex(merge_every=2)
+        index.add_many([('a', UNRELATED), ('original', ORIGINAL)])
+        index.add('copy', EDITED)
+        self.assertTrue(index._tail)
+        ids = [media_id for media_id, _ in index.near_duplicates(EDITED)]
+        self.assertEqual(sorted(ids), ['copy', 'original'])
+
+    def test_add_reports_duplicates_among_earlier_captions(self):
+        index = CaptionIndex()
+        self.assertEqual(index.add('original', ORIGINAL), [])
+        self.assertEqual([media_id for media_id, _ in index.add('copy', EDITED)], ['original'])
+        self.assertEqual(index.add('other', UNRELATED), [])
+        self.assertEqual(index.add('copy', EDITED), [])
+
+    def test_empty_captions_are_not_duplicates_of_each_other(self):
+        index = CaptionIndex()
+        index.add('1', '')
+        self.assertEqual(index.add('2', None), [])
+        self.assertEqual(index.near_duplicates(''), [])
+        self.assertEqual(len(index), 2)
+        self.assertIn('2', index)
+
+
+if __name__ == '__main__':
+    unittest.main()
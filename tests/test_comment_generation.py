@@ -0,0 +1,31 @@
+import unittest
+
+from comment_generation import CommentGenerator, FakeBackend
+
+
+class RecordingBackend(FakeBackend):
+    def __init__(self):
+        super().__init__(call_latency=0, item_latency=0)
+        self.captions = []
+
+    def generate_batch(self, captions):
+        self.captions.extend(captions)
+        return super().generate_batch(captions)
+
+
+class CommentGeneratorTest(unittest.TestCase):
+    def test_backend_gets_the_original_caption_and_the_cache_the_normalized_one(self):
+        backend = RecordingBackend()
+        generator = CommentGenerator(backend, max_wait=0)
+        caption = "Sunset at the Pier 🌅  See https://example.com/p/1"
+        first = generator.generate(caption)
+        second = generator.generate("sunset at the pier 🌅 see")
+        generator.close()
+
+        self.assertEqual(backend.captions, [caption])
+        self.assertEqual(first, second)
+        self.assertEqual(generator.stats['hits'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
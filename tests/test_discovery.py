@@ -0,0 +1,146 @@
+import os
+import queue
+import tempfile
+import unittest
+
+from discovery import HASHTAG_WINDOW, BloomFilter, DiscoveryCrawler
+from models import Media
+from session_store import SessionStore
+
+
+class FakeAPI:
+    """Hashtag search and hashtag media from in-memory lists of post ids"""
+
+    def __init__(self):
+        self.edges = {}
+        self.searches = []
+        self.yielded = 0
+
+    def post(self, tag, edge, *ids):
+        self.edges.setdefault((tag, edge), []).extend(ids)
+
+    def search_hashtag(self, name):
+        self.searches.append(name)
+        return f"id-{name}"
+
+    def iter_hashtag_media(self, hashtag_id, edge='recent_media', page_size=50):
+        for media_id in self.edges.get((hashtag_id[3:], edge), []):
+            self.yielded += 1
+            yield Media.from_graph({'id': media_id, 'caption': f"post {media_id}"})
+
+    def get_business_discovery(self, username, media_limit=50):
+        return None
+
+
+class BloomFilterTest(unittest.TestCase):
+    def test_save_and_load_round_trip(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        self.assertTrue(bloom.add('a'))
+        self.assertTrue(bloom.add('b'))
+        self.assertFalse(bloom.add('a'))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'seen.bloom')
+            bloom.save(path)
+            loaded = BloomFilter.load(path)
+            self.assertEqual((loaded.size, loaded.hashes, loaded.count), (bloom.size, bloom.hashes, 2))
+            self.assertEqual(loaded.bits, bloom.bits)
+            self.assertIn('a', loaded)
+            self.assertNotIn('c', loaded)
+            self.assertFalse(loaded.add('b'))
+            self.assertEqual(os.listdir(tmp), ['seen.bloom'])
+
+            self.assertIsNone(BloomFilter.load(os.path.join(tmp, 'missing.bloom')))
+            with open(path, 'r+b') as f:
+                f.truncate(40)
+            self.assertIsNone(BloomFilter.load(path))
+
+
+class DiscoveryCrawlerTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = SessionStore(os.path.join(self.tmp.name, 'session.json'))
+        self.seen_path = os.path.join(self.tmp.name, 'discovery.bloom')
+        self.api = FakeAPI()
+        self.now = 1_000_000.0
+        # Cleanups run last-in first-out, so crawlers are closed (and saved) before this
+        self.addCleanup(self.tmp.cleanup)
+
+    def crawler(self, **kwargs):
+        kwargs.setdefault('max_workers', 1)
+        crawler = DiscoveryCrawler(self.api, self.store, self.seen_path, queue.Queue(), seen_capacity=10000,
+                                   clock=lambda: self.now, **kwargs)
+        self.addCleanup(crawler.close)
+        return crawler
+
+    def test_hashtags_over_the_limit_wait_for_the_oldest_search_to_expire(self):
+        crawler = self.crawler(hashtag_limit=2)
+        for name in ('cats', 'dogs', 'birds'):
+            crawler.add_hashtag(name)
+        first = self.now
+        crawler.crawl_once()
+        self.assertEqual(self.api.searches, ['cats', 'dogs'])
+        self.assertEqual(crawler.stats['deferred'], 1)
+        birds = crawler.frontier.targets['hashtag:birds']
+        self.assertEqual(birds.next_visit, first + HASHTAG_WINDOW)
+        self.assertEqual(birds.visits, 0)
+
+        # Cached ids cost nothing, so the searched hashtags keep being crawled
+        self.now += 10 * crawler.revisit_interval
+        self.assertEqual(crawler.crawl_once()['targets'], 2)
+        self.assertEqual(self.api.searches, ['cats', 'dogs'])
+
+        self.now = first + HASHTAG_WINDOW
+        crawler.crawl_once()
+        self.assertEqual(self.api.searches, ['cats', 'dogs', 'birds'])
+        self.assertEqual(birds.visits, 1)
+
+    def test_visit_stops_after_a_run_of_seen_posts(self):
+        self.api.post('cats', 'top_media', *(f"t{n}" for n in range(10)))
+        self.api.post('cats', 'recent_media', *(f"r{n}" for n in range(10)))
+        crawler = self.crawler(stop_after_seen=3)
+        crawler.add_hashtag('cats')
+        self.assertEqual(crawler.crawl_once(), {'targets': 1, 'fetched': 20, 'new': 20})
+        self.assertEqual(crawler.candidates.qsize(), 20)
+
+        self.api.edges[('cats', 'recent_media')][:0] = ['r-new1', 'r-new2']
+        self.api.yielded = 0
+        self.now += 10 * crawler.revisit_interval
+        self.assertEqual(crawler.crawl_once(), {'targets': 1, 'fetched': 8, 'new': 2})
+        self.assertEqual(self.api.yielded, 8)
+
+    def test_seen_posts_survive_a_restart(self):
+        self.api.post('cats', 'top_media', 'a', 'b')
+        crawler = self.crawler()
+        crawler.add_hashtag('cats')
+        crawler.crawl_once()
+        crawler.save()
+
+        restarted = self.crawler()
+        self.assertIn('hashtag:cats', restarted.frontier)
+        self.now += 10 * restarted.revisit_interval
+        self.assertEqual(restarted.crawl_once(), {'targets': 1, 'fetched': 2, 'new': 0})
+        self.assertEqual(self.api.searches, ['cats'])
+
+    def test_revisits_back_off_as_the_yield_drops(self):
+        self.api.post('cats', 'recent_media', 'a', 'b', 'c', 'd')
+        crawler = self.crawler(revisit_interval=100)
+        crawler.add_hashtag('cats')
+        target = crawler.frontier.targets['hashtag:cats']
+
+        delays = []
+        for _ in range(6):
+            crawler.crawl_once()
+            delays.append(target.next_visit - self.now)
+            self.now = target.next_visit
+        # All new, then nothing new: the yield halves each visit and the delay grows towards 10x the interval
+        self.assertAlmostEqual(delays[0], 100 / 1.1)
+        self.assertAlmostEqual(delays[1], 100 / 0.6)
+        self.assertAlmostEqual(delays[2], 100 / 0.35)
+        self.assertEqual(delays, sorted(delays))
+        self.assertLess(delays[-1], 1000)
+        self.assertEqual(target.visits, 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+import json
+import unittest
+
+from graph_recorder import scrub_body, scrub_params
+
+
+class ScrubTest(unittest.TestCase):
+    def test_error_and_batch_codes_are_kept(self):
+        self.assertEqual(scrub_body({'error': {'message': 'Invalid token', 'code': 190, 'error_subcode': 463}}),
+                         {'error': {'message': 'Invalid token', 'code': 190, 'error_subcode': 463}})
+        self.assertEqual(scrub_body([{'code': 200, 'body': '{"id":"1"}'}]), [{'code': 200, 'body': '{"id":"1"}'}])
+
+    def test_oauth_code_param_is_scrubbed(self):
+        params = scrub_params({'code': 'AQB-oauth', 'redirect_uri': 'http://localhost:8000/callback?code=AQB'})
+        self.assertTrue(params['code'].startswith('scrubbed-'))
+        self.assertEqual(params['redirect_uri'], 'http://localhost:8000/callback?code=scrubbed')
+
+    def test_only_whole_param_names_match_in_urls(self):
+        url = 'https://graph.facebook.com/v18.0/1/media?access_token=EAAB&error_code=5&status_code=FINISHED'
+        self.assertEqual(scrub_body({'paging': {'next': url}}), {'paging': {'next': url.replace('EAAB', 'scrubbed')}})
+
+    def test_body_tokens_are_scrubbed(self):
+        body = scrub_body({'data': [{'id': '1', 'access_token': 'EAAB-page'}]})
+        self.assertTrue(body['data'][0]['access_token'].startswith('scrubbed-'))
+
+    def test_tokens_in_json_string_bodies_are_scrubbed(self):
+        batch = [{'code': 200, 'body': '{"id":"1","access_token":"EAAB-page","name":"Page"}'},
+                 {'code': 200, 'body': '{"paging":{"next":"https://graph.facebook.com/1?access_token=EAAB"}}'}]
+        scrubbed = scrub_body(batch)
+        first = json.loads(scrubbed[0]['body'])
+        self.assertTrue(first['access_token'].startswith('scrubbed-'))
+        self.assertEqual((first['id'], first['name']), ('1', 'Page'))
+        self.assertNotIn('EAAB', scrubbed[1]['body'])
+        self.assertEqual(scrubbed[0]['code'], 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import os
+import tempfile
+import threading
+import unittest
+from datetime import datetime, timedelta, timezone
+
+from insights_collector import DAY, InsightsCollector, InsightsStore
+
+
+class FakeAPI:
+    """get_insights answering one daily value per metric, recording each call"""
+
+    instagram_account_id = '1789'
+
+    def __init__(self):
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def get_insights(self, metric, period='day', since=None, until=None, metric_type=None):
+        with self._lock:
+            self.calls.append((tuple(metric), int(since.timestamp()), int(until.timestamp())))
+        days = range(int(since.timestamp()) + DAY, int(until.timestamp()) + 1, DAY)
+        return {'data': [{'name': name, 'period': period, 'values': [
+            {'value': 10, 'end_time': datetime.fromtimestamp(day, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S%z')}
+            for day in days
+        ]} for name in metric]}
+
+
+class InsightsCollectorTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = InsightsStore(os.path.join(self.tmp.name, 'instabot.sqlite'))
+        self.api = FakeAPI()
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def collector(self, **kwargs):
+        return InsightsCollector(self.api, self.store, metrics=('reach', 'impressions'), **kwargs)
+
+    def test_windows_are_aligned_to_the_window_length(self):
+        collector = self.collector(window_days=10)
+        since = datetime(2024, 1, 3, 7, tzinfo=timezone.utc)
+        until = datetime(2024, 2, 1, tzinfo=timezone.utc)
+        windows = collector.windows(since, until)
+
+        self.assertTrue(all(start % (10 * DAY) == 0 for start, _ in windows))
+        self.assertLessEqual(windows[0][0], since.timestamp())
+        self.assertEqual(windows[-1][1], until.timestamp())
+        self.assertEqual([start for start, _ in windows[1:]], [end for _, end in windows[:-1]])
+        # A range starting elsewhere in the same window maps to the same windows
+        self.assertEqual(collector.windows(since + timedelta(days=1), until), windows)
+
+    def test_all_metrics_go_in_one_call_per_window(self):
+        stats = self.collector(window_days=10).collect(datetime(2024, 1, 1, tzinfo=timezone.utc),
+                                                       datetime(2024, 2, 1, tzinfo=timezone.utc))
+        self.assertEqual(stats['fetched'], stats['windows'])
+        self.assertEqual(len(self.api.calls), stats['windows'])
+        self.assertTrue(all(metrics == ('reach', 'impressions') for metrics, _, _ in self.api.calls))
+        self.assertEqual(len(self.store.series('1789', 'reach')['value']),
+                         len(self.store.series('1789', 'impressions')['value']))
+
+    def test_settled_windows_are_skipped_and_recent_ones_refetched(self):
+        collector = self.collector(window_days=10)
+        old = (datetime(2024, 1, 1, tzinfo=timezone.utc), datetime(2024, 2, 1, tzinfo=timezone.utc))
+        first = collector.collect(*old)
+        second = collector.collect(*old)
+        self.assertEqual((second['skipped'], second['fetched']), (first['windows'], 0))
+
+        now = datetime.now(timezone.utc)
+        collector.collect(now - timedelta(days=1), now)
+        calls = len(self.api.calls)
+        recent = collector.collect(now - timedelta(days=1), now)
+        self.assertEqual(recent['skipped'], 0)
+        self.assertEqual(len(self.api.calls), calls + recent['windows'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,188 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import threading
+import time
+import unittest
+
+from journal import RequestJournal
+from session_store import SessionStore
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_and_crash(directory: str, script: str):
+    """Run script in a child process with journal.py importable; it is expected to die with os._exit"""
+    code = f"import os, sys, threading\nsys.path.insert(0, {ROOT!r})\nos.chdir({directory!r})\n" + textwrap.dedent(script)
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, timeout=60)
+    if result.returncode != 17:
+        raise AssertionError(f"child exited with {result.returncode}: {result.stderr}")
+
+
+class JournalTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = self.tmp.name
+        self.path = os.path.join(self.dir, 'requests.jsonl')
+        self.session_path = os.path.join(self.dir, 'session.json')
+
+    def tearDown(self):
+        for path in (self.path,):
+            journal = RequestJournal._open.get(os.path.abspath(path))
+            if journal is not None:
+                journal.close()
+        self.tmp.cleanup()
+
+    def reopen(self) -> RequestJournal:
+        return RequestJournal(self.path, SessionStore(self.session_path))
+
+
+class SharedJournalTest(JournalTestCase):
+    def test_second_instance_on_same_path_is_refused(self):
+        journal = RequestJournal(self.path, SessionStore(self.session_path))
+        with self.assertRaises(ValueError):
+            RequestJournal(self.path, SessionStore(self.session_path))
+        self.assertIs(RequestJournal.shared(self.path), journal)
+
+    def test_two_writers_crash_and_restart(self):
+        # Two components (reply pipeline and publisher style) share the journal and
+        # the session; compaction runs while both write, then the process dies.
+        run_and_crash(self.dir, """
+            from journal import RequestJournal
+            from session_store import SessionStore
+
+            session = SessionStore.shared()
+            session.set('tokens', {'user': {'token': 'keep-me'}})
+
+            def writer(op, journal):
+                for n in range(300):
+                    journal.intent(op, str(n))
+                    if n % 3:
+                        journal.done(op, str(n), result=n)
+
+            journals = [RequestJournal.shared(), RequestJournal.shared()]
+            assert journals[0] is journals[1]
+            journals[0].compact_every = 97
+            threads = [threading.Thread(target=writer, args=(op, journal))
+                       for op, journal in zip(('reply', 'publish_media'), journals)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            os._exit(17)
+        """)
+        journal = self.reopen()
+        for op in ('reply', 'publish_media'):
+            entries = {entry['key']: entry for entry in journal.entries(op)}
+            self.assertEqual(len(entries), 300)
+            self.assertEqual(len(journal.unfinished(op)), 100)
+            self.assertEqual(journal.completed(op, '299')['result'], 299)
+        self.assertEqual(SessionStore(self.session_path).get('tokens'), {'user': {'token': 'keep-me'}})
+
+
+class CrashRecoveryTest(JournalTestCase):
+    def test_torn_final_line_is_skipped_and_trimmed(self):
+        run_and_crash(self.dir, """
+            from journal import RequestJournal
+
+            journal = RequestJournal.shared()
+            journal.intent('reply', 'a', message='hi')
+            journal.done('reply', 'a', reply_id='r1')
+            journal.intent('reply', 'b', message='hello')
+            # Die halfway through writing the next record
+            journal._file.write('{"op":"reply","key":"b","state":"do')
+            journal._file.flush()
+            os._exit(17)
+        """)
+        journal = self.reopen()
+        self.assertEqual(journal.completed('reply', 'a')['reply_id'], 'r1')
+        self.assertEqual([entry['key'] for entry in journal.unfinished('reply')], ['b'])
+        journal.done('reply', 'b', reply_id='r2')
+
+        # The record written after the torn line must survive the next restart
+        RequestJournal._open.pop(os.path.abspath(self.path))
+        journal._file.close()
+        journal = self.reopen()
+        self.assertEqual(journal.completed('reply', 'b')['reply_id'], 'r2')
+        self.assertEqual([record['key'] for record in journal.records()], ['a', 'a', 'b', 'b'])
+
+    def test_crash_between_snapshot_and_truncate(self):
+        run_and_crash(self.dir, """
+            import time
+            from journal import RequestJournal
+            from session_store import SessionStore
+
+            save = SessionStore.set
+            def set_then_crash(store, section, value):
+                save(store, section, value)
+                if section == 'journal':
+                    os._exit(17)
+            SessionStore.set = set_then_crash
+
+            journal = RequestJournal(retain=3600)
+            journal.done('reply', 'expired', ts=time.time() - 7200)
+            for n in range(10):
+                journal.intent('reply', str(n))
+                journal.done('reply', str(n), result=n)
+            journal.compact()
+        """)
+        with open(self.path, encoding='utf-8') as f:
+            self.assertEqual(len(f.readlines()), 21)
+        journal = self.reopen()
+        # The log's records are all in the snapshot: none are replayed over it
+        self.assertIsNone(journal.get('reply', 'expired'))
+        self.assertEqual(len(journal.entries('reply')), 10)
+        record = journal.intent('reply', 'next')
+        self.assertEqual(record['seq'], 22)
+        journal.compact()
+        self.assertEqual(list(journal.records()), [])
+
+    def test_group_commit_keeps_order_and_durability(self):
+        journal = RequestJournal(self.path, SessionStore(self.session_path), compact_every=10 ** 6)
+        appended = {}
+
+        def writer(name):
+            appended[name] = [journal.done('reply', f"{name}-{n}")['seq'] for n in range(200)]
+
+        threads = [threading.Thread(target=writer, args=(str(w),)) for w in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        seqs = [record['seq'] for record in journal.records()]
+        self.assertEqual(seqs, list(range(1, 3201)))
+        for name, writer_seqs in appended.items():
+            self.assertEqual(writer_seqs, sorted(writer_seqs))
+            keys = [record['key'] for record in journal.records() if record['key'].startswith(f"{name}-")]
+            self.assertEqual(keys, [f"{name}-{n}" for n in range(200)])
+        self.assertLess(journal.stats['commits'], journal.stats['records'])
+        self.assertEqual(journal._durable, 3200)
+
+
+class RetentionTest(JournalTestCase):
+    def test_unknown_outcomes_stay_unfinished(self):
+        journal = self.reopen()
+        journal.intent('reply', 'a', message='hi')
+        journal.unknown('reply', 'a', error='ReadTimeout')
+        self.assertEqual([entry['key'] for entry in journal.unfinished('reply')], ['a'])
+        self.assertEqual(journal.get('reply', 'a')['message'], 'hi')
+
+    def test_compaction_caps_how_long_entries_are_kept(self):
+        journal = RequestJournal(self.path, SessionStore(self.session_path), retain=100, retain_unfinished=10)
+        now = time.time()
+        journal.intent('reply', 'stale-intent', ts=now - 20)
+        journal.intent('reply', 'stale-unknown', ts=now - 30)
+        journal.unknown('reply', 'stale-unknown', ts=now - 20)
+        journal.intent('reply', 'fresh-intent', ts=now - 5)
+        journal.done('reply', 'old-done', ts=now - 50)
+        journal.done('reply', 'expired-done', ts=now - 200)
+        journal.compact()
+        self.assertEqual(sorted(entry['key'] for entry in journal.entries()), ['fresh-intent', 'old-done'])
+
+
+if __name__ == '__main__':
+    unittest.main()
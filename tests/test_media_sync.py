@@ -0,0 +1,80 @@
+import os
+import tempfile
+import threading
+import unittest
+
+from media_sync import MediaSync, SyncStore
+from models import Comment, Media
+from pagination import parse_timestamp
+
+
+class FakeAPI:
+    instagram_account_id = '1789'
+
+    def __init__(self):
+        self.comments = []
+        self.since = []
+
+    def iter_media(self):
+        yield Media.from_graph({'id': 'm1', 'timestamp': '2024-01-01T12:00:00+0000',
+                                'comments_count': len(self.comments)})
+
+    def iter_comments(self, media_id, since=None):
+        self.since.append(since)
+        return [c for c in self.comments if since is None or c.timestamp >= since]
+
+    def comment(self, n: int, timestamp: str):
+        self.comments.append(Comment.from_graph({'id': f"c{n}", 'text': 'hi', 'username': 'fan',
+                                                 'timestamp': timestamp}, 'm1'))
+
+
+class IncrementalCommentsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'instabot.sqlite')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_only_comments_since_the_newest_stored_are_fetched(self):
+        api, store = FakeAPI(), SyncStore(self.path)
+        api.comment(1, '2024-01-02T10:00:00+0000')
+        api.comment(2, '2024-01-02T11:00:00+0000')
+        self.assertEqual(MediaSync(api, store).sync()['comments_added'], 2)
+
+        api.comment(3, '2024-01-03T09:00:00+0000')
+        self.assertEqual(MediaSync(api, store).sync()['comments_added'], 1)
+        self.assertEqual(api.since, [None, parse_timestamp('2024-01-02T11:00:00+0000')])
+        self.assertEqual(store.comments_high_water('m1'), '2024-01-03T09:00:00+0000')
+        store.close()
+
+    def test_reads_while_another_thread_syncs(self):
+        api, store = FakeAPI(), SyncStore(self.path)
+        for n in range(200):
+            api.comment(n, f"2024-01-02T{n // 60:02d}:{n % 60:02d}:00+0000")
+        errors, done = [], threading.Event()
+
+        def read():
+            while not done.is_set():
+                try:
+                    MediaSync(api, store).new_since_last_run()
+                    store.comments_high_water('m1')
+                except Exception as exc:
+                    errors.append(exc)
+
+        readers = [threading.Thread(target=read) for _ in range(3)]
+        for reader in readers:
+            reader.start()
+        for n in range(5):
+            api.comment(200 + n, f"2024-01-03T00:0{n}:00+0000")
+            MediaSync(api, store).sync()
+        done.set()
+        for reader in readers:
+            reader.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(MediaSync(api, store).new_since_last_run()['comments']), 1)
+        store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
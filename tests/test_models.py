@@ -0,0 +1,105 @@
+import unittest
+from datetime import datetime, timedelta
+
+from instagram_api import InstagramAPI
+from models import Comment, Media, MediaHydrator
+from stub_graph_server import StubGraphServer
+from transport import GraphTransport
+
+
+class FakeAPI:
+    """get_objects that fails the first `failures` calls and never knows ids in `missing`"""
+
+    def __init__(self, failures=0, missing=()):
+        self.failures = failures
+        self.missing = set(missing)
+        self.calls = []
+
+    def get_objects(self, ids, fields):
+        self.calls.append(list(ids))
+        if self.failures:
+            self.failures -= 1
+            return None
+        return {i: {'id': i, 'caption': f"caption {i}", 'media_type': 'IMAGE'} for i in ids if i not in self.missing}
+
+
+class MediaHydratorTest(unittest.TestCase):
+    def test_failed_lookup_leaves_fields_unset_and_retries(self):
+        api = FakeAPI(failures=1)
+        media = MediaHydrator(api).wrap([{'id': '1'}, {'id': '2'}])
+        self.assertIsNone(media[0].caption)
+        self.assertFalse(media[0].has('caption'))
+        self.assertFalse(media[1].has('caption'))
+
+        self.assertEqual(media[1].caption, 'caption 2')
+        self.assertEqual(media[0].caption, 'caption 1')
+        self.assertIsNone(media[0].thumbnail_url)
+        self.assertEqual(len(api.calls), 2)
+
+    def test_ids_missing_from_the_response_are_recorded_as_none(self):
+        api = FakeAPI(missing={'2'})
+        media = MediaHydrator(api).wrap([{'id': '1'}, {'id': '2', 'timestamp': '2024-01-01T12:00:00+0000'}])
+        self.assertEqual(media[0].caption, 'caption 1')
+        self.assertTrue(media[0].is_hydrated)
+        self.assertTrue(media[1].has('caption'))
+        self.assertIsNone(media[1].caption)
+        self.assertIsNone(media[1].permalink)
+        self.assertIsNotNone(media[1].timestamp)
+        self.assertEqual(len(api.calls), 1)
+
+    def test_media_without_an_id_is_not_looked_up(self):
+        api = FakeAPI()
+        media = MediaHydrator(api).wrap([{'caption': 'no id'}, {'id': '1'}])
+        self.assertIsNone(media[0].id)
+        self.assertIsNone(media[0].permalink)
+        self.assertEqual(media[1].caption, 'caption 1')
+        self.assertEqual(api.calls, [['1']])
+
+
+class RecordsTest(unittest.TestCase):
+    def setUp(self):
+        self.server = StubGraphServer(media_count=3).start()
+        self.transport = GraphTransport()
+        self.api = InstagramAPI('token', '1789', transport=self.transport, base_url=self.server.url)
+
+    def tearDown(self):
+        self.transport.close()
+        self.server.stop()
+
+    def test_media_and_comments_come_back_as_records(self):
+        media = self.api.get_media(limit=3)
+        self.assertEqual(len(media), 3)
+        self.assertIsInstance(media[0], Media)
+        self.assertEqual(media[0]['id'], media[0].id)
+
+        comments = self.api.get_comments(media[0].id)
+        self.assertTrue(comments)
+        self.assertIsInstance(comments[0], Comment)
+        self.assertIsInstance(comments[0].timestamp, datetime)
+        self.assertEqual(comments[0].media_id, media[0].id)
+
+    def test_paged_and_batched_reads_come_back_as_records(self):
+        media = list(self.api.iter_media(page_size=2))
+        self.assertEqual(len(media), 3)
+        self.assertTrue(all(isinstance(m, Media) for m in media))
+        # The stub lists media oldest first, so a bound after the first post ends the walk there
+        since = media[0].timestamp.replace(tzinfo=None)
+        self.assertEqual(len(list(self.api.iter_media(page_size=2, since=since))), 3)
+        self.assertEqual(list(self.api.iter_media(page_size=2, since=since + timedelta(hours=1))), [])
+
+        comments = list(self.api.iter_comments(media[0].id))
+        self.assertTrue(all(isinstance(c, Comment) and c.media_id == media[0].id for c in comments))
+        self.assertEqual(comments[0]['text'], comments[0].text)
+
+        batched = self.api.get_comments_batch([m.id for m in media])
+        self.assertEqual([c.id for c in batched[media[0].id]], [c.id for c in comments])
+
+    def test_lazy_media_is_queued_for_hydration(self):
+        media = self.api.get_lazy_media(limit=3)
+        self.assertFalse(media[0].is_hydrated)
+        self.assertIsNotNone(media[0].caption)
+        self.assertTrue(all(m.is_hydrated for m in media))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,21 @@
+import unittest
+from datetime import datetime
+
+from pagination import iter_items
+
+
+PAGES = [[{'id': '3', 'timestamp': '2024-01-03T12:00:00+0000'},
+          {'id': '2', 'timestamp': '2024-01-02T12:00:00+0000'}],
+         [{'id': '1', 'timestamp': '2024-01-01T12:00:00+0000'}]]
+
+
+class IterItemsTest(unittest.TestCase):
+    def test_naive_since_is_taken_as_utc(self):
+        since = datetime(2024, 1, 2, 12)
+        self.assertEqual([item['id'] for item in iter_items(iter(PAGES), since=since)], ['3', '2'])
+        self.assertEqual([item['id'] for item in iter_items(iter(PAGES), since=since, newest_first=False)],
+                         ['3', '2'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from instagram_api import InstagramAPI
+from journal import RequestJournal
+from publisher import CONTAINER_TTL, FAILED, PENDING, PROCESSING, PUBLISHED, Publisher, ScheduleQueue
+from session_store import SessionStore
+from stub_graph_server import StubGraphServer
+
+
+class PublisherTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.server = StubGraphServer(video_processing=0).start()
+        self.api = InstagramAPI('token', '1789', base_url=self.server.url)
+        self.queue = ScheduleQueue(os.path.join(self.tmp.name, 'instabot.sqlite'))
+        self.journal = RequestJournal(os.path.join(self.tmp.name, 'requests.jsonl'),
+                                      SessionStore(os.path.join(self.tmp.name, 'session.json')))
+        self.publisher = None
+
+    def tearDown(self):
+        if self.publisher:
+            self.publisher.stop()
+        self.journal.close()
+        self.queue.close()
+        self.server.stop()
+        self.tmp.cleanup()
+
+    def start(self) -> Publisher:
+        self.publisher = Publisher(self.api, self.queue, journal=self.journal, image_delay=0.05,
+                                   video_delay=0.05).start()
+        return self.publisher
+
+    def wait_for(self, post_id: int, state: str, timeout: float = 5.0):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            post = self.queue.get(post_id)
+            if post.state == state:
+                return post
+            time.sleep(0.02)
+        self.fail(f"post {post_id} stayed {self.queue.get(post_id).state}")
+
+
+class ContainerExpiryTest(PublisherTestCase):
+    def test_expired_journaled_container_is_created_again(self):
+        post_id = self.queue.add('1789', [{'image_url': 'https://cdn.example/a.jpg'}], 'hi', time.time())
+        key = Publisher._key(self.queue.get(post_id), '0')
+        self.journal.done('create_media', key, container_id='1789c-stale', created_at=time.time() - CONTAINER_TTL - 60)
+        self.start()
+        post = self.wait_for(post_id, PUBLISHED)
+        self.assertNotEqual(post.container_id, '1789c-stale')
+        self.assertGreater(self.journal.completed('create_media', key)['created_at'], time.time() - 60)
+
+    def test_restart_recreates_in_flight_post_with_expired_container(self):
+        post_id = self.queue.add('1789', [{'image_url': 'https://cdn.example/a.jpg'}], 'hi', time.time())
+        post = self.queue.get(post_id)
+        post.state, post.container_id = PROCESSING, '1789c-stale'
+        self.queue.update(post)
+        self.journal.done('create_media', Publisher._key(post, '0'), container_id='1789c-stale',
+                          created_at=time.time() - CONTAINER_TTL - 60)
+        publisher = Publisher(self.api, self.queue, journal=self.journal)
+        publisher._recover()
+        self.assertEqual(self.queue.get(post_id).state, PENDING)
+        publisher.stop()
+
+        self.start()
+        post = self.wait_for(post_id, PUBLISHED)
+        self.assertNotEqual(post.container_id, '1789c-stale')
+
+    def test_fresh_container_is_reused(self):
+        post_id = self.queue.add('1789', [{'image_url': 'https://cdn.example/a.jpg'}], 'hi', time.time())
+        container_id = self.api.create_media(image_url='https://cdn.example/a.jpg', caption='hi')
+        self.journal.done('create_media', Publisher._key(self.queue.get(post_id), '0'), container_id=container_id,
+                          created_at=time.time() - 3600)
+        self.start()
+        self.assertEqual(self.wait_for(post_id, PUBLISHED).container_id, container_id)
+
+
+class LoopTest(PublisherTestCase):
+    def test_status_checks_run_off_the_loop_thread(self):
+        threads = set()
+        get_status = self.api.get_container_status
+
+        def recording(container_id):
+            threads.add(threading.current_thread().name)
+            return get_status(container_id)
+
+        self.api.get_container_status = recording
+        publisher = self.start()
+        post_id = publisher.schedule([{'video_url': 'https://cdn.example/a.mp4'}], 'hi')
+        self.wait_for(post_id, PUBLISHED)
+        self.assertTrue(threads)
+        self.assertNotIn('publisher', threads)
+
+    def test_loop_survives_errors(self):
+        claim_due = self.queue.claim_due
+        calls = []
+
+        def flaky(*args):
+            calls.append(args)
+            if len(calls) == 1:
+                raise RuntimeError("database is locked")
+            return claim_due(*args)
+
+        self.queue.claim_due = flaky
+        publisher = self.start()
+        post_id = publisher.schedule([{'image_url': 'https://cdn.example/a.jpg'}], 'hi')
+        self.wait_for(post_id, PUBLISHED, timeout=10)
+
+    def test_missing_status_codes_are_reported(self):
+        self.api.get_objects = lambda ids, fields: {ids[0]: {'status_code': 'ERROR'}}
+        publisher = self.start()
+        post_id = publisher.schedule([{'image_url': 'https://cdn.example/a.jpg'},
+                                      {'image_url': 'https://cdn.example/b.jpg'}], 'hi')
+        self.assertEqual(self.wait_for(post_id, FAILED).error, 'container ERROR/None')
+
+
+class StatusCheckTest(PublisherTestCase):
+    def test_a_post_is_handed_on_once_and_stale_checks_are_ignored(self):
+        post_id = self.queue.add('1789', [{'image_url': 'https://cdn.example/a.jpg'}], 'hi', time.time())
+        post = self.queue.get(post_id)
+        post.state = PROCESSING
+        post.container_id = self.api.create_media(image_url='https://cdn.example/a.jpg', caption='hi')
+        publisher = Publisher(self.api, self.queue, journal=self.journal)
+        published = []
+        publisher._publish = published.append
+        publisher._watch(post)
+
+        entry = (time.time(), post_id, 1.0, time.time() + 60)
+        publisher._check_statuses([entry])
+        publisher._check_statuses([entry])
+        publisher._check_statuses([(time.time(), post_id + 1, 1.0, time.time() + 60)])
+        publisher.stop()
+        self.assertEqual(published, [post])
+        # Only the check _watch queued; neither skipped call re-queued one
+        self.assertEqual(len(publisher._checks), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import threading
+import unittest
+
+from rate_limit import READ, WRITE, RateLimitScheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class WritePriorityTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.release = threading.Event()
+        self.sleeps = []
+        self.scheduler = RateLimitScheduler(clock=self.clock, sleep=self.sleep)
+
+    def sleep(self, seconds):
+        self.sleeps.append((threading.current_thread().name, seconds))
+        if threading.current_thread().name == 'writer':
+            self.release.wait(5)
+            self.clock.now += seconds
+
+    def test_a_blocked_write_on_one_account_does_not_delay_reads_on_another(self):
+        self.scheduler.observe({}, status_code=429, account_id='A')
+        writer = threading.Thread(target=self.scheduler.acquire, args=('A', WRITE), name='writer')
+        writer.start()
+        while not self.sleeps:
+            self.release.wait(0.01)
+
+        for _ in range(5):
+            self.scheduler.acquire('B', READ)
+        self.assertEqual([name for name, _ in self.sleeps], ['writer'])
+        self.assertEqual(self.scheduler.accounts['A'].waiting_writes, 1)
+        self.assertGreater(self.scheduler._reserve('A', READ)[0], 0)
+
+        self.release.set()
+        writer.join(5)
+        self.assertFalse(writer.is_alive())
+        self.assertEqual((self.scheduler.app.waiting_writes, self.scheduler.accounts['A'].waiting_writes), (0, 0))
+
+    def test_a_write_waiting_on_the_app_bucket_goes_before_reads(self):
+        self.scheduler.app.bucket.tokens = 0
+        writer = threading.Thread(target=self.scheduler.acquire, args=('A', WRITE), name='writer')
+        writer.start()
+        while not self.sleeps:
+            self.release.wait(0.01)
+
+        self.assertEqual(self.scheduler.app.waiting_writes, 1)
+        self.scheduler.app.bucket.tokens = 5
+        wait, state = self.scheduler._reserve('B', READ)
+        self.assertGreater(wait, 0)
+        self.assertIs(state, self.scheduler.app)
+
+        self.release.set()
+        writer.join(5)
+        self.assertEqual(self.scheduler.app.waiting_writes, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import os
+import tempfile
+import unittest
+
+import requests
+
+from journal import FAILED, UNKNOWN, RequestJournal
+from models import Comment
+from reply_pipeline import ReplyPipeline
+from session_store import SessionStore
+
+
+class FakeAPI:
+    """Replies to comments in memory; comment ids in `raise_for` fail with an exception"""
+
+    instagram_account_id = '1789'
+
+    def __init__(self, raise_for=(), posted_anyway=()):
+        self.raise_for = set(raise_for)
+        self.posted_anyway = set(posted_anyway)
+        self.replies = {}
+        self.calls = []
+
+    def reply_to_comment(self, comment_id, message):
+        self.calls.append(comment_id)
+        if comment_id in self.raise_for:
+            self.raise_for.discard(comment_id)
+            if comment_id in self.posted_anyway:
+                self.replies[comment_id] = [Comment(f"r-{comment_id}", message, 'me')]
+            raise requests.ReadTimeout("read timed out")
+        if comment_id == 'rejected':
+            return None
+        self.replies[comment_id] = [Comment(f"r-{comment_id}", message, 'me')]
+        return f"r-{comment_id}"
+
+    def get_replies(self, comment_id):
+        return self.replies.get(comment_id, [])
+
+
+class ReplySendTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'requests.jsonl')
+        self.store = SessionStore(os.path.join(self.tmp.name, 'session.json'))
+        self.journal = RequestJournal(self.path, self.store)
+
+    def tearDown(self):
+        self.journal.close()
+        self.tmp.cleanup()
+
+    def run_pipeline(self, api, comment_ids=()):
+        pipeline = ReplyPipeline(api, lambda comment: f"Thanks {comment.id}!", journal=self.journal,
+                                 writes_per_second=1000, burst=1000, own_username='me').start()
+        for comment_id in comment_ids:
+            pipeline.submit(Comment(comment_id, 'nice', 'fan', None, 0, 'm1'))
+        pipeline.stop()
+        return pipeline
+
+    def test_send_errors_are_journaled_and_the_stage_keeps_going(self):
+        api = FakeAPI(raise_for={'b'})
+        pipeline = self.run_pipeline(api, ['a', 'b', 'rejected', 'c'])
+        self.assertEqual(sorted(api.calls), ['a', 'b', 'c', 'rejected'])
+        self.assertEqual(pipeline.stats['sent'], 2)
+        self.assertEqual(pipeline.stats['failed'], 2)
+        self.assertEqual(self.journal.get('reply', 'b')['state'], UNKNOWN)
+        self.assertEqual(self.journal.get('reply', 'rejected')['state'], FAILED)
+
+    def test_unknown_replies_are_verified_before_resending(self):
+        api = FakeAPI(raise_for={'posted', 'lost'}, posted_anyway={'posted'})
+        self.run_pipeline(api, ['posted', 'lost'])
+
+        # Restart: 'posted' went through despite the error, 'lost' did not
+        pipeline = self.run_pipeline(api)
+        self.assertEqual(pipeline.stats['resumed'], 1)
+        self.assertEqual(sorted(api.calls), ['lost', 'lost', 'posted'])
+        self.assertIsNotNone(self.journal.completed('reply', 'posted'))
+        self.assertEqual(self.journal.completed('reply', 'lost')['reply_id'], 'r-lost')
+
+    def test_dedup_memory_is_bounded_and_the_journal_catches_older_repeats(self):
+        api = FakeAPI()
+        pipeline = ReplyPipeline(api, lambda comment: f"Thanks {comment.id}!", journal=self.journal,
+                                 writes_per_second=1000, burst=1000, seen_size=2).start()
+        for comment_id in ['a', 'b', 'c', 'a', 'c']:
+            pipeline.submit(Comment(comment_id, 'nice', 'fan', None, 0, 'm1'))
+        pipeline.stop()
+
+        self.assertEqual(sorted(api.calls), ['a', 'b', 'c'])
+        self.assertEqual(pipeline.stats['duplicates'], 2)
+        self.assertLessEqual(len(pipeline._seen), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+import requests
+
+from response_cache import ResponseCache
+
+GRAPH = 'https://graph.facebook.com/v18.0'
+
+
+def response(body) -> requests.Response:
+    resp = requests.Response()
+    resp.status_code = 200
+    resp._content = json.dumps(body).encode()
+    resp.headers['Content-Type'] = 'application/json'
+    return resp
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'cache.sqlite')
+        self.cache = ResponseCache(self.path)
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmp.cleanup()
+
+    def test_page_tokens_are_never_stored(self):
+        accounts = {'data': [{'id': '1', 'name': 'Page', 'access_token': 'EAAB-page'}]}
+        self.assertIsNone(self.cache.fetch('GET', f"{GRAPH}/me/accounts", {'access_token': 'u'},
+                                           lambda headers: response(accounts)))
+
+        params = {'access_token': 'u', 'fields': 'id,accounts{access_token}'}
+        for _ in range(2):
+            self.cache.fetch('GET', f"{GRAPH}/me", params, lambda headers: response({'id': '2', **accounts}))
+        self.assertEqual(self.cache.stats()['misses'], 2)
+        self.assertEqual(self.cache.db.execute("SELECT COUNT(*) FROM responses").fetchone()[0], 0)
+
+        self.cache.fetch('GET', f"{GRAPH}/me", {'access_token': 'u'}, lambda headers: response({'id': '2'}))
+        self.cache.fetch('GET', f"{GRAPH}/me", {'access_token': 'u'}, lambda headers: response({'id': '2'}))
+        self.assertEqual(self.cache.stats()['hits'], 1)
+
+    def test_stored_token_bodies_are_dropped_on_open(self):
+        self.cache.put('old', response({'data': [{'access_token': 'EAAB-page'}]}), 3600)
+        self.cache.put('plain', response({'id': '2'}), 3600)
+        self.cache.close()
+        self.cache = ResponseCache(self.path)
+        self.assertEqual([row[0] for row in self.cache.db.execute("SELECT key FROM responses")], ['plain'])
+
+    def test_counters_are_exact_under_concurrency(self):
+        url, params = f"{GRAPH}/me", {'access_token': 'u'}
+        self.cache.fetch('GET', url, params, lambda headers: response({'id': '2'}))
+
+        def read():
+            for _ in range(500):
+                self.cache.fetch('GET', url, params, lambda headers: response({'id': '2'}))
+
+        threads = [threading.Thread(target=read) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.cache.stats()['hits'], 4000)
+
+
+if __name__ == '__main__':
+    unittest.main()
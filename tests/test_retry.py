@@ -0,0 +1,90 @@
+import unittest
+
+import requests
+
+from retry import CircuitOpenError, RetryPolicy
+
+URL = 'https://graph.facebook.com/v18.0/1789/media'
+
+
+def response(status_code: int, body: str = '{}', headers=None) -> requests.Response:
+    resp = requests.Response()
+    resp.status_code = status_code
+    resp._content = body.encode()
+    resp.headers.update(headers or {})
+    return resp
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class RetryPolicyTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.sleeps = []
+        self.policy = RetryPolicy(max_retries=3, base_delay=1.0, max_delay=5.0, failure_threshold=5,
+                                  reset_timeout=30.0, clock=self.clock, sleep=self.sleeps.append)
+
+    def sender(self, *results):
+        results = list(results)
+
+        def send():
+            result = results.pop(0)
+            if isinstance(result, BaseException):
+                raise result
+            return result
+        return send
+
+    def test_transient_reads_back_off_exponentially(self):
+        send = self.sender(response(503), response(503), response(503), response(200))
+        self.assertEqual(self.policy.call(send, 'GET', URL, idempotent=True).status_code, 200)
+        self.assertEqual(len(self.sleeps), 3)
+        for attempt, delay in enumerate(self.sleeps):
+            self.assertLessEqual(delay, min(5.0, 2 ** attempt))
+        self.assertEqual(self.policy.stats.snapshot()['GET /{id}/media']['retries'], 3)
+
+    def test_retry_after_is_honoured_and_writes_are_not_retried_on_5xx(self):
+        send = self.sender(response(429, headers={'Retry-After': '3'}), response(200))
+        self.policy.call(send, 'POST', URL, idempotent=False)
+        self.assertEqual(self.sleeps, [3.0])
+
+        send = self.sender(response(500), response(200))
+        self.assertEqual(self.policy.call(send, 'POST', URL, idempotent=False).status_code, 500)
+        self.assertEqual(self.sleeps, [3.0])
+
+    def test_breaker_opens_then_half_opens_then_closes(self):
+        policy = RetryPolicy(max_retries=0, failure_threshold=2, reset_timeout=30.0,
+                             clock=self.clock, sleep=self.sleeps.append)
+        for _ in range(2):
+            with self.assertRaises(requests.ConnectionError):
+                policy.call(self.sender(requests.ConnectionError()), 'GET', URL, idempotent=True)
+        breaker = policy.breaker('GET /{id}/media')
+        self.assertEqual(breaker.state, 'open')
+        with self.assertRaises(CircuitOpenError):
+            policy.call(self.sender(response(200)), 'GET', URL, idempotent=True)
+
+        self.clock.now += 30
+        self.assertEqual(breaker.state, 'half-open')
+        self.assertEqual(policy.call(self.sender(response(200)), 'GET', URL, idempotent=True).status_code, 200)
+        self.assertEqual(breaker.state, 'closed')
+
+    def test_a_trial_that_raises_something_else_frees_the_breaker(self):
+        policy = RetryPolicy(max_retries=0, failure_threshold=1, reset_timeout=30.0,
+                             clock=self.clock, sleep=self.sleeps.append)
+        with self.assertRaises(requests.ConnectionError):
+            policy.call(self.sender(requests.ConnectionError()), 'GET', URL, idempotent=True)
+        self.clock.now += 30
+        with self.assertRaises(ValueError):
+            policy.call(self.sender(ValueError("bad JSON")), 'GET', URL, idempotent=True)
+
+        self.assertFalse(policy.breaker('GET /{id}/media').trial_in_flight)
+        self.assertEqual(policy.call(self.sender(response(200)), 'GET', URL, idempotent=True).status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import asyncio
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+
+from main import Scheduler, reply_job
+
+
+class SchedulerTest(unittest.TestCase):
+    def test_thread_jobs_do_not_overlap_and_shutdown_waits_for_them(self):
+        running, finished, overlapped = [], [], []
+        lock = threading.Lock()
+
+        def slow(state):
+            with lock:
+                if running:
+                    overlapped.append(True)
+                running.append(True)
+            time.sleep(0.3)
+            with lock:
+                running.pop()
+            finished.append(time.monotonic())
+
+        async def scenario():
+            scheduler = Scheduler(state=None)
+            job = scheduler.add('slow', 0.05, slow, jitter=0)
+            runner = asyncio.create_task(scheduler.run())
+            await asyncio.sleep(0.4)
+            # Cancelling the job's task does not stop its thread, so ticks keep skipping
+            job.task.cancel()
+            await asyncio.sleep(0.1)
+            self.assertTrue(job.running)
+            scheduler.stop()
+            await runner
+            await scheduler.shutdown(timeout=0.01)
+            return job, time.monotonic()
+
+        job, shut_down_at = asyncio.run(scenario())
+        self.assertEqual(overlapped, [])
+        self.assertGreater(job.overlaps, 0)
+        self.assertFalse(job.running)
+        self.assertLessEqual(finished[-1], shut_down_at)
+
+    def test_thread_jobs_cannot_have_timeouts(self):
+        async def scenario():
+            scheduler = Scheduler(state=None)
+            with self.assertRaises(ValueError):
+                scheduler.add('sync', 60, lambda state: None, timeout=10)
+
+            async def coroutine_job(state):
+                await asyncio.sleep(1)
+
+            job = scheduler.add('fetch', 0.01, coroutine_job, jitter=0, timeout=0.05)
+            runner = asyncio.create_task(scheduler.run())
+            await asyncio.sleep(0.2)
+            scheduler.stop()
+            await runner
+            await scheduler.shutdown()
+            return job
+
+        job = asyncio.run(scenario())
+        self.assertGreater(job.failures, 0)
+
+
+class FakeSyncStore:
+    def __init__(self):
+        self.run_id = None
+        self.reads = 0
+
+    def last_run(self, account_id):
+        return self.run_id
+
+    def new_comments(self, run_id):
+        self.reads += 1
+        return [{'id': f"c{run_id}", 'text': 'nice', 'username': 'fan', 'like_count': None, 'media_id': 'm1'}]
+
+
+class ReplyJobTest(unittest.TestCase):
+    def test_each_sync_run_is_handed_to_the_pipeline_once(self):
+        submitted = []
+        store = FakeSyncStore()
+        state = SimpleNamespace(sync_store=store, replied_runs={},
+                                pipelines={'1789': SimpleNamespace(submit=submitted.append)})
+        reply_job(state)
+        store.run_id = 1
+        reply_job(state)
+        reply_job(state)
+        store.run_id = 2
+        reply_job(state)
+        self.assertEqual([comment.id for comment in submitted], ['c1', 'c2'])
+        self.assertEqual(store.reads, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
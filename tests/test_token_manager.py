@@ -0,0 +1,54 @@
+import os
+import tempfile
+import unittest
+
+from account_pool import AccountWorkerPool
+from models import Account
+from session_store import SessionStore
+from token_manager import TokenManager
+
+
+class FakeAuth:
+    long_lived_token = None
+
+    def __init__(self):
+        self.generation = 0
+
+    def get_user_instagram_accounts(self):
+        self.generation += 1
+        return [Account('p1', 'Page', f"page-token-{self.generation}", '1789')]
+
+
+class RefreshCallbackTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.tokens = TokenManager(FakeAuth(), SessionStore(os.path.join(self.tmp.name, 'session.json')))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_refreshed_page_tokens_reach_existing_apis(self):
+        self.tokens.refresh_accounts()
+        pool = AccountWorkerPool(self.tokens.accounts(), lambda api, account: api.access_token, max_workers=1)
+        self.tokens.on_refresh(pool.update_accounts)
+
+        self.tokens.refresh_accounts()
+        self.assertEqual(pool.apis['1789'].access_token, 'page-token-2')
+        self.assertEqual([result.value for result in pool.run()], ['page-token-2'])
+        pool.shutdown()
+
+    def test_failing_callback_does_not_stop_the_others(self):
+        seen = []
+
+        def broken(accounts):
+            raise RuntimeError("boom")
+
+        self.tokens.on_refresh(broken)
+        self.tokens.on_refresh(lambda accounts: seen.append(accounts[0].page_token))
+        self.tokens.refresh_accounts()
+        self.assertEqual(seen, ['page-token-1'])
+        self.assertEqual(self.tokens.page_token('1789'), 'page-token-1')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import json
+import os
+import queue
+import tempfile
+import unittest
+
+import requests
+
+from journal import RequestJournal
+from main import EventRouter
+from reply_pipeline import ReplyPipeline
+from session_store import SessionStore
+from webhook import WebhookServer, sign
+
+
+def notification(*comment_ids):
+    return {'object': 'instagram', 'entry': [{'id': '1789', 'changes': [
+        {'field': 'comments', 'value': {'id': comment_id, 'text': 'nice', 'media': {'id': 'm1'}}}
+        for comment_id in comment_ids
+    ]}]}
+
+
+class EnqueueTest(unittest.TestCase):
+    def setUp(self):
+        self.server = WebhookServer('secret', 'verify', port=0, host='127.0.0.1', events=queue.Queue(maxsize=4))
+
+    def tearDown(self):
+        self.server.server_close()
+
+    def test_a_notification_that_does_not_fit_is_not_queued_at_all(self):
+        self.assertTrue(self.server.enqueue(notification('a', 'b')))
+        self.assertFalse(self.server.enqueue(notification('c', 'd', 'e')))
+        self.assertEqual(self.server.events.qsize(), 2)
+
+        # Meta redelivers it once there is room; nothing is queued twice
+        self.server.events.get()
+        self.server.events.get()
+        self.assertTrue(self.server.enqueue(notification('c', 'd', 'e')))
+        self.assertEqual([self.server.events.get().comment_id for _ in range(3)], ['c', 'd', 'e'])
+        self.assertEqual(self.server.stats['queued'], 5)
+        self.assertEqual(self.server.stats['dropped'], 3)
+
+
+class FakeAPI:
+    instagram_account_id = '1789'
+
+    def __init__(self):
+        self.replies = {}
+
+    def reply_to_comment(self, comment_id, message):
+        self.replies[comment_id] = message
+        return f"r-{comment_id}"
+
+    def get_replies(self, comment_id):
+        return []
+
+
+class WebhookToPipelineTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.journal = RequestJournal(os.path.join(self.tmp.name, 'requests.jsonl'),
+                                      SessionStore(os.path.join(self.tmp.name, 'session.json')))
+
+    def tearDown(self):
+        self.journal.close()
+        self.tmp.cleanup()
+
+    def test_posted_comments_reach_the_accounts_reply_pipeline(self):
+        api = FakeAPI()
+        pipeline = ReplyPipeline(api, lambda comment: f"Thanks for '{comment.text}'", journal=self.journal,
+                                 writes_per_second=1000, burst=1000).start()
+        server = WebhookServer('secret', 'verify', port=0, host='127.0.0.1').start()
+        router = EventRouter(server.events, {'1789': pipeline}).start()
+        try:
+            other_account = notification('c')
+            other_account['entry'][0]['id'] = '555'
+            for body in (notification('a', 'b'), other_account):
+                body = json.dumps(body).encode()
+                response = requests.post(server.url, data=body,
+                                         headers={'X-Hub-Signature-256': sign('secret', body)})
+                self.assertEqual(response.status_code, 200)
+        finally:
+            server.stop()
+            router.stop()
+            pipeline.stop()
+
+        self.assertEqual(api.replies, {'a': "Thanks for 'nice'", 'b': "Thanks for 'nice'"})
+        self.assertEqual(router.stats, {'routed': 2, 'unrouted': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
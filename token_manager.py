@@ -0,0 +1,150 @@
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from models import Account
+from session_store import SessionStore
+from test2 import InstagramAuth
+
+DAY = 24 * 3600
+
+
+class TokenManager:
+    """Keeps the long-lived user token and page tokens fresh and persisted.
+
+    Tokens, their expiry and the last debug_token result live in the
+    "tokens" section of session.json, so token info is only re-checked
+    every `check_interval` seconds instead of on every run. A background
+    thread swaps in a new long-lived token `refresh_margin` seconds before
+    the current one expires. Page tokens are published as an immutable
+    snapshot that worker threads read without taking a lock; callbacks
+    registered with on_refresh() get each new snapshot, so long-lived
+    InstagramAPI objects can switch to the new page tokens.
+    """
+
+    def __init__(self, auth: InstagramAuth, store: Optional[SessionStore] = None,
+                 refresh_margin: float = 7 * DAY, check_interval: float = DAY):
+        self.auth = auth
+        self.store = store or SessionStore.shared()
+        self.refresh_margin = refresh_margin
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._listeners: List[Callable[[List[Account]], None]] = []
+
+        state = self.store.get('tokens', {}) or {}
+        self._user = state.get('user', {})
+        self._pages: Dict[str, Dict] = state.get('pages', {})
+        if self._user.get('token'):
+            self.auth.long_lived_token = self._user['token']
+
+    @property
+    def user_token(self) -> Optional[str]:
+        return self._user.get('token')
+
+    @property
+    def expires_at(self) -> int:
+        """Unix expiry of the user token; 0 means it does not expire"""
+        return self._user.get('expires_at') or 0
+
+    def set_user_token(self, token: str, expires_at: Optional[int] = None):
+        """Adopt a token obtained elsewhere (e.g. from run_auth_flow or .env)"""
+        with self._lock:
+            if token != self._user.get('token'):
+                self._user = {'token': token, 'expires_at': expires_at, 'checked_at': 0, 'info': None}
+                self.auth.long_lived_token = token
+                self._save()
+
+    def token_info(self, force: bool = False) -> Optional[Dict]:
+        """debug_token data for the user token, re-checked at most every check_interval"""
+        with self._lock:
+            fresh = time.time() - (self._user.get('checked_at') or 0) < self.check_interval
+            if fresh and self._user.get('info') and not force:
+                return self._user['info']
+
+            info = self.auth.get_token_info(self.user_token)
+            if not info:
+                return self._user.get('info')
+            data = info.get('data', {})
+            self._user = dict(self._user, info=info, checked_at=time.time(),
+                              expires_at=data.get('expires_at', self._user.get('expires_at')))
+            self._save()
+            return info
+
+    def page_token(self, instagram_account_id: str) -> Optional[str]:
+        """Page token for an Instagram account id (lock-free read)"""
+        page = self._pages.get(instagram_account_id)
+        return page['page_token'] if page else None
+
+    def accounts(self) -> List[Account]:
+        """Known accounts, as returned by get_user_instagram_accounts"""
+        return [Account.from_dict(page) for page in self._pages.values()]
+
+    def on_refresh(self, callback: Callable[[List[Account]], None]):
+        """Call callback(accounts) whenever a new page-token snapshot is published"""
+        self._listeners.append(callback)
+
+    def refresh_accounts(self):
+        """Re-discover linked accounts and publish a new page-token snapshot"""
+        accounts = self.auth.get_user_instagram_accounts()
+        if accounts is None:
+            return
+        pages = {account.instagram_account_id: account.to_dict() for account in accounts}
+        with self._lock:
+            # Rebinding the attribute is atomic; readers see the old or new dict, never a mix
+            self._pages = pages
+            self._save()
+        for callback in list(self._listeners):
+            try:
+                callback(self.accounts())
+            except Exception as exc:
+                print(f"Error applying refreshed page tokens: {exc}")
+
+    def needs_refresh(self) -> bool:
+        return bool(self.expires_at) and self.expires_at - time.time() < self.refresh_margin
+
+    def refresh(self) -> bool:
+        """Exchange the current long-lived token for a new one"""
+        if not self.user_token:
+            raise ValueError("No user token to refresh.")
+
+        self.auth.access_token = self.user_token
+        token = self.auth.exchange_for_long_lived_token()
+        if not token:
+            return False
+        with self._lock:
+            self._user = {'token': token, 'expires_at': self.auth.long_lived_expires_at,
+                          'checked_at': 0, 'info': None}
+            self._save()
+        print(f"Refreshed long-lived token; expires at "
+              f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.expires_at or 0))}")
+        # Page tokens derived from a new user token replace the old ones
+        self.refresh_accounts()
+        return True
+
+    def start(self, poll_interval: float = 3600):
+        """Refresh in the background whenever the token gets close to expiry"""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(poll_interval,), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self, poll_interval: float):
+        while not self._stop.is_set():
+            try:
+                if self.needs_refresh():
+                    self.refresh()
+            except Exception as exc:
+                print(f"Error refreshing token: {exc}")
+            self._stop.wait(poll_interval)
+
+    def _save(self):
+        self.store.set('tokens', {'user': self._user, 'pages': self._pages})
@@ -0,0 +1,150 @@
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from rate_limit import READ, WRITE, RateLimitScheduler
+from response_cache import ResponseCache
+from retry import RetryPolicy
+
+GRAPH_URL = "https://graph.facebook.com"
+GRAPH_VERSION = "v18.0"
+BASE_URL = f"{GRAPH_URL}/{GRAPH_VERSION}"
+
+
+class GraphTransport:
+    """Pooled, keep-alive HTTP transport shared by every Graph API caller"""
+
+    def __init__(self, pool_connections: int = 4, pool_maxsize: int = 32,
+                 connect_timeout: float = 5.0, read_timeout: float = 30.0,
+                 pool_block: bool = True, scheduler: Optional[RateLimitScheduler] = None,
+                 retry_policy: Optional[RetryPolicy] = None, retries: bool = True,
+                 cache: Optional[ResponseCache] = None, hooks: Optional[List[Callable]] = None):
+        self.timeout = (connect_timeout, read_timeout)
+        self.pool_maxsize = pool_maxsize
+        self.scheduler = scheduler
+        self.retry_policy = retry_policy or (RetryPolicy() if retries else None)
+        self.cache = cache
+        self.hooks: List[Callable] = list(hooks or [])
+
+        # One adapter holds one urllib3 pool per host, so every call to
+        # graph.facebook.com reuses an already-open TLS connection.
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block,
+            max_retries=0
+        )
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'Accept-Encoding': 'gzip, deflate',
+            'Connection': 'keep-alive'
+        })
+
+    def request(self, method: str, url: str, params: Optional[Dict] = None,
+                data: Optional[Dict] = None, account_id: Optional[str] = None,
+                kind: Optional[str] = None, **kwargs) -> requests.Response:
+        """Send a request through the shared connection pool.
+
+        account_id and kind (READ/WRITE, inferred from the method when not
+        given) let the rate-limit scheduler pace the call; READ calls are
+        treated as idempotent by the retry policy. Cacheable GETs are served
+        from the response cache when one is configured.
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        kind = kind or (READ if method.upper() == 'GET' else WRITE)
+
+        def send(extra_headers=None):
+            call_kwargs = kwargs
+            if extra_headers:
+                call_kwargs = dict(kwargs, headers={**kwargs.get('headers', {}), **extra_headers})
+
+            def attempt():
+                return self._send(method, url, params, data, account_id, kind, **call_kwargs)
+
+            if self.retry_policy is None:
+                return attempt()
+            return self.retry_policy.call(attempt, method, url, idempotent=(kind == READ))
+
+        if self.cache is not None:
+            response = self.cache.fetch(method, url, params, send)
+            if response is not None:
+                return response
+        return send()
+
+    def add_hook(self, hook: Callable):
+        """Call hook(method, url, params, data, response, elapsed) after every request sent on the wire.
+
+        response is None when the request raised (connection error, timeout).
+        """
+        self.hooks.append(hook)
+
+    def _send(self, method, url, params, data, account_id, kind, **kwargs) -> requests.Response:
+        if self.scheduler is not None:
+            self.scheduler.acquire(account_id, kind)
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, url, params=params, data=data, **kwargs)
+        except requests.RequestException:
+            self._run_hooks(method, url, params, data, None, time.perf_counter() - start)
+            raise
+        elapsed = time.perf_counter() - start
+
+        if self.scheduler is not None:
+            self.scheduler.observe(
+                response.headers,
+                response.status_code,
+                response.text if response.status_code != 200 else None,
+                account_id=account_id
+            )
+        self._run_hooks(method, url, params, data, response, elapsed)
+        return response
+
+    def _run_hooks(self, method, url, params, data, response, elapsed):
+        for hook in self.hooks:
+            try:
+                hook(method, url, params, data, response, elapsed)
+            except Exception as exc:
+                print(f"Error in transport hook: {exc}")
+
+    def get(self, url: str, params: Optional[Dict] = None, **kwargs) -> requests.Response:
+        return self.request('GET', url, params=params, **kwargs)
+
+    def post(self, url: str, params: Optional[Dict] = None, data: Optional[Dict] = None,
+             **kwargs) -> requests.Response:
+        return self.request('POST', url, params=params, data=data, **kwargs)
+
+    def close(self):
+        """Close all pooled connections"""
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_default_transport = None
+_default_lock = threading.Lock()
+
+
+def get_default_transport() -> GraphTransport:
+    """Return the process-wide transport, creating it on first use"""
+    global _default_transport
+    if _default_transport is None:
+        with _default_lock:
+            if _default_transport is None:
+                _default_transport = GraphTransport()
+    return _default_transport
+
+
+def set_default_transport(transport: GraphTransport):
+    """Replace the process-wide transport (e.g. to change pool size or timeouts)"""
+    global _default_transport
+    with _default_lock:
+        _default_transport = transport
@@ -0,0 +1,176 @@
+import hashlib
+import hmac
+import http.server
+import json
+import queue
+import threading
+import time
+import urllib.parse
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional
+
+# Largest notification body we accept; Meta batches are far smaller
+MAX_BODY_BYTES = 1024 * 1024
+
+
+@dataclass(slots=True)
+class WebhookEvent:
+    """One comments/mentions change from an Instagram webhook notification"""
+
+    field: str
+    account_id: str
+    value: Dict
+    received_at: float
+
+    @property
+    def comment_id(self) -> Optional[str]:
+        return self.value.get('id') or self.value.get('comment_id')
+
+    @property
+    def media_id(self) -> Optional[str]:
+        return (self.value.get('media') or {}).get('id') or self.value.get('media_id')
+
+
+def sign(app_secret: str, body: bytes) -> str:
+    """X-Hub-Signature-256 header value for a body"""
+    return 'sha256=' + hmac.new(app_secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+class WebhookHandler(http.server.BaseHTTPRequestHandler):
+    """Answers the subscription challenge and queues signed change notifications"""
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        parsed = urllib.parse.urlparse(self.path)
+        if parsed.path != self.server.path:
+            return self.respond(404, b"Not Found")
+
+        params = dict(urllib.parse.parse_qsl(parsed.query))
+        if params.get('hub.mode') == 'subscribe' and hmac.compare_digest(
+                params.get('hub.verify_token', ''), self.server.verify_token):
+            return self.respond(200, params.get('hub.challenge', '').encode())
+        self.respond(403, b"Verification failed")
+
+    def do_POST(self):
+        if urllib.parse.urlparse(self.path).path != self.server.path:
+            return self.respond(404, b"Not Found")
+
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_BODY_BYTES:
+            self.close_connection = True
+            return self.respond(413, b"Payload too large")
+        body = self.rfile.read(length)
+
+        signature = self.headers.get('X-Hub-Signature-256', '')
+        if not hmac.compare_digest(signature, sign(self.server.app_secret, body)):
+            self.server.count('rejected')
+            return self.respond(401, b"Bad signature")
+
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return self.respond(400, b"Bad JSON")
+
+        # Anything we could not queue is answered with 503 so Meta redelivers it
+        if self.server.enqueue(payload):
+            self.respond(200, b"OK")
+        else:
+            self.respond(503, b"Busy")
+
+    def respond(self, status: int, body: bytes):
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class WebhookServer(http.server.ThreadingHTTPServer):
+    """Production webhook endpoint for Instagram comments/mentions.
+
+    Each connection is handled on its own thread and only verifies the
+    signature and enqueues, so the accept loop never waits on the reply
+    pipeline. Events land on `events`, a bounded queue the reply pipeline
+    consumes. A notification is queued whole or not at all, so the copy
+    Meta redelivers after a 503 does not duplicate part of it; for that
+    the server must be the queue's only producer.
+    """
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, app_secret: str, verify_token: str, port: int = 8000, path: str = '/webhook',
+                 events: Optional[queue.Queue] = None, maxsize: int = 10000,
+                 fields: Iterable[str] = ('comments', 'mentions'), host: str = ''):
+        super().__init__((host, port), WebhookHandler)
+        self.app_secret = app_secret
+        self.verify_token = verify_token
+        self.path = path
+        self.fields = set(fields)
+        self.events = events if events is not None else queue.Queue(maxsize=maxsize)
+        self.stats = {'received': 0, 'queued': 0, 'dropped': 0, 'rejected': 0}
+        self._stats_lock = threading.Lock()
+        self._enqueue_lock = threading.Lock()
+        self._thread = None
+
+    def count(self, name: str, amount: int = 1):
+        with self._stats_lock:
+            self.stats[name] += amount
+
+    def enqueue(self, payload: Dict) -> bool:
+        """Queue every subscribed change in a notification; False (nothing queued) if they do not all fit"""
+        if payload.get('object') != 'instagram':
+            return True
+        now = time.time()
+        self.count('received')
+        events = [WebhookEvent(change['field'], str(entry.get('id')), change.get('value', {}), now)
+                  for entry in payload.get('entry', [])
+                  for change in entry.get('changes', [])
+                  if change.get('field') in self.fields]
+        with self._enqueue_lock:
+            # Consumers only make room, so the check holds until the puts below
+            if self.events.maxsize > 0 and self.events.maxsize - self.events.qsize() < len(events):
+                self.count('dropped', len(events))
+                return False
+            for event in events:
+                self.events.put_nowait(event)
+        self.count('queued', len(events))
+        return True
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host or 'localhost'}:{port}{self.path}"
+
+    def start(self):
+        """Serve in a background thread"""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        print(f"Webhook listening at {self.url}")
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+# Example usage
+if __name__ == "__main__":
+    import os
+    import dotenv
+
+    dotenv.load_dotenv()
+
+    server = WebhookServer(os.getenv("APP_SECRET"), os.getenv("WEBHOOK_VERIFY_TOKEN"),
+                           port=int(os.getenv("WEBHOOK_PORT", "8000"))).start()
+    try:
+        while True:
+            event = server.events.get()
+            print(f"{event.field} on {event.media_id}: {event.value.get('text')}")
+    except KeyboardInterrupt:
+        server.stop()